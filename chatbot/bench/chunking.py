@@ -0,0 +1,92 @@
+"""Compare the TTS chunk planner against one TTS call per sentence.
+
+Usage:
+    python bench/chunking.py
+    python bench/chunking.py --recording recordings/*.json --profile slow
+
+Streams each reply in the corpus token by token at the profile's LLM speed, splits it with
+both splitters, and simulates synthesis at the stubs' TTS speed and playback at a normal
+speaking rate. Reports time to first audio, TTS calls, and playback gaps between chunks.
+The bundled corpus is hand-written replies in the companion's style, not taken from real
+sessions, so its numbers are only indicative; pass --recording to use the replies from
+recorded sessions instead.
+"""
+import argparse
+import math
+import os
+import sys
+from recording import load_recording
+from stubs import LATENCY_PROFILES, SYNTHETIC_SPEECH_BYTES_PER_CHAR, SPEECH_CHUNK_BYTES
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "src"))
+
+from audio_processing.audio import SentenceSegmenter  # noqa: E402
+from audio_processing.chunking import ChunkPlanner  # noqa: E402
+
+CORPUS = os.path.join(BENCH_DIR, "corpus", "replies.txt")
+# About 150 words a minute
+SPEECH_CHARS_PER_SECOND = 15.0
+
+
+def load_corpus(recordings):
+    if recordings:
+        return [reply["response"] for path in recordings for reply in load_recording(path)["replies"]]
+    with open(CORPUS) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def stream_chunks(reply, segmenter, profile):
+    """(emitted_at, chunk) for each chunk as the reply streams in."""
+    chunks = []
+    words = reply.split(" ")
+    for i, word in enumerate(words):
+        emitted_at = profile["llm_first_token"] + i * profile["llm_token"]
+        chunks += [(emitted_at, chunk) for chunk in segmenter.feed(word if i == 0 else " " + word)]
+    finished_at = profile["llm_first_token"] + (len(words) - 1) * profile["llm_token"]
+    return chunks + [(finished_at, chunk) for chunk in segmenter.flush()]
+
+
+def simulate(reply, segmenter, profile):
+    """Time to first audio, TTS calls and total playback gap for one reply, in seconds."""
+    played_until = None
+    first_audio = None
+    gaps = 0.0
+    chunks = stream_chunks(reply, segmenter, profile)
+    for emitted_at, chunk in chunks:
+        audio_chunks = math.ceil(len(chunk) * SYNTHETIC_SPEECH_BYTES_PER_CHAR / SPEECH_CHUNK_BYTES)
+        ready_at = emitted_at + profile["tts_first_byte"] + audio_chunks * profile["tts_chunk"]
+        if played_until is None:
+            first_audio = starts_at = ready_at
+        else:
+            starts_at = max(played_until, ready_at)
+            gaps += starts_at - played_until
+        played_until = starts_at + len(chunk) / SPEECH_CHARS_PER_SECOND
+    return first_audio, len(chunks), gaps
+
+
+def _quantile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare TTS chunking strategies over a reply corpus")
+    parser.add_argument("--recording", nargs="*", default=[], help="recorded sessions to take replies from")
+    parser.add_argument("--profile", choices=sorted(LATENCY_PROFILES), default="realistic")
+    args = parser.parse_args()
+
+    replies = load_corpus(args.recording)
+    profile = LATENCY_PROFILES[args.profile]
+    print(f"{len(replies)} replies, profile {args.profile}")
+    print("splitter    ttfa_p50  ttfa_p95  ttfa_mean  tts_calls  gap_mean")
+    for name, make_segmenter in (("sentences", SentenceSegmenter), ("planner", ChunkPlanner)):
+        results = [simulate(reply, make_segmenter(), profile) for reply in replies]
+        ttfa = [result[0] for result in results]
+        print(f"{name:<10} {_quantile(ttfa, 0.5) * 1000:8.0f}  {_quantile(ttfa, 0.95) * 1000:8.0f}  "
+              f"{sum(ttfa) / len(ttfa) * 1000:9.0f}  {sum(result[1] for result in results):9d}  "
+              f"{sum(result[2] for result in results) / len(results) * 1000:8.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""Check that per-session latency stays flat as concurrent /listen sessions are added.
+
+Usage:
+    python bench/concurrency.py
+    python bench/concurrency.py --steps 1 20 50 100 --max-p99-growth 1.5 --rounds 3
+
+Runs the replay harness at increasing client counts against one worker started with serve.py,
+with the admission limits raised out of the way, and compares each step's p99 time to first
+audio and turn latency with the single-client run. A blocking call on the event loop would
+stall every session on the worker and show up as p99 growing with the client count. Clients
+start --ramp seconds apart so their turns do not all land in the same instant. Each step is
+replayed --rounds times and pooled, since with one round the p99 of a few dozen turns is
+decided by a single slow one. Exits non-zero if a step's p99 grows past --max-p99-growth
+times the baseline plus --slack-ms and --noise-sigmas standard deviations of the baseline's
+latencies, or a turn goes unanswered.
+"""
+import argparse
+import asyncio
+import os
+import resource
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+import aiohttp
+from recording import load_recording, synthetic_recording
+from replay import replay_clients, listen_url, summarize, SRC_DIR, _configure_app_environment, _free_port
+from stubs import StubUpstreams, LATENCY_PROFILES
+
+METRICS = ("time_to_first_audio", "turn_latency")
+READY_TIMEOUT = 30
+# Seconds to wait for the worker to close every session after a step
+IDLE_TIMEOUT = 30
+
+
+async def start_worker(port, max_sessions):
+    """One serve.py worker in its own process, so the stubs and clients do not share its event loop."""
+    env = {
+        **os.environ, "PORT": str(port), "WEB_CONCURRENCY": "1",
+        # Admission control would queue or turn away the larger steps, which load.py covers
+        "MAX_SESSIONS": str(max_sessions), "MAX_UPSTREAM_CALLS": str(max_sessions * 10),
+    }
+    process = subprocess.Popen([sys.executable, "serve.py"], cwd=SRC_DIR, env=env)
+    deadline = time.perf_counter() + READY_TIMEOUT
+    async with aiohttp.ClientSession() as session:
+        while time.perf_counter() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"Worker exited with {process.returncode} before it was ready")
+            try:
+                async with session.get(f"http://127.0.0.1:{port}/ready") as response:
+                    if response.status == 200:
+                        return process
+            except aiohttp.ClientConnectionError:
+                pass
+            await asyncio.sleep(0.05)
+    process.kill()
+    raise RuntimeError(f"Worker was not ready within {READY_TIMEOUT}s")
+
+
+async def wait_for_idle(port):
+    """Wait until the worker has closed every session, so no cleanup overlaps the next step or shutdown."""
+    deadline = time.perf_counter() + IDLE_TIMEOUT
+    async with aiohttp.ClientSession() as session:
+        while time.perf_counter() < deadline:
+            async with session.get(f"http://127.0.0.1:{port}/ready") as response:
+                load = (await response.json())["load"]
+            if not load["sessions"] and not load["queued_sessions"]:
+                return
+            await asyncio.sleep(0.05)
+    raise RuntimeError(f"Worker still had {load['sessions']} sessions open after {IDLE_TIMEOUT}s")
+
+
+def stop_worker(process):
+    """Stop the worker and return the CPU seconds it used."""
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def step_summary(clients, results):
+    step = {
+        "clients": clients,
+        "errors": sum(len(result.errors) for result in results),
+        "unanswered": sum(result.unanswered for result in results),
+    }
+    for name in METRICS:
+        latencies = [latency for result in results for latency in getattr(result, name)]
+        step[name] = summarize(latencies)
+        step[name]["stdev_ms"] = statistics.pstdev(latencies) * 1000 if latencies else 0.0
+    return step
+
+
+def print_step(step):
+    columns = []
+    for name in METRICS:
+        stats = step[name]
+        columns.append(f"{stats['p50_ms']:7.1f} {stats['p99_ms']:7.1f}" if stats["count"] else f"{'-':>7} {'-':>7}")
+    print(f"{step['clients']:>7}  {columns[0]}    {columns[1]}  {step['errors']:>6}  {step['unanswered']:>10}")
+
+
+def regressions(steps, args):
+    """Steps whose p99 grew past the allowed factor of the first step's."""
+    baseline = steps[0]
+    failures = []
+    for step in steps[1:]:
+        for name in METRICS:
+            before, after = baseline[name], step[name]
+            if not before["count"] or not after["count"]:
+                continue
+            noise = args.slack_ms + args.noise_sigmas * before["stdev_ms"]
+            allowed = before["p99_ms"] * args.max_p99_growth + noise
+            if after["p99_ms"] > allowed:
+                failures.append(f"{name} p99 at {step['clients']} clients is {after['p99_ms']:.0f} ms, "
+                                f"over {allowed:.0f} ms")
+        if step["unanswered"] or step["errors"]:
+            failures.append(f"{step['unanswered']} unanswered turns and {step['errors']} errors "
+                            f"at {step['clients']} clients")
+    return failures
+
+
+async def run(args):
+    recording = load_recording(args.recording) if args.recording else synthetic_recording()
+    profile = LATENCY_PROFILES[args.profile]
+
+    stubs = StubUpstreams(recording, profile)
+    await stubs.start()
+    steps = []
+    with tempfile.TemporaryDirectory() as workdir:
+        _configure_app_environment(stubs, workdir, warm_cache=False)
+        port = _free_port()
+        worker = await start_worker(port, max(args.steps))
+        try:
+            print(f"profile {args.profile}, steps {' '.join(str(clients) for clients in args.steps)}")
+            print("clients  first_audio p50/p99  turn p50/p99     errors  unanswered  (ms)")
+            for clients in args.steps:
+                step_args = SimpleNamespace(
+                    protocol="binary", output=None, encoding=None, ramp=args.ramp,
+                    clients=clients, slow_clients=0, tail=args.tail
+                )
+                results = []
+                for _ in range(args.rounds):
+                    results += await replay_clients(listen_url(port, step_args), recording, profile, step_args)
+                    await wait_for_idle(port)
+                steps.append(step_summary(clients, results))
+                print_step(steps[-1])
+        finally:
+            cpu_seconds = stop_worker(worker)
+            await stubs.close()
+    print(f"worker used {cpu_seconds:.1f} CPU seconds")
+    return steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check /listen p99 latency stays flat as sessions are added")
+    parser.add_argument("--recording", help="session recorded with SESSION_RECORD_DIR, synthetic if omitted")
+    parser.add_argument("--steps", type=int, nargs="+", default=[1, 10, 25, 50])
+    parser.add_argument("--ramp", type=float, default=0.2, help="seconds between client starts")
+    parser.add_argument("--profile", choices=sorted(LATENCY_PROFILES), default="realistic")
+    parser.add_argument("--tail", type=float, default=10.0, help="seconds to wait for replies after the audio ends")
+    parser.add_argument("--max-p99-growth", type=float, default=1.5, help="allowed p99 as a multiple of one client's")
+    parser.add_argument("--rounds", type=int, default=2, help="replays pooled into each step's latencies")
+    parser.add_argument("--slack-ms", type=float, default=100, help="added to the allowed p99 for timer noise")
+    parser.add_argument("--noise-sigmas", type=float, default=1.0,
+                        help="baseline standard deviations added to the allowed p99")
+    args = parser.parse_args()
+
+    steps = asyncio.run(run(args))
+    failures = regressions(steps, args)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""Fault injection for the Deepgram reconnect path.
+
+Streams scripted audio through the app's DeepgramConnectionManager into a local stand-in for
+Deepgram live that drops the connection at chosen points, and checks that the transcript
+that comes out has every scripted word exactly once.
+
+Usage:
+    python bench/faults.py
+    python bench/faults.py --drop-at 1.5 3.2 5.0 --refuse 2
+
+Each inbound chunk starts with its index, so the stand-in knows which part of the script a
+connection is hearing even when the app replays buffered audio into it.
+"""
+import argparse
+import asyncio
+import difflib
+import os
+import struct
+import sys
+import time
+from aiohttp import web, WSMsgType
+from recording import transcript_result
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+SCRIPT = (
+    "so I was thinking about planting tomatoes this spring but the backyard only gets "
+    "a few hours of sun in the morning and I am not sure they would even grow there "
+    "do you think peppers would do any better or should I try something else entirely"
+)
+WORD_SECONDS = 0.3
+CHUNK_SECONDS = 0.1
+SAMPLE_RATE = 16000
+CHUNK_BYTES = int(SAMPLE_RATE * CHUNK_SECONDS) * 2
+# Deepgram finalizes long utterances in segments of a few words
+FINAL_SEGMENT_WORDS = 3
+CHUNK_INDEX = struct.Struct("<I")
+
+
+def script_words():
+    return [(word, i * WORD_SECONDS, (i + 1) * WORD_SECONDS) for i, word in enumerate(SCRIPT.split())]
+
+
+def audio_chunk(index):
+    return CHUNK_INDEX.pack(index) + b"\x00" * (CHUNK_BYTES - CHUNK_INDEX.size)
+
+
+class DroppingListenServer:
+    """Stand-in for Deepgram live that transcribes the script and drops connections on cue."""
+
+    def __init__(self, drop_at, refuse):
+        self.words = script_words()
+        self.drop_at = sorted(drop_at)
+        self.refuse = refuse
+        self.refusals_left = 0
+        self.dropped_at = None
+        self.connections = 0
+        self.refused = 0
+        self.reconnect_gaps = []
+        self.runner = None
+        self.url = None
+
+    async def start(self, host="127.0.0.1"):
+        app = web.Application()
+        app.router.add_get("/v1/listen", self.listen)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, 0)
+        await site.start()
+        self.url = f"http://{host}:{self.runner.addresses[0][1]}"
+
+    async def close(self):
+        await self.runner.cleanup()
+
+    async def listen(self, request):
+        if self.refusals_left:
+            self.refusals_left -= 1
+            self.refused += 1
+            return web.Response(status=503)
+
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.connections += 1
+        heard_from, next_word = None, None
+
+        async for message in ws:
+            if message.type == WSMsgType.TEXT:
+                if '"CloseStream"' in message.data:
+                    break
+                continue
+            if message.type != WSMsgType.BINARY:
+                continue
+
+            index = CHUNK_INDEX.unpack_from(message.data)[0]
+            heard_until = (index + 1) * CHUNK_SECONDS
+            if heard_from is None:
+                heard_from = index * CHUNK_SECONDS
+                # Words cut off by the start of this connection's audio cannot be transcribed
+                next_word = next((i for i, w in enumerate(self.words) if w[1] >= heard_from), len(self.words))
+                if self.dropped_at is not None:
+                    self.reconnect_gaps.append(time.perf_counter() - self.dropped_at)
+                    self.dropped_at = None
+
+            next_word = await self._emit_finals(ws, heard_from, heard_until, next_word)
+
+            if self.drop_at and heard_until >= self.drop_at[0]:
+                self.drop_at.pop(0)
+                self.dropped_at = time.perf_counter()
+                self.refusals_left = self.refuse
+                break
+
+        await ws.close(code=1011)
+        return ws
+
+    async def _emit_finals(self, ws, heard_from, heard_until, next_word):
+        heard = [i for i in range(next_word, len(self.words)) if self.words[i][2] <= heard_until]
+        while len(heard) >= FINAL_SEGMENT_WORDS or (heard and heard[-1] == len(self.words) - 1):
+            segment, heard = heard[:FINAL_SEGMENT_WORDS], heard[FINAL_SEGMENT_WORDS:]
+            start, end = self.words[segment[0]][1], self.words[segment[-1]][2]
+            text = " ".join(self.words[i][0] for i in segment)
+            await ws.send_json(transcript_result(text, start - heard_from, end - start, True))
+            next_word = segment[-1] + 1
+        return next_word
+
+
+async def stream_script(manager, options, transcripts):
+    """Send the script's audio in real time the way WebSocketMessageHandler forwards it."""
+    from deepgram import LiveTranscriptionEvents
+
+    def on_message(sender, result, **kwargs):
+        transcript = result.channel.alternatives[0].transcript
+        if result.is_final and transcript:
+            transcript = manager.seam.final(transcript)
+            if transcript:
+                transcripts.append(transcript)
+
+    await manager.create_connection({LiveTranscriptionEvents.Transcript: on_message}, options)
+    chunks = int(len(script_words()) * WORD_SECONDS / CHUNK_SECONDS) + 1
+    started_at = time.perf_counter()
+    for index in range(chunks):
+        delay = started_at + index * CHUNK_SECONDS - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if not manager.send_audio(audio_chunk(index)) and not manager.is_reconnecting():
+            manager.schedule_reconnect()
+
+    # Let the last segment arrive, including any replayed after a late drop
+    await asyncio.sleep(1.0)
+    if manager.reconnect_task:
+        await manager.reconnect_task
+
+
+def compare(expected, actual):
+    """Scripted words that never arrived, and words that arrived more than once or unprompted."""
+    missing, repeated = [], []
+    for op, e1, e2, a1, a2 in difflib.SequenceMatcher(a=expected, b=actual, autojunk=False).get_opcodes():
+        if op in ("delete", "replace"):
+            missing += expected[e1:e2]
+        if op in ("insert", "replace"):
+            repeated += actual[a1:a2]
+    return missing, repeated
+
+
+async def run(args):
+    server = DroppingListenServer(args.drop_at, args.refuse)
+    await server.start()
+    os.environ.update({"DEEPGRAM_API_KEY": "faults", "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING")})
+    sys.path.insert(0, os.path.abspath(SRC_DIR))
+    from deepgram import DeepgramClient, DeepgramClientOptions, LiveOptions
+    from audio_processing.connection_manager import DeepgramConnectionManager
+    from backends.cloud import DeepgramSpeechToText
+
+    client = DeepgramClient("faults", DeepgramClientOptions(url=server.url))
+    manager = DeepgramConnectionManager(DeepgramSpeechToText(client), container_audio=False)
+    options = LiveOptions(
+        model="nova-3", encoding="linear16", sample_rate=SAMPLE_RATE, channels=1, interim_results=False
+    )
+    transcripts = []
+    try:
+        await stream_script(manager, options, transcripts)
+    finally:
+        await manager.close_connection()
+        await server.close()
+
+    expected = [word for word, _, _ in script_words()]
+    actual = " ".join(transcripts).split()
+    missing, repeated = compare(expected, actual)
+    gaps = ", ".join(f"{gap * 1000:.0f} ms" for gap in server.reconnect_gaps) or "none"
+    print(f"{server.connections} connections, {server.refused} refused, reconnect gaps: {gaps}")
+    print(f"{len(actual)} of {len(expected)} words, {len(missing)} missing, {len(repeated)} repeated")
+    if missing:
+        print(f"  missing: {' '.join(missing)}")
+    if repeated:
+        print(f"  repeated: {' '.join(repeated)}")
+    return not missing and not repeated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drop Deepgram live connections and check no words are lost")
+    parser.add_argument("--drop-at", type=float, nargs="*", default=[2.0, 5.5, 9.1],
+                        help="seconds into the script at which the stand-in drops the connection")
+    parser.add_argument("--refuse", type=int, default=1,
+                        help="handshakes refused after each drop, to exercise the backoff")
+    args = parser.parse_args()
+
+    ok = asyncio.run(run(args))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
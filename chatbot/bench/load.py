@@ -0,0 +1,106 @@
+"""Step load past the worker's admission limits and check that it degrades gracefully.
+
+Usage:
+    python bench/load.py
+    python bench/load.py --steps 10 40 80 160 --max-sessions 40 --slow-fraction 0.1
+
+Runs the replay harness at increasing client counts against one app instance. Past
+--max-sessions, new clients should be queued or turned away with a retry hint while the
+admitted ones keep their latency, and clients that stop reading should be disconnected
+instead of holding the worker up.
+
+Loopback socket buffers take a few MB before a send blocks, far more than a synthetic
+session's replies, so slow_shut only counts disconnects with recordings whose replies
+are longer than that. tests/test_outbound.py covers the disconnect itself.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+from recording import load_recording, synthetic_recording
+from replay import (
+    replay_clients, listen_url, summarize, _configure_app_environment, _start_app, _free_port
+)
+from stubs import StubUpstreams, LATENCY_PROFILES
+
+
+def step_summary(clients, results):
+    admitted = [result for result in results if not result.rejected]
+    first_audio = [latency for result in admitted for latency in result.time_to_first_audio]
+    return {
+        "clients": clients,
+        "admitted": len(admitted),
+        "queued": sum(result.queue_wait is not None for result in results),
+        "rejected": clients - len(admitted),
+        "slow_disconnected": sum(result.disconnected for result in results),
+        "errors": sum(len(result.errors) for result in results),
+        "unanswered": sum(result.unanswered for result in results),
+        "time_to_first_audio": summarize(first_audio),
+    }
+
+
+def print_step(step):
+    stats = step["time_to_first_audio"]
+    latency = (f"p50={stats['p50_ms']:7.1f}  p95={stats['p95_ms']:7.1f} ms" if stats["count"]
+               else "no samples")
+    print(f"{step['clients']:>7}  {step['admitted']:>8}  {step['queued']:>6}  {step['rejected']:>8}  "
+          f"{step['slow_disconnected']:>9}  {step['errors']:>6}  {step['unanswered']:>10}  {latency}")
+
+
+async def run(args):
+    recording = load_recording(args.recording) if args.recording else synthetic_recording()
+    profile = LATENCY_PROFILES[args.profile]
+
+    stubs = StubUpstreams(recording, profile)
+    await stubs.start()
+    steps = []
+    with tempfile.TemporaryDirectory() as workdir:
+        _configure_app_environment(stubs, workdir, warm_cache=False)
+        os.environ.update({
+            "MAX_SESSIONS": str(args.max_sessions),
+            "ADMISSION_QUEUE_SIZE": str(args.queue_size),
+            "OUTBOUND_SEND_TIMEOUT": str(args.send_timeout),
+        })
+        port = _free_port()
+        server, server_task = await _start_app(port)
+        try:
+            print(f"max {args.max_sessions} sessions, queue {args.queue_size}, profile {args.profile}")
+            print("clients  admitted  queued  rejected  slow_shut  errors  unanswered  time_to_first_audio")
+            for clients in args.steps:
+                slow_clients = int(clients * args.slow_fraction)
+                step_args = SimpleNamespace(
+                    protocol="binary", output=None, encoding=None, ramp=args.ramp,
+                    clients=clients, slow_clients=slow_clients, tail=args.tail
+                )
+                results = await replay_clients(listen_url(port, step_args), recording, profile, step_args)
+                steps.append(step_summary(clients, results))
+                print_step(steps[-1])
+        finally:
+            server.should_exit = True
+            await server_task
+            await stubs.close()
+    return steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Step /listen load past the admission limits")
+    parser.add_argument("--recording", help="session recorded with SESSION_RECORD_DIR, synthetic if omitted")
+    parser.add_argument("--steps", type=int, nargs="+", default=[10, 25, 50, 100])
+    parser.add_argument("--max-sessions", type=int, default=25)
+    parser.add_argument("--queue-size", type=int, default=5)
+    parser.add_argument("--slow-fraction", type=float, default=0.1, help="share of clients that never read")
+    parser.add_argument("--send-timeout", type=float, default=3.0, help="seconds before a non-reading client is cut off")
+    parser.add_argument("--ramp", type=float, default=0.02, help="seconds between client starts")
+    parser.add_argument("--profile", choices=sorted(LATENCY_PROFILES), default="realistic")
+    parser.add_argument("--tail", type=float, default=10.0, help="seconds to wait for replies after the audio ends")
+    args = parser.parse_args()
+
+    steps = asyncio.run(run(args))
+    # Collapse looks like errors or unanswered turns among the sessions that were let in
+    sys.exit(1 if any(step["errors"] or step["unanswered"] for step in steps) else 0)
+
+
+if __name__ == "__main__":
+    main()
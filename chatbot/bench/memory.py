@@ -0,0 +1,161 @@
+"""Prompt size and reply latency over a long conversation, with and without the memory budget.
+
+Usage:
+    python bench/memory.py
+    python bench/memory.py --turns 500 --profile realistic --prefill-ms-per-1k 200
+
+Talks to the stub LLM for --turns turns through stream_ai_response, once with a session's
+ConversationMemory and once with an unlimited budget, which sends the whole history every
+turn. The stub reads the prompt at --prefill-ms-per-1k milliseconds per thousand tokens before
+its first token, so a growing prompt shows up as growing latency. Summaries run in the
+background after each reply, as they do in a session. Prints both per block of turns and
+exits non-zero if the budgeted run's prompt tokens or time to first token in the last block
+grew past --max-growth times those in the first full block plus --slack-ms.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from replay import SRC_DIR, summarize, _configure_app_environment
+from stubs import StubUpstreams, LATENCY_PROFILES
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CORPUS = os.path.join(BENCH_DIR, "corpus", "replies.txt")
+USER_LINES = [
+    "I went for a long walk by the river this morning",
+    "work was stressful again today and my manager keeps moving deadlines",
+    "do you remember what my sister is called",
+    "I am thinking about learning to cook something new this week",
+    "my cat knocked a glass off the table and then looked proud of it",
+    "I could not sleep much last night",
+    "tell me something that might cheer me up",
+    "I am meeting an old friend for coffee tomorrow",
+]
+MODES = ("budgeted", "full_history")
+
+
+def conversation(turns):
+    """A synthetic recording with one scripted reply per turn, each user message unique."""
+    with open(CORPUS) as f:
+        replies = [line.strip() for line in f if line.strip()]
+    return {
+        "events": [], "speech": [], "audio": [],
+        "replies": [
+            # The zero-padded number keeps one message from matching inside another
+            {"transcript": f"message {i:04d} {USER_LINES[i % len(USER_LINES)]}", "response": replies[i % len(replies)]}
+            for i in range(turns)
+        ],
+    }
+
+
+async def talk(stubs, recording, memory, backends):
+    """Prompt tokens, time to first token and reply time for every turn, in seconds."""
+    from agent.response import stream_ai_response
+
+    prompt_tokens, first_token, reply = [], [], []
+    for turn in recording["replies"]:
+        started_at = time.perf_counter()
+        first_token_at = None
+        text = ""
+        async for token in stream_ai_response(turn["transcript"], memory, backends):
+            first_token_at = first_token_at or time.perf_counter()
+            text += token
+        reply.append(time.perf_counter() - started_at)
+        first_token.append(first_token_at - started_at)
+        prompt_tokens.append(stubs.prompt_tokens[-1])
+        memory.add_turn(turn["transcript"], text)
+        # As in a session, the summary is scheduled once the reply is done and is not waited for
+        memory.schedule_summary()
+    if memory.summary_task:
+        await memory.summary_task
+    return prompt_tokens, first_token, reply
+
+
+async def run(args):
+    recording = conversation(args.turns)
+    profile = {**LATENCY_PROFILES[args.profile], "llm_prompt_token": args.prefill_ms_per_1k / 1e6}
+    stubs = StubUpstreams(recording, profile)
+    await stubs.start()
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            # Every turn is new, but the cache would still skip the prompt for short first turns
+            _configure_app_environment(stubs, workdir, warm_cache=False)
+            # A prompt that grows every turn outruns the hedging tail every turn, and the duplicate
+            # requests would muddy the comparison
+            os.environ["HEDGE_ENABLED"] = "false"
+            sys.path.insert(0, os.path.abspath(SRC_DIR))
+            from clients import upstream
+            from agent.memory import ConversationMemory
+
+            await upstream.start()
+            try:
+                for mode in MODES:
+                    memory = ConversationMemory() if mode == "budgeted" else ConversationMemory(token_budget=sys.maxsize)
+                    results[mode] = await talk(stubs, recording, memory, upstream.default)
+                    results[mode] += (memory.summary,)
+            finally:
+                await upstream.close()
+    finally:
+        await stubs.close()
+    return results
+
+
+def _mean(values):
+    return sum(values) / len(values)
+
+
+def blocks(values, size):
+    return [values[start:start + size] for start in range(0, len(values), size)]
+
+
+def regressions(prompt_tokens, first_token, args):
+    """Growth of the budgeted run between its first full block and its last."""
+    if len(prompt_tokens) < args.block * 3:
+        return []
+    # The first block is still filling the window, so compare against the second
+    baseline, last = slice(args.block, args.block * 2), slice(-args.block, None)
+    failures = []
+    before, after = _mean(prompt_tokens[baseline]), _mean(prompt_tokens[last])
+    if after > before * args.max_growth:
+        failures.append(f"mean prompt tokens grew from {before:.0f} to {after:.0f}")
+    before, after = summarize(first_token[baseline]), summarize(first_token[last])
+    allowed = before["p50_ms"] * args.max_growth + args.slack_ms
+    if after["p50_ms"] > allowed:
+        failures.append(f"first token p50 grew from {before['p50_ms']:.0f} ms to {after['p50_ms']:.0f} ms")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check prompt size and latency stay flat over a long conversation")
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--block", type=int, default=20, help="turns per reported block")
+    parser.add_argument("--profile", choices=sorted(LATENCY_PROFILES), default="fast")
+    parser.add_argument("--prefill-ms-per-1k", type=float, default=100.0,
+                        help="stub LLM time to read each thousand prompt tokens")
+    parser.add_argument("--max-growth", type=float, default=1.2, help="allowed last block as a multiple of the first full one")
+    parser.add_argument("--slack-ms", type=float, default=20, help="added to the allowed first token p50 for timer noise")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(f"{args.turns} turns, profile {args.profile}, {args.prefill_ms_per_1k:.0f} ms prefill per 1k prompt tokens")
+    print("mode          turns     prompt tokens mean/max  first token p50  reply p50  (ms)")
+    for mode, (prompt_tokens, first_token, reply, summary) in results.items():
+        for index, (tokens, firsts, replies) in enumerate(zip(*(blocks(v, args.block) for v in (prompt_tokens, first_token, reply)))):
+            first_turn = index * args.block + 1
+            print(f"{mode:<12}  {first_turn:>3}-{first_turn + len(tokens) - 1:<4}  "
+                  f"{_mean(tokens):10.0f} / {max(tokens):<6}  "
+                  f"{summarize(firsts)['p50_ms']:15.1f}  {summarize(replies)['p50_ms']:9.1f}")
+        if mode == "budgeted":
+            print(f"{'':12}  final summary {len(summary.split())} words")
+
+    failures = regressions(results["budgeted"][0], results["budgeted"][1], args)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Round-trip throughput of reply audio as binary frames against base64 JSON messages.
+
+Usage:
+    python bench/protocol.py
+    python bench/protocol.py --seconds 5 --sizes 1920 32768
+
+For each payload size, encodes audio the way AudioProcessor sends it and decodes it the way
+a client reads it, for both protocols: first in-process, then through a loopback WebSocket
+so the framing, copies and extra bytes on the wire are counted too. The default sizes are a
+40 ms linear16 streaming chunk and a typical per-sentence MP3.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import sys
+import time
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from audio_processing.protocol import MP3_CONTENT_TYPE, encode_audio_frame, decode_audio_frame  # noqa: E402
+
+SENTENCE = "Octopuses have three hearts and blue blood."
+
+
+def encode_json(sequence, payload):
+    return json.dumps({
+        "audio": base64.b64encode(payload).decode("utf-8"),
+        "content_type": MP3_CONTENT_TYPE,
+        "sentence": SENTENCE,
+        "sequence": sequence,
+    })
+
+
+def decode_json(message):
+    data = json.loads(message)
+    return base64.b64decode(data["audio"])
+
+
+def encode_binary(sequence, payload):
+    return encode_audio_frame(sequence, 0, MP3_CONTENT_TYPE, payload)
+
+
+def decode_binary(frame):
+    return decode_audio_frame(frame)["audio"]
+
+
+PROTOCOLS = {"json": (encode_json, decode_json), "binary": (encode_binary, decode_binary)}
+
+
+def in_process(protocol, payload, seconds):
+    """Frames per second and bytes per frame when encoding and decoding back to back."""
+    encode, decode = PROTOCOLS[protocol]
+    frames, wire_bytes = 0, 0
+    started_at = time.perf_counter()
+    while time.perf_counter() - started_at < seconds:
+        message = encode(frames, payload)
+        if decode(message) != payload:
+            raise RuntimeError(f"{protocol} round trip corrupted the payload")
+        frames += 1
+        wire_bytes += len(message)
+    return frames / (time.perf_counter() - started_at), wire_bytes / frames
+
+
+async def over_websocket(protocol, payload, seconds):
+    """Frames per second a loopback WebSocket server can push to a decoding client."""
+    encode, decode = PROTOCOLS[protocol]
+
+    async def handler(request):
+        ws = web.WebSocketResponse(max_msg_size=0)
+        await ws.prepare(request)
+        sequence = 0
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            message = encode(sequence, payload)
+            await (ws.send_bytes(message) if isinstance(message, bytes) else ws.send_str(message))
+            sequence += 1
+        await ws.close()
+        return ws
+
+    app = web.Application()
+    app.router.add_get("/", handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+
+    frames = 0
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.ws_connect(f"http://127.0.0.1:{port}/", max_msg_size=0) as ws:
+                started_at = time.perf_counter()
+                async for message in ws:
+                    if message.type not in (aiohttp.WSMsgType.TEXT, aiohttp.WSMsgType.BINARY):
+                        break
+                    if decode(message.data) != payload:
+                        raise RuntimeError(f"{protocol} round trip corrupted the payload")
+                    frames += 1
+                elapsed = time.perf_counter() - started_at
+    finally:
+        await runner.cleanup()
+    return frames / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare binary and JSON audio frame round-trip throughput")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1920, 32768], help="audio payload bytes per frame")
+    parser.add_argument("--seconds", type=float, default=2.0, help="how long to run each measurement")
+    args = parser.parse_args()
+
+    payloads = {size: os.urandom(size) for size in args.sizes}
+    print("payload  protocol  wire bytes  in-process frames/s  MB/s   websocket frames/s  MB/s")
+    for size, payload in payloads.items():
+        for protocol in PROTOCOLS:
+            local_rate, wire_size = in_process(protocol, payload, args.seconds)
+            socket_rate = asyncio.run(over_websocket(protocol, payload, args.seconds))
+            print(f"{size:>7}  {protocol:<8}  {wire_size:>10.0f}  {local_rate:>19.0f}  {local_rate * size / 1e6:5.0f}"
+                  f"   {socket_rate:>18.0f}  {socket_rate * size / 1e6:4.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import array
+import base64
+import json
+import math
+
+# Synthetic sessions send 16 kHz linear16 in 250 ms frames: a tone while the user speaks, silence otherwise
+SYNTHETIC_FRAME_SECONDS = 0.25
+SYNTHETIC_SAMPLE_RATE = 16000
+SYNTHETIC_TONE_HZ = 220
+SYNTHETIC_TONE_AMPLITUDE = 3000
+# Speaking rate used to lay out synthetic words in time
+SYNTHETIC_WORD_SECONDS = 0.3
+# Deepgram endpointing and utterance_end_ms used by live_options()
+ENDPOINTING_SECONDS = 0.3
+UTTERANCE_END_SECONDS = 1.0
+
+# (user utterance, recorded reply, seconds of audio after the utterance before the next one)
+SYNTHETIC_TURNS = [
+    ("Hi there, how are you today?",
+     "I'm doing well, thanks for asking. How can I help you today?", 6.0),
+    ("Can you tell me a fun fact about octopuses?",
+     "Sure. Octopuses have three hearts and blue blood. Two hearts pump blood to the gills. "
+     "The third pumps it to the rest of the body. They can also taste with their arms. "
+     "Each arm has its own cluster of neurons.", 1.4),
+    ("Wait, stop for a second.",
+     "Of course. What would you like to talk about instead?", 6.0),
+    ("Thanks, that's all for now.",
+     "You're welcome. Have a great day!", 4.0),
+]
+
+# The user talks over a reply to a question that routes to the large model. With the realistic
+# profile the second word of "Wait, stop" lands after the reply's first audio and before its last.
+BARGE_IN_TURNS = [
+    ("Why do octopuses have three hearts?",
+     "Two of the hearts pump blood through the gills, where it picks up oxygen. The third one "
+     "pumps it around the rest of the body. It actually stops beating while they swim, which "
+     "is why they prefer crawling.", 0.6),
+    ("Wait, stop for a second.",
+     "Of course. What would you like to talk about instead?", 4.0),
+]
+
+
+def load_recording(path):
+    """Load a session recorded with SESSION_RECORD_DIR."""
+    with open(path) as f:
+        return json.load(f)
+
+
+def transcript_result(transcript, start, duration, is_final, speech_final=False):
+    return {
+        "type": "Results",
+        "channel_index": [0, 1],
+        "duration": round(duration, 3),
+        "start": round(start, 3),
+        "is_final": is_final,
+        "speech_final": speech_final,
+        "channel": {"alternatives": [{"transcript": transcript, "confidence": 0.99, "words": []}]},
+        "metadata": {
+            "request_id": "replay",
+            "model_info": {"name": "replay", "version": "0", "arch": "replay"},
+            "model_uuid": "replay",
+        },
+    }
+
+
+def _synthetic_frame(speaking):
+    samples = int(SYNTHETIC_SAMPLE_RATE * SYNTHETIC_FRAME_SECONDS)
+    pcm = array.array("h", [0] * samples)
+    if speaking:
+        for i in range(samples):
+            phase = 2 * math.pi * SYNTHETIC_TONE_HZ * i / SYNTHETIC_SAMPLE_RATE
+            pcm[i] = int(SYNTHETIC_TONE_AMPLITUDE * math.sin(phase))
+    return base64.b64encode(pcm.tobytes()).decode("ascii")
+
+
+def synthetic_recording(turns=SYNTHETIC_TURNS):
+    """Build a recording without a live session: tone and silence frames plus scripted Deepgram events."""
+    audio, events, replies, speaking = [], [], [], []
+    clock = 0.5
+
+    for utterance, reply, gap in turns:
+        words = utterance.split()
+        speech_started = clock
+        events.append({"t": round(clock, 3), "payload": {
+            "type": "SpeechStarted", "channel": [0], "timestamp": round(clock, 3)
+        }})
+
+        # One interim per word, each a longer prefix of the utterance
+        for count in range(1, len(words) + 1):
+            clock += SYNTHETIC_WORD_SECONDS
+            events.append({"t": round(clock, 3), "payload": transcript_result(
+                " ".join(words[:count]), speech_started, clock - speech_started, False
+            )})
+
+        speaking.append((speech_started, clock))
+        final_at = clock + ENDPOINTING_SECONDS
+        events.append({"t": round(final_at, 3), "payload": transcript_result(
+            utterance, speech_started, final_at - speech_started, True, True
+        )})
+        events.append({"t": round(clock + UTTERANCE_END_SECONDS, 3), "payload": {
+            "type": "UtteranceEnd", "channel": [0, 1], "last_word_end": round(clock, 3)
+        }})
+        replies.append({"t": round(final_at, 3), "transcript": utterance, "response": reply})
+        clock = final_at + gap
+
+    frames = {is_speaking: _synthetic_frame(is_speaking) for is_speaking in (False, True)}
+    t = 0.0
+    while t < clock:
+        is_speaking = any(start <= t < end for start, end in speaking)
+        audio.append({"t": round(t, 3), "data": frames[is_speaking]})
+        t += SYNTHETIC_FRAME_SECONDS
+
+    return {
+        "version": 1,
+        "session_id": "synthetic",
+        "audio": audio,
+        "events": sorted(events, key=lambda event: event["t"]),
+        "replies": replies,
+        "speech": [],
+    }
+
+
+def audio_start(recording):
+    """Offset of the first inbound frame; replay timing is measured from it."""
+    return recording["audio"][0]["t"] if recording["audio"] else 0.0
+
+
+def event_schedule(recording):
+    """(seconds after the first audio frame, payload) for every recorded Deepgram event."""
+    start = audio_start(recording)
+    return [(max(0.0, event["t"] - start), event["payload"]) for event in recording["events"]]
+
+
+def is_transcript(payload):
+    return payload.get("type") == "Results" and bool(
+        payload["channel"]["alternatives"][0]["transcript"]
+    )
+
+
+def is_final_transcript(payload):
+    return is_transcript(payload) and payload.get("is_final", False)
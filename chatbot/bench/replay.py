@@ -0,0 +1,412 @@
+"""Replay a recorded /listen session against the real app with stubbed upstreams.
+
+Usage:
+    python bench/replay.py --clients 20 --profile realistic
+    python bench/replay.py --recording recordings/3f2a9c1e7b4d.json --json results.json
+    python bench/replay.py --llm-backend llama_cpp --tts-backend espeak
+    python bench/replay.py --barge-in
+
+Without --recording a synthetic session is used. Record real sessions by running
+the app with SESSION_RECORD_DIR set. --barge-in replays a synthetic session in which
+the user talks over a reply, with FULL_DUPLEX on, so interrupt_latency has samples.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import socket
+import sys
+import tempfile
+import time
+import aiohttp
+from recording import (
+    BARGE_IN_TURNS, SYNTHETIC_TURNS, load_recording, synthetic_recording, event_schedule, is_transcript, is_final_transcript
+)
+from stubs import StubUpstreams, LATENCY_PROFILES, STUB_FAST_MODEL
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+QUANTILES = (0.5, 0.95, 0.99)
+# Once a stalled client reads again, a server that hung up on it closes within this long
+CLOSE_CHECK_SECONDS = 1.0
+
+
+class ClientResult:
+    """Latencies seen by one replayed client, in seconds."""
+
+    def __init__(self):
+        self.time_to_first_audio = []
+        self.turn_latency = []
+        self.interrupt_latency = []
+        self.turns = 0
+        self.unanswered = 0
+        self.errors = []
+        self.queue_wait = None
+        self.rejected = False
+        self.disconnected = False
+
+
+class ReplayClient:
+    """Streams the recorded audio to /listen in real time and times the replies."""
+
+    def __init__(self, url, recording, stt_delay, reads=True):
+        self.url = url
+        # A client that never reads stands in for a phone on a link that has stopped draining
+        self.reads = reads
+        self.frames = recording["audio"]
+        schedule = event_schedule(recording)
+        # When the stub STT will have delivered each event, relative to our first frame
+        self.final_offsets = [offset + stt_delay for offset, payload in schedule if is_final_transcript(payload)]
+        self.transcript_offsets = [offset + stt_delay for offset, payload in schedule if is_transcript(payload)]
+        self.result = ClientResult()
+        self.started_at = None
+        self.current_turn = None
+        self.answered = set()
+        self.finished = asyncio.Event()
+
+    async def run(self, session, tail):
+        self.result.turns = len(self.final_offsets)
+        try:
+            async with session.ws_connect(self.url) as ws:
+                if not await self._admitted(ws):
+                    self.result.turns = 0
+                    return self.result
+
+                if not self.reads:
+                    await self._send_audio(ws)
+                    await asyncio.sleep(tail)
+                    await self._wait_for_close(ws)
+                    self.result.turns = 0
+                    return self.result
+
+                receiver = asyncio.create_task(self._receive(ws))
+                await self._send_audio(ws)
+                try:
+                    await asyncio.wait_for(self.finished.wait(), tail)
+                except asyncio.TimeoutError:
+                    pass
+                receiver.cancel()
+        except Exception as e:
+            self.result.errors.append(str(e))
+
+        self.result.unanswered = self.result.turns - len(self.answered)
+        return self.result
+
+    async def _admitted(self, ws):
+        """Read the greeting, waiting out a queued admission; False if the server turned us away."""
+        connected_at = time.perf_counter()
+        greeting = await ws.receive_json()
+        if greeting.get("status") == "queued":
+            greeting = await ws.receive_json()
+            self.result.queue_wait = time.perf_counter() - connected_at
+        if greeting.get("status") == "busy":
+            self.result.rejected = True
+            return False
+        if greeting.get("status") != "ready":
+            raise RuntimeError(f"Unexpected greeting: {greeting}")
+        return True
+
+    async def _wait_for_close(self, ws):
+        """Read what the server queued before giving up on us, and whether it then closed the socket."""
+        while not ws.closed:
+            try:
+                message = await ws.receive(timeout=CLOSE_CHECK_SECONDS)
+            except asyncio.TimeoutError:
+                break
+            if message.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSED,
+                                aiohttp.WSMsgType.CLOSING, aiohttp.WSMsgType.ERROR):
+                self.result.disconnected = True
+                break
+        self.result.disconnected = self.result.disconnected or ws.closed
+
+    async def _send_audio(self, ws):
+        first = self.frames[0]["t"] if self.frames else 0.0
+        self.started_at = time.perf_counter()
+        for frame in self.frames:
+            delay = self.started_at + frame["t"] - first - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if ws.closed:
+                self.result.disconnected = True
+                return
+            try:
+                await ws.send_bytes(base64.b64decode(frame["data"]))
+            except ConnectionResetError:
+                # The server hung up on a client that stopped reading
+                self.result.disconnected = True
+                return
+
+    def _latest(self, offsets, now):
+        elapsed = now - self.started_at
+        passed = [i for i, offset in enumerate(offsets) if offset <= elapsed]
+        return passed[-1] if passed else None
+
+    async def _receive(self, ws):
+        async for message in ws:
+            now = time.perf_counter()
+            if message.type == aiohttp.WSMsgType.BINARY:
+                self._on_audio(now)
+            elif message.type == aiohttp.WSMsgType.TEXT:
+                data = json.loads(message.data)
+                if "audio" in data:
+                    self._on_audio(now)
+                elif data.get("ai_finished_speaking"):
+                    self._on_reply_finished(now)
+                elif data.get("interrupt"):
+                    self._on_interrupt(now)
+
+    def _on_audio(self, now):
+        if self.current_turn is not None or self.started_at is None:
+            return
+        turn = self._latest(self.final_offsets, now)
+        if turn is None or turn in self.answered:
+            return
+        self.current_turn = turn
+        self.answered.add(turn)
+        self.result.time_to_first_audio.append(now - self.started_at - self.final_offsets[turn])
+
+    def _on_reply_finished(self, now):
+        if self.current_turn is not None:
+            self.result.turn_latency.append(now - self.started_at - self.final_offsets[self.current_turn])
+            self.current_turn = None
+        if len(self.answered) == len(self.final_offsets):
+            self.finished.set()
+
+    def _on_interrupt(self, now):
+        spoken = self._latest(self.transcript_offsets, now)
+        if spoken is not None:
+            self.result.interrupt_latency.append(now - self.started_at - self.transcript_offsets[spoken])
+        self.current_turn = None
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _configure_app_environment(stubs, workdir, warm_cache):
+    """Point the app at the stubs; must run before any app module is imported."""
+    os.environ.update({
+        "OPENAI_API_KEY": "replay",
+        "OPENAI_BASE_URL": stubs.openai_url,
+        "DEEPGRAM_API_KEY": "replay",
+        "DEEPGRAM_HOST": stubs.deepgram_url,
+        "PROFILE_DB_PATH": os.path.join(workdir, "profiles.sqlite3"),
+        "SESSION_RECORD_DIR": "",
+        "CACHE_DIR": "",
+        "LLM_FAST_MODEL": STUB_FAST_MODEL,
+    })
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    if not warm_cache:
+        # Every client replays the same sentences, so a shared TTS cache would hide synthesis latency
+        os.environ["TTS_CACHE_SIZE"] = "0"
+        os.environ["LLM_CACHE_ENABLED"] = "false"
+
+
+async def _start_app(port):
+    import uvicorn
+    sys.path.insert(0, os.path.abspath(SRC_DIR))
+    from main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            raise RuntimeError("App failed to start")
+        await asyncio.sleep(0.05)
+    return server, task
+
+
+def _quantile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def summarize(values):
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+    summary = {"count": len(ordered), "mean_ms": sum(ordered) / len(ordered) * 1000}
+    for q in QUANTILES:
+        summary[f"p{int(q * 100)}_ms"] = _quantile(ordered, q) * 1000
+    summary["max_ms"] = ordered[-1] * 1000
+    return summary
+
+
+def route_summary():
+    """Per-route reply counts, latency and token usage from the in-process app's metrics."""
+    from metrics import LLM_ROUTES, LLM_FIRST_TOKEN_SECONDS, LLM_REPLY_SECONDS, LLM_TOKENS
+
+    routes = {}
+    for (route, reason), count in LLM_ROUTES.values.items():
+        stats = routes.setdefault(route, {"replies": 0, "reasons": {}})
+        stats["replies"] += count
+        stats["reasons"][reason] = count
+    for route, stats in routes.items():
+        first_token = LLM_FIRST_TOKEN_SECONDS.quantiles(route=route)
+        reply = LLM_REPLY_SECONDS.quantiles(route=route)
+        stats["first_token_p50_ms"] = first_token.get(0.5, 0) * 1000
+        stats["reply_p50_ms"] = reply.get(0.5, 0) * 1000
+        stats["prompt_tokens"] = LLM_TOKENS.get(route=route, kind="prompt")
+        stats["completion_tokens"] = LLM_TOKENS.get(route=route, kind="completion")
+    return routes
+
+
+def report(results, args, routes=None):
+    merged = ClientResult()
+    queue_waits = [result.queue_wait for result in results if result.queue_wait is not None]
+    for result in results:
+        merged.time_to_first_audio += result.time_to_first_audio
+        merged.turn_latency += result.turn_latency
+        merged.interrupt_latency += result.interrupt_latency
+        merged.turns += result.turns
+        merged.unanswered += result.unanswered
+        merged.errors += result.errors
+
+    summary = {
+        "clients": args.clients,
+        "profile": args.profile,
+        "turns": merged.turns,
+        "unanswered_turns": merged.unanswered,
+        "rejected": sum(result.rejected for result in results),
+        "queued": len(queue_waits),
+        "slow_clients_disconnected": sum(result.disconnected for result in results),
+        "errors": merged.errors,
+        "time_to_first_audio": summarize(merged.time_to_first_audio),
+        # A session's first reply, the one that pays for any connection setup
+        "first_turn_time_to_first_audio": summarize(
+            [result.time_to_first_audio[0] for result in results if result.time_to_first_audio]
+        ),
+        "turn_latency": summarize(merged.turn_latency),
+        "interrupt_latency": summarize(merged.interrupt_latency),
+        "queue_wait": summarize(queue_waits),
+        "llm_routes": routes or {},
+    }
+
+    print(f"{args.clients} clients, profile {args.profile}, {merged.turns} turns, "
+          f"{merged.unanswered} unanswered, {len(merged.errors)} errors")
+    print(f"  {summary['queued']} queued, {summary['rejected']} rejected, "
+          f"{summary['slow_clients_disconnected']} of {args.slow_clients} slow clients disconnected")
+    for name in ("time_to_first_audio", "turn_latency", "interrupt_latency", "queue_wait"):
+        stats = summary[name]
+        if not stats["count"]:
+            print(f"  {name:<20} no samples")
+            continue
+        print(f"  {name:<20} n={stats['count']:<5} mean={stats['mean_ms']:8.1f} ms  "
+              f"p50={stats['p50_ms']:8.1f}  p95={stats['p95_ms']:8.1f}  p99={stats['p99_ms']:8.1f}  "
+              f"max={stats['max_ms']:8.1f}")
+    for route, stats in summary["llm_routes"].items():
+        reasons = ", ".join(f"{reason}={count}" for reason, count in sorted(stats["reasons"].items()))
+        print(f"  llm route {route:<6} {stats['replies']:>5} replies  "
+              f"first_token p50={stats['first_token_p50_ms']:7.1f} ms  reply p50={stats['reply_p50_ms']:7.1f} ms  "
+              f"tokens {stats['prompt_tokens']} in / {stats['completion_tokens']} out  ({reasons})")
+    for error in merged.errors[:5]:
+        print(f"  error: {error}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+    return summary
+
+
+def listen_url(port, args):
+    url = f"ws://127.0.0.1:{port}/listen?protocol={args.protocol}"
+    if args.output:
+        url += f"&output={args.output}"
+    if args.encoding:
+        url += f"&encoding={args.encoding}&sample_rate={args.sample_rate}"
+    return url
+
+
+async def replay_clients(url, recording, profile, args):
+    """Run args.clients concurrent clients, args.slow_clients of which never read, spread through the ramp."""
+    async with aiohttp.ClientSession() as session:
+        async def client(i):
+            await asyncio.sleep(i * args.ramp)
+            # Slow clients are spaced evenly, so the ones that are admitted past the limits include some
+            reads = (i + 1) * args.slow_clients // args.clients == i * args.slow_clients // args.clients
+            return await ReplayClient(url, recording, profile["stt"], reads).run(session, args.tail)
+
+        return await asyncio.gather(*(client(i) for i in range(args.clients)))
+
+
+def stub_faults(args):
+    return {
+        "llm_error_rate": args.llm_error_rate, "llm_slow_rate": args.llm_slow_rate,
+        "tts_error_rate": args.tts_error_rate, "tts_slow_rate": args.tts_slow_rate,
+        "slow_seconds": args.slow_seconds, "down": tuple(args.down),
+    }
+
+
+async def run(args):
+    if args.recording:
+        recording = load_recording(args.recording)
+    else:
+        recording = synthetic_recording(BARGE_IN_TURNS if args.barge_in else SYNTHETIC_TURNS)
+    profile = LATENCY_PROFILES[args.profile]
+
+    stubs = StubUpstreams(recording, profile, stub_faults(args), args.seed, args.connect_seconds)
+    await stubs.start()
+    with tempfile.TemporaryDirectory() as workdir:
+        _configure_app_environment(stubs, workdir, args.warm_cache)
+        if args.no_routing:
+            os.environ["LLM_ROUTING_ENABLED"] = "false"
+        if args.barge_in:
+            os.environ["FULL_DUPLEX"] = "true"
+        # The local engines need LOCAL_LLM_MODEL_PATH and espeak-ng, and make no network calls
+        os.environ["LLM_BACKEND"] = args.llm_backend
+        os.environ["TTS_BACKEND"] = args.tts_backend
+        if args.local_fallback:
+            os.environ["LOCAL_FALLBACK"] = "true"
+        port = args.port or _free_port()
+        server, server_task = await _start_app(port)
+        try:
+            results = await replay_clients(listen_url(port, args), recording, profile, args)
+            routes = route_summary()
+        finally:
+            server.should_exit = True
+            await server_task
+            await stubs.close()
+
+    return report(results, args, routes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay /listen sessions against stubbed STT, LLM and TTS")
+    parser.add_argument("--recording", help="session recorded with SESSION_RECORD_DIR, synthetic if omitted")
+    parser.add_argument("--clients", type=int, default=1, help="concurrent websocket clients")
+    parser.add_argument("--slow-clients", type=int, default=0, help="clients that send audio but never read replies")
+    parser.add_argument("--ramp", type=float, default=0.0, help="seconds between client starts")
+    parser.add_argument("--profile", choices=sorted(LATENCY_PROFILES), default="realistic")
+    parser.add_argument("--protocol", choices=["json", "binary"], default="binary")
+    parser.add_argument("--output", choices=["linear16", "opus"], help="stream reply audio in chunks instead of one MP3 per sentence")
+    parser.add_argument("--encoding", choices=["linear16"], help="declare the audio as raw PCM so the app can VAD-gate it")
+    parser.add_argument("--sample-rate", type=int, default=16000)
+    parser.add_argument("--tail", type=float, default=10.0, help="seconds to wait for replies after the audio ends")
+    parser.add_argument("--connect-seconds", type=float, default=0.0,
+                        help="handshake cost the stubs add to each new connection")
+    parser.add_argument("--no-routing", action="store_true", help="send every turn to the large model, for comparison")
+    parser.add_argument("--barge-in", action="store_true",
+                        help="replay a synthetic session in which the user interrupts a reply, with FULL_DUPLEX on")
+    parser.add_argument("--llm-backend", choices=["openai", "llama_cpp"], default="openai", help="openai is the stub")
+    parser.add_argument("--tts-backend", choices=["deepgram", "espeak"], default="deepgram", help="deepgram is the stub")
+    parser.add_argument("--local-fallback", action="store_true", help="fall back to the local engines when stub calls fail")
+    parser.add_argument("--warm-cache", action="store_true", help="keep the TTS cache enabled across clients")
+    parser.add_argument("--port", type=int, default=0, help="port for the app, random if omitted")
+    parser.add_argument("--json", help="write the summary to this file")
+    faults = parser.add_argument_group("fault injection")
+    faults.add_argument("--llm-error-rate", type=float, default=0.0, help="share of LLM calls that fail")
+    faults.add_argument("--llm-slow-rate", type=float, default=0.0, help="share of LLM calls that stall before the first token")
+    faults.add_argument("--tts-error-rate", type=float, default=0.0, help="share of TTS calls that fail")
+    faults.add_argument("--tts-slow-rate", type=float, default=0.0, help="share of TTS calls that stall before the first byte")
+    faults.add_argument("--slow-seconds", type=float, default=3.0, help="how long a stalled call stalls")
+    faults.add_argument("--down", nargs="*", default=[], help="models or voices whose every call fails")
+    faults.add_argument("--seed", type=int, default=0, help="seed for which calls fail or stall")
+    args = parser.parse_args()
+
+    summary = asyncio.run(run(args))
+    sys.exit(1 if summary["errors"] else 0)
+
+
+if __name__ == "__main__":
+    main()
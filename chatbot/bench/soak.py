@@ -0,0 +1,158 @@
+"""Check that a worker gives back its memory and tasks after thousands of sessions.
+
+Usage:
+    python bench/soak.py
+    python bench/soak.py --sessions 5000 --concurrency 100 --max-rss-growth-mb 16
+
+Starts one serve.py worker against the stub upstreams and runs short one-turn sessions through
+it in waves of --concurrency clients. Every other client hangs up as soon as its turn is
+transcribed, while the reply is still being generated and spoken, so cancellation is soaked
+as well as the clean path. After --warm-up sessions the worker's resident memory and its
+voice_session_tasks gauge are taken as the baseline. Both are checked again once the last
+wave has drained, which includes the app closing every live transcription stream. Exits
+non-zero if any session tasks or streams are left over, or if RSS grew by more than
+--max-rss-growth-mb.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+import aiohttp
+from concurrency import start_worker, stop_worker
+from recording import SYNTHETIC_TURNS, synthetic_recording, event_schedule, is_final_transcript
+from replay import ReplayClient, listen_url, _configure_app_environment, _free_port
+from stubs import StubUpstreams, LATENCY_PROFILES
+
+# One short turn: greet, get a reply, and leave half a second later
+SOAK_TURN = (SYNTHETIC_TURNS[0][0], SYNTHETIC_TURNS[0][1], 0.5)
+# Audio sent after the final transcript by clients that hang up mid-reply
+HANG_UP_AFTER_SECONDS = 0.1
+DRAIN_TIMEOUT = 30
+CHECKPOINTS = 5
+
+
+def worker_status(process):
+    """Resident memory in MB and thread count of the worker process, from /proc."""
+    fields = {}
+    with open(f"/proc/{process.pid}/status") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            fields[name] = value.split()
+    return int(fields["VmRSS"][0]) / 1024, int(fields["Threads"][0])
+
+
+async def worker_gauges(session, port):
+    """The worker's voice_* gauges without labels, by name."""
+    async with session.get(f"http://127.0.0.1:{port}/metrics") as response:
+        text = await response.text()
+    gauges = {}
+    for line in text.splitlines():
+        if line.startswith("voice_") and "{" not in line:
+            name, value = line.split()
+            gauges[name] = float(value)
+    return gauges
+
+
+async def drained(session, port, stubs):
+    """Gauges once every session and its live transcription stream has closed, waiting up to DRAIN_TIMEOUT."""
+    deadline = time.perf_counter() + DRAIN_TIMEOUT
+    while True:
+        gauges = await worker_gauges(session, port)
+        # Sessions leave the registry before their Deepgram connection has finished closing
+        gauges["open_streams"] = stubs.open_streams
+        if not (gauges.get("voice_active_sessions") or stubs.open_streams) or time.perf_counter() > deadline:
+            return gauges
+        await asyncio.sleep(0.1)
+
+
+def hang_up_recording(recording):
+    """The same session, cut off just after its final transcript."""
+    final_at = next(offset for offset, payload in event_schedule(recording) if is_final_transcript(payload))
+    first = recording["audio"][0]["t"]
+    audio = [frame for frame in recording["audio"] if frame["t"] - first <= final_at + HANG_UP_AFTER_SECONDS]
+    return {**recording, "audio": audio}
+
+
+async def wave(url, recordings, profile, concurrency, tail):
+    """One session per client, half of them hanging up mid-reply; returns the number of errors."""
+    async with aiohttp.ClientSession() as session:
+        clients = [
+            ReplayClient(url, recordings[i % 2], profile["stt"]).run(session, tail if i % 2 == 0 else 0)
+            for i in range(concurrency)
+        ]
+        results = await asyncio.gather(*clients)
+    return sum(len(result.errors) for result in results)
+
+
+def print_checkpoint(sessions, rss, threads, gauges):
+    print(f"{sessions:>8}  {rss:6.1f}  {threads:>7}  {gauges.get('voice_session_tasks', 0):>13.0f}  "
+          f"{gauges.get('voice_active_sessions', 0):>15.0f}  {gauges['open_streams']:>12}")
+
+
+async def run(args):
+    recording = synthetic_recording([SOAK_TURN])
+    recordings = (recording, hang_up_recording(recording))
+    profile = LATENCY_PROFILES[args.profile]
+
+    stubs = StubUpstreams(recording, profile)
+    await stubs.start()
+    with tempfile.TemporaryDirectory() as workdir:
+        _configure_app_environment(stubs, workdir, warm_cache=False)
+        port = _free_port()
+        url = listen_url(port, SimpleNamespace(protocol="binary", output=None, encoding=None))
+        worker = await start_worker(port, args.concurrency)
+        waves = max(1, args.sessions // args.concurrency)
+        errors = 0
+        try:
+            async with aiohttp.ClientSession() as session:
+                # Imports, pools and allocator arenas settle during the warm-up
+                for _ in range(max(1, args.warm_up // args.concurrency)):
+                    errors += await wave(url, recordings, profile, args.concurrency, args.tail)
+                    baseline = await drained(session, port, stubs)
+                baseline_rss, threads = worker_status(worker)
+                print(f"{waves * args.concurrency} sessions in waves of {args.concurrency}, profile {args.profile}")
+                print("sessions  rss MB  threads  session tasks  active sessions  open streams")
+                print_checkpoint(0, baseline_rss, threads, baseline)
+
+                for index in range(1, waves + 1):
+                    errors += await wave(url, recordings, profile, args.concurrency, args.tail)
+                    # Otherwise sessions still closing would count against the next wave's admission
+                    gauges = await drained(session, port, stubs)
+                    if index % max(1, waves // CHECKPOINTS) == 0 or index == waves:
+                        rss, threads = worker_status(worker)
+                        print_checkpoint(index * args.concurrency, rss, threads, gauges)
+        finally:
+            stop_worker(worker)
+            await stubs.close()
+    return baseline, baseline_rss, gauges, rss, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check a worker returns to its baseline memory and tasks after a soak")
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50, help="sessions per wave")
+    parser.add_argument("--warm-up", type=int, default=1000, help="sessions run before the baseline is taken")
+    parser.add_argument("--profile", choices=sorted(LATENCY_PROFILES), default="fast")
+    parser.add_argument("--tail", type=float, default=5.0, help="seconds a client waits for its reply")
+    parser.add_argument("--max-rss-growth-mb", type=float, default=10.0, help="allowed RSS above the baseline")
+    args = parser.parse_args()
+
+    baseline, baseline_rss, gauges, rss, errors = asyncio.run(run(args))
+    failures = []
+    for name in ("voice_session_tasks", "voice_active_sessions", "open_streams"):
+        if gauges.get(name, 0) > baseline.get(name, 0):
+            failures.append(f"{name} is {gauges[name]:.0f}, up from {baseline.get(name, 0):.0f}")
+    if rss - baseline_rss > args.max_rss_growth_mb:
+        failures.append(f"RSS grew {rss - baseline_rss:.1f} MB, over {args.max_rss_growth_mb:.0f} MB")
+    if errors:
+        failures.append(f"{errors} client errors")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+import asyncio
+import base64
+import json
+import random
+import re
+import time
+import weakref
+from aiohttp import web, WSMsgType
+from recording import event_schedule
+
+# Seconds of latency each stub adds, per profile
+LATENCY_PROFILES = {
+    "instant": {"stt": 0.0, "llm_first_token": 0.0, "llm_token": 0.0, "tts_first_byte": 0.0, "tts_chunk": 0.0},
+    "fast": {"stt": 0.05, "llm_first_token": 0.15, "llm_token": 0.01, "tts_first_byte": 0.08, "tts_chunk": 0.005},
+    "realistic": {"stt": 0.15, "llm_first_token": 0.45, "llm_token": 0.03, "tts_first_byte": 0.25, "tts_chunk": 0.02},
+    "slow": {"stt": 0.3, "llm_first_token": 1.2, "llm_token": 0.06, "tts_first_byte": 0.6, "tts_chunk": 0.05},
+}
+
+DEFAULT_REPLY = "Sure. This is a replayed response for benchmarking."
+# Injected faults: the share of LLM and TTS calls that fail or stall before their first result,
+# how long a stalled call stalls, and models or voices that fail every call
+NO_FAULTS = {
+    "llm_error_rate": 0.0, "llm_slow_rate": 0.0, "tts_error_rate": 0.0, "tts_slow_rate": 0.0,
+    "slow_seconds": 3.0, "down": (),
+}
+# The app's fast route is pointed at this model name, which streams at a fraction of the profile's LLM latency
+STUB_FAST_MODEL = "stub-fast"
+FAST_MODEL_LATENCY_FACTOR = 0.4
+# Synthetic MP3 size per character of text, about 48 kbps at a normal speaking rate
+SYNTHETIC_SPEECH_BYTES_PER_CHAR = 400
+SPEECH_CHUNK_BYTES = 4096
+# Summary requests ask for at most this many words, and the stub answers with that many
+SUMMARY_WORD_LIMIT = re.compile(r"less than (\d+) words")
+
+
+def _normalize(text):
+    return " ".join("".join(c for c in text.lower() if c.isalnum() or c.isspace()).split())
+
+
+class StubUpstreams:
+    """Local stand-ins for Deepgram live, Deepgram speak and OpenAI chat completions."""
+
+    def __init__(self, recording, profile, faults=None, seed=0, connect_seconds=0.0):
+        self.profile = profile
+        self.faults = {**NO_FAULTS, **(faults or {})}
+        # Added to the first HTTP request on each new connection, standing in for the TCP and TLS handshakes
+        self.connect_seconds = connect_seconds
+        self.connections = weakref.WeakSet()
+        self.random = random.Random(seed)
+        self.calls = {"llm": 0, "tts": 0}
+        # Estimated prompt tokens of each streamed completion, in arrival order
+        self.prompt_tokens = []
+        # Live transcription streams the app has not closed yet
+        self.open_streams = 0
+        self.schedule = event_schedule(recording)
+        self.replies = [(_normalize(r["transcript"]), r["response"]) for r in recording["replies"]]
+        self.speech = {_normalize(s["sentence"]): base64.b64decode(s["audio"]) for s in recording["speech"]}
+        self.runners = []
+        self.deepgram_url = None
+        self.openai_url = None
+
+    async def start(self, host="127.0.0.1"):
+        deepgram = web.Application()
+        deepgram.router.add_get("/v1/listen", self.listen)
+        deepgram.router.add_post("/v1/speak", self.speak)
+        deepgram.router.add_route("HEAD", "/", self.ping)
+
+        openai = web.Application()
+        openai.router.add_get("/v1/models", self.models)
+        openai.router.add_post("/v1/chat/completions", self.chat_completions)
+
+        deepgram_port = await self._serve(deepgram, host)
+        openai_port = await self._serve(openai, host)
+        self.deepgram_url = f"http://{host}:{deepgram_port}"
+        self.openai_url = f"http://{host}:{openai_port}/v1"
+
+    async def _serve(self, app, host):
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, host, 0)
+        await site.start()
+        self.runners.append(runner)
+        return runner.addresses[0][1]
+
+    async def close(self):
+        for runner in self.runners:
+            await runner.cleanup()
+        self.runners = []
+
+    async def _handshake(self, request):
+        """Wait out the handshake cost if this request opened a new connection."""
+        if self.connect_seconds and request.transport not in self.connections:
+            self.connections.add(request.transport)
+            await asyncio.sleep(self.connect_seconds)
+
+    async def ping(self, request):
+        await self._handshake(request)
+        return web.Response()
+
+    async def listen(self, request):
+        """Play the recorded Deepgram events back, timed from the first audio frame received.
+
+        The client's clock starts at its first frame too, which keeps the two lined up when VAD
+        gating holds the first frames back or the app took the connection from a ready pool.
+        No handshake cost is added here: Deepgram catches up on audio buffered while the
+        connection opened, which replayed timing cannot reproduce.
+        """
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        playback = None
+        self.open_streams += 1
+
+        try:
+            async for message in ws:
+                if message.type == WSMsgType.BINARY and playback is None:
+                    playback = asyncio.create_task(self._play_events(ws, time.perf_counter()))
+                elif message.type == WSMsgType.TEXT and json.loads(message.data).get("type") == "CloseStream":
+                    break
+        finally:
+            self.open_streams -= 1
+
+        if playback:
+            playback.cancel()
+        await ws.close()
+        return ws
+
+    async def _play_events(self, ws, started_at):
+        try:
+            for offset, payload in self.schedule:
+                delay = started_at + offset + self.profile["stt"] - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                await ws.send_str(json.dumps(payload))
+        except ConnectionResetError:
+            pass
+
+    def _fault(self, kind, name):
+        """"error", "slow" or None for the next call, drawn from the configured fault rates."""
+        self.calls[kind] += 1
+        if name in self.faults["down"]:
+            return "error"
+        roll = self.random.random()
+        error_rate = self.faults[f"{kind}_error_rate"]
+        if roll < error_rate:
+            return "error"
+        if roll < error_rate + self.faults[f"{kind}_slow_rate"]:
+            return "slow"
+        return None
+
+    async def speak(self, request):
+        """Stream the recorded audio for a sentence, or deterministic filler bytes of a realistic size."""
+        await self._handshake(request)
+        fault = self._fault("tts", request.query.get("model"))
+        if fault == "error":
+            return web.json_response({"err_msg": "injected fault"}, status=503)
+        try:
+            text = (await request.json())["text"]
+        except ConnectionResetError:
+            # The app cancelled synthesis before it finished sending the text
+            return web.Response(status=499)
+        audio = self.speech.get(_normalize(text))
+        if audio is None:
+            audio = bytes(i % 251 for i in range(len(text) * SYNTHETIC_SPEECH_BYTES_PER_CHAR))
+
+        # Metadata headers Deepgram sends with speech, which the SDK's REST client requires
+        response = web.StreamResponse(headers={
+            "Content-Type": "audio/mpeg", "request-id": "replay", "model-uuid": "replay",
+            "model-name": request.query.get("model", "replay"), "char-count": str(len(text)),
+        })
+        try:
+            await response.prepare(request)
+            await asyncio.sleep(self.profile["tts_first_byte"] + (self.faults["slow_seconds"] if fault else 0))
+            for i in range(0, len(audio), SPEECH_CHUNK_BYTES):
+                if i:
+                    await asyncio.sleep(self.profile["tts_chunk"])
+                await response.write(audio[i:i + SPEECH_CHUNK_BYTES])
+            await response.write_eof()
+        except ConnectionResetError:
+            # The app cancelled synthesis, e.g. after an interruption
+            pass
+        return response
+
+    async def models(self, request):
+        await self._handshake(request)
+        return web.json_response({"object": "list", "data": []})
+
+    def _reply_for(self, messages):
+        """The recorded reply whose transcript appears in the latest user message."""
+        user_messages = [m["content"] for m in messages if m.get("role") == "user"]
+        prompt = _normalize(user_messages[-1]) if user_messages else ""
+        matches = [(len(transcript), reply) for transcript, reply in self.replies if transcript and transcript in prompt]
+        return max(matches)[1] if matches else DEFAULT_REPLY
+
+    def _summary_for(self, messages):
+        """A summary as long as the request allows, or an empty JSON object for profile extraction."""
+        limit = SUMMARY_WORD_LIMIT.search(messages[-1]["content"]) if messages else None
+        return " ".join(["remembered"] * int(limit.group(1))) if limit else "{}"
+
+    async def chat_completions(self, request):
+        await self._handshake(request)
+        try:
+            body = await request.json()
+        except ConnectionResetError:
+            # A hedged duplicate the app cancelled before it finished sending the prompt
+            return web.Response(status=499)
+        if not body.get("stream"):
+            # Summaries and profile extraction, which never sit on the reply path
+            return web.json_response(self._completion(body.get("model", "stub"), self._summary_for(body["messages"])))
+
+        reply = self._reply_for(body["messages"])
+        prompt_tokens = sum(len(m["content"]) for m in body["messages"]) // 4 + 1
+        self.prompt_tokens.append(prompt_tokens)
+        model = body.get("model", "stub")
+        fault = self._fault("llm", model)
+        if fault == "error":
+            return web.json_response({"error": {"message": "injected fault", "type": "server_error"}}, status=503)
+        factor = FAST_MODEL_LATENCY_FACTOR if model == STUB_FAST_MODEL else 1.0
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        try:
+            await response.prepare(request)
+            # Reading the prompt takes longer the longer it is, when the profile sets a per-token cost
+            prefill = prompt_tokens * self.profile.get("llm_prompt_token", 0.0)
+            await asyncio.sleep(
+                self.profile["llm_first_token"] * factor + prefill + (self.faults["slow_seconds"] if fault else 0)
+            )
+            tokens = reply.split(" ")
+            for i, token in enumerate(tokens):
+                if i:
+                    await asyncio.sleep(self.profile["llm_token"] * factor)
+                content = token if i == 0 else " " + token
+                await response.write(self._chunk(model, {"content": content}, None))
+            await response.write(self._chunk(model, {}, "stop"))
+            if body.get("stream_options", {}).get("include_usage"):
+                await response.write(self._usage_chunk(model, prompt_tokens, len(tokens)))
+            await response.write(b"data: [DONE]\n\n")
+            await response.write_eof()
+        except ConnectionResetError:
+            # The app dropped the stream, e.g. after an interruption
+            pass
+        return response
+
+    def _chunk(self, model, delta, finish_reason):
+        chunk = {
+            "id": "chatcmpl-replay",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        return f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+
+    def _usage_chunk(self, model, prompt_tokens, completion_tokens):
+        chunk = {
+            "id": "chatcmpl-replay",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": model,
+            "choices": [],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+        return f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+
+    def _completion(self, model, content):
+        return {
+            "id": "chatcmpl-replay",
+            "object": "chat.completion",
+            "created": 0,
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
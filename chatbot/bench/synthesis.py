@@ -0,0 +1,174 @@
+"""Per-sentence synthesis overhead: the old temp-file path against the in-memory one.
+
+Usage:
+    python bench/synthesis.py
+    python bench/synthesis.py --rounds 5 --profile fast
+
+Synthesizes every sentence in the reply corpus against the stub TTS server three ways:
+
+    sdk_temp_file   the removed path: the Deepgram SDK's blocking save() into a temp file,
+                    read back and unlinked
+    pool_temp_file  the pooled stream, still written to a temp file and read back
+    in_memory       AudioProcessor.generate_speech_audio, buffering the pooled stream in memory
+
+With the default instant profile the stub answers at once, so the times are the per-sentence
+overhead of each path. Also reports the longest the event loop was blocked during each
+sentence, which stalls every other session on the worker while it lasts.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+from replay import SRC_DIR, summarize, _configure_app_environment
+from stubs import StubUpstreams, LATENCY_PROFILES
+
+# Sleep requested by the loop-lag probe; anything past it is time the loop was blocked
+PROBE_SECONDS = 0.001
+
+
+class LoopLag:
+    """Measures the longest stretch the event loop went without running a ready callback."""
+
+    def __init__(self):
+        self.longest = 0.0
+        self.task = None
+
+    async def _probe(self):
+        while True:
+            started_at = time.perf_counter()
+            await asyncio.sleep(PROBE_SECONDS)
+            self.longest = max(self.longest, time.perf_counter() - started_at - PROBE_SECONDS)
+
+    async def __aenter__(self):
+        self.task = asyncio.ensure_future(self._probe())
+        # Let the probe start its first sleep before the measured call runs
+        await asyncio.sleep(0)
+        return self
+
+    async def __aexit__(self, *exc):
+        # Let the probe wake up and count a blocking call that just ended
+        await asyncio.sleep(PROBE_SECONDS * 2)
+        self.task.cancel()
+
+
+class StubThread:
+    """The stub upstreams on their own thread and event loop, so a blocking call cannot stall them."""
+
+    def __init__(self, profile):
+        self.loop = asyncio.new_event_loop()
+        self.stubs = StubUpstreams({"events": [], "replies": [], "speech": [], "audio": []}, profile)
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self.stubs.start(), self.loop).result()
+        return self.stubs
+
+    def __exit__(self, *exc):
+        asyncio.run_coroutine_threadsafe(self.stubs.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+def sdk_temp_file(deepgram):
+    """The per-sentence synthesis path before in-memory buffering."""
+    from deepgram import SpeakOptions
+
+    async def synthesize(sentence):
+        with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as temp_file:
+            temp_filename = temp_file.name
+        deepgram.speak.rest.v("1").save(temp_filename, {"text": sentence}, SpeakOptions(model="aura-2-thalia-en"))
+        with open(temp_filename, "rb") as f:
+            audio = f.read()
+        os.unlink(temp_filename)
+        return audio
+    return synthesize
+
+
+def pool_temp_file(audio_processor):
+    async def synthesize(sentence):
+        with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as temp_file:
+            temp_filename = temp_file.name
+            async for chunk in audio_processor.stream_speech_audio(sentence):
+                temp_file.write(chunk)
+        with open(temp_filename, "rb") as f:
+            audio = f.read()
+        os.unlink(temp_filename)
+        return audio
+    return synthesize
+
+
+def in_memory(audio_processor):
+    return audio_processor.generate_speech_audio
+
+
+async def measure(synthesize, sentences, rounds):
+    """Seconds per sentence, and the longest the loop was blocked during each sentence."""
+    times, stalls = [], []
+    for _ in range(rounds):
+        for sentence in sentences:
+            async with LoopLag() as lag:
+                started_at = time.perf_counter()
+                audio = await synthesize(sentence)
+                times.append(time.perf_counter() - started_at)
+            stalls.append(lag.longest)
+            if not audio:
+                raise RuntimeError(f"No audio for {sentence!r}")
+    return times, stalls
+
+
+async def run(args):
+    results = {}
+    with StubThread(LATENCY_PROFILES[args.profile]) as stubs, tempfile.TemporaryDirectory() as workdir:
+        # The TTS cache would answer repeated sentences without synthesizing them
+        _configure_app_environment(stubs, workdir, warm_cache=False)
+        sys.path.insert(0, os.path.abspath(SRC_DIR))
+        from deepgram import DeepgramClient, DeepgramClientOptions
+        from backends.cloud import cloud_backends
+        from clients import SessionBackends
+        from audio_processing.audio import AudioProcessor, SENTENCE_BOUNDARY
+        from chunking import load_corpus
+
+        sentences = [s.strip() for reply in load_corpus(args.recording) for s in SENTENCE_BOUNDARY.split(reply) if s.strip()]
+
+        backends = dict(cloud_backends())
+        audio_processor = AudioProcessor(SessionBackends(backends["stt"], backends["llm"], backends["tts"]))
+        deepgram = DeepgramClient("bench", DeepgramClientOptions(url=stubs.deepgram_url))
+        paths = {
+            "sdk_temp_file": sdk_temp_file(deepgram),
+            "pool_temp_file": pool_temp_file(audio_processor),
+            "in_memory": in_memory(audio_processor),
+        }
+        try:
+            for synthesize in paths.values():
+                # Opens connections and fills the page cache before anything is timed
+                await measure(synthesize, sentences[:3], 1)
+            for name, synthesize in paths.items():
+                results[name] = await measure(synthesize, sentences, args.rounds)
+        finally:
+            for backend in backends.values():
+                await backend.close()
+    return len(sentences), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-sentence TTS overhead of the temp-file and in-memory paths")
+    parser.add_argument("--recording", nargs="*", default=[], help="recorded sessions to take replies from")
+    parser.add_argument("--rounds", type=int, default=3, help="passes over the corpus per path")
+    parser.add_argument("--profile", choices=sorted(LATENCY_PROFILES), default="instant")
+    args = parser.parse_args()
+
+    sentences, results = asyncio.run(run(args))
+    print(f"{sentences} sentences x {args.rounds} rounds, profile {args.profile}")
+    print("path             mean     p50     p99   longest loop stall p50/max  (ms per sentence)")
+    for name, (times, stalls) in results.items():
+        stats, stall_stats = summarize(times), summarize(stalls)
+        print(f"{name:<14} {stats['mean_ms']:6.2f}  {stats['p50_ms']:6.2f}  {stats['p99_ms']:6.2f}   "
+              f"{stall_stats['p50_ms']:6.2f} / {stall_stats['max_ms']:6.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Tail latency under injected LLM and TTS faults, with and without hedging.
+
+Usage:
+    python bench/tail.py
+    python bench/tail.py --clients 30 --llm-slow-rate 0.05 --tts-slow-rate 0.05 --slow-seconds 4
+    python bench/tail.py --down stub-fast --llm-slow-rate 0
+
+Runs the replay harness twice against stubs that stall or fail a share of calls, once with
+HEDGE_ENABLED=false and once with it on, and compares time to first audio and turn latency.
+Each run is its own process because the app reads its config at import. --down takes
+models or voices that fail every call, to exercise the circuit breakers and fallbacks.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+METRICS = ("time_to_first_audio", "turn_latency")
+
+
+def replay(args, hedging):
+    with tempfile.NamedTemporaryFile(suffix=".json") as output:
+        command = [
+            sys.executable, os.path.join(BENCH_DIR, "replay.py"),
+            "--clients", str(args.clients), "--ramp", str(args.ramp), "--profile", args.profile,
+            "--llm-slow-rate", str(args.llm_slow_rate), "--llm-error-rate", str(args.llm_error_rate),
+            "--tts-slow-rate", str(args.tts_slow_rate), "--tts-error-rate", str(args.tts_error_rate),
+            "--slow-seconds", str(args.slow_seconds), "--seed", str(args.seed), "--json", output.name,
+        ]
+        if args.down:
+            command += ["--down", *args.down]
+        if args.recording:
+            command += ["--recording", args.recording]
+        env = {**os.environ, "HEDGE_ENABLED": "true" if hedging else "false"}
+        # Short runs have few turns, so switch from the default delay to the percentile sooner
+        env.setdefault("HEDGE_MIN_SAMPLES", "10")
+        subprocess.run(command, env=env, check=False, stdout=subprocess.DEVNULL)
+        with open(output.name) as f:
+            return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare tail latency with and without hedged requests")
+    parser.add_argument("--recording", help="session recorded with SESSION_RECORD_DIR, synthetic if omitted")
+    # Four turns a client: at 20 clients p99 is the single worst turn, so one unlucky sentence decides it
+    parser.add_argument("--clients", type=int, default=40)
+    parser.add_argument("--ramp", type=float, default=0.05, help="seconds between client starts")
+    parser.add_argument("--profile", default="realistic")
+    parser.add_argument("--llm-error-rate", type=float, default=0.02)
+    parser.add_argument("--llm-slow-rate", type=float, default=0.04)
+    parser.add_argument("--tts-error-rate", type=float, default=0.02)
+    parser.add_argument("--tts-slow-rate", type=float, default=0.04)
+    parser.add_argument("--slow-seconds", type=float, default=3.0)
+    parser.add_argument("--down", nargs="*", default=[], help="models or voices whose every call fails")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    runs = {"baseline": replay(args, hedging=False), "hedged": replay(args, hedging=True)}
+
+    print(f"{args.clients} clients, LLM {args.llm_slow_rate:.0%} slow / {args.llm_error_rate:.0%} failing, "
+          f"TTS {args.tts_slow_rate:.0%} slow / {args.tts_error_rate:.0%} failing, stalls {args.slow_seconds}s")
+    for name in METRICS:
+        print(f"  {name}")
+        for label, summary in runs.items():
+            stats = summary[name]
+            if not stats["count"]:
+                print(f"    {label:<9} no samples")
+                continue
+            print(f"    {label:<9} n={stats['count']:<5} p50={stats['p50_ms']:8.1f}  "
+                  f"p95={stats['p95_ms']:8.1f}  p99={stats['p99_ms']:8.1f} ms")
+        before, after = runs["baseline"][name], runs["hedged"][name]
+        if before["count"] and after["count"]:
+            print(f"    p99 change with hedging: {after['p99_ms'] - before['p99_ms']:+.1f} ms")
+    for label, summary in runs.items():
+        print(f"  {label:<9} {summary['unanswered_turns']} unanswered turns, {len(summary['errors'])} errors")
+
+    sys.exit(1 if runs["hedged"]["unanswered_turns"] > runs["baseline"]["unanswered_turns"] else 0)
+
+
+if __name__ == "__main__":
+    main()
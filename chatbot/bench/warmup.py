@@ -0,0 +1,74 @@
+"""First-turn latency of a fresh worker with and without warmed upstream connections.
+
+Usage:
+    python bench/warmup.py
+    python bench/warmup.py --runs 5 --connect-seconds 0.3 --pool-size 2
+
+Starts a new app instance for every run and replays one session against it. The stubs add
+--connect-seconds to the first LLM and TTS request on each new connection, standing in for
+the TCP and TLS handshakes to the real providers. The cold worker has UPSTREAM_WARM_UP off
+and no ready Deepgram connections, so its first reply pays for opening the LLM and TTS
+connections. The warm worker opened them at startup. Later turns reuse the connections
+either way, so they should match. Each run is its own process because the app reads its
+config at import.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+MODES = {
+    "cold": {"UPSTREAM_WARM_UP": "false", "DEEPGRAM_LIVE_POOL_SIZE": "0"},
+    "warm": {"UPSTREAM_WARM_UP": "true"},
+}
+
+
+def replay(args, mode):
+    with tempfile.NamedTemporaryFile(suffix=".json") as output:
+        command = [
+            sys.executable, os.path.join(BENCH_DIR, "replay.py"), "--clients", "1", "--profile", args.profile,
+            "--connect-seconds", str(args.connect_seconds), "--json", output.name,
+        ]
+        env = {**os.environ, **MODES[mode]}
+        if mode == "warm":
+            env["DEEPGRAM_LIVE_POOL_SIZE"] = str(args.pool_size)
+        subprocess.run(command, env=env, check=False, stdout=subprocess.DEVNULL)
+        with open(output.name) as f:
+            return json.load(f)
+
+
+def _median(values):
+    ordered = sorted(values)
+    return ordered[len(ordered) // 2] if ordered else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare a fresh worker's first-turn latency, cold and warm")
+    parser.add_argument("--runs", type=int, default=3, help="fresh workers per mode")
+    parser.add_argument("--connect-seconds", type=float, default=0.2, help="handshake cost per new connection")
+    parser.add_argument("--pool-size", type=int, default=2, help="ready Deepgram connections in warm mode")
+    parser.add_argument("--profile", default="realistic")
+    args = parser.parse_args()
+
+    print(f"{args.runs} runs per mode, profile {args.profile}, {args.connect_seconds * 1000:.0f} ms per handshake")
+    print("mode  first turn first_audio median  later turns p50  unanswered")
+    results = {}
+    for mode in MODES:
+        runs = [replay(args, mode) for _ in range(args.runs)]
+        first = _median([run["first_turn_time_to_first_audio"]["mean_ms"] for run in runs
+                         if run["first_turn_time_to_first_audio"]["count"]])
+        later = _median([run["time_to_first_audio"]["p50_ms"] for run in runs if run["time_to_first_audio"]["count"]])
+        unanswered = sum(run["unanswered_turns"] for run in runs)
+        results[mode] = first
+        print(f"{mode:<5} {first or 0:30.1f} ms  {later or 0:12.1f} ms  {unanswered:>10}")
+
+    if results["cold"] is not None and results["warm"] is not None:
+        print(f"warm-up saves {results['cold'] - results['warm']:.1f} ms on the first turn")
+    sys.exit(0 if results["warm"] is not None and results["warm"] <= (results["cold"] or 0) else 1)
+
+
+if __name__ == "__main__":
+    main()
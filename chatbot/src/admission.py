@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import time
+from config import (
+    MAX_SESSIONS, MAX_UPSTREAM_CALLS, ADMISSION_QUEUE_SIZE, ADMISSION_QUEUE_TIMEOUT, ADMISSION_RETRY_AFTER
+)
+from metrics import ADMISSIONS, UPSTREAM_CALLS, ADMISSION_WAIT_SECONDS, WORKER_DRAINING
+
+# Upstream load can fall without a session leaving, so queued sessions re-check this often
+ADMISSION_RECHECK_SECONDS = 0.25
+
+upstream_slots = []
+
+
+class UpstreamSlots:
+    """Bounds concurrent calls to one upstream and counts calls holding or waiting for a slot."""
+
+    def __init__(self, kind, limit):
+        self.kind = kind
+        self.semaphore = asyncio.Semaphore(limit)
+        self.pending = 0
+        upstream_slots.append(self)
+
+    async def __aenter__(self):
+        self.pending += 1
+        UPSTREAM_CALLS.inc(kind=self.kind)
+        try:
+            await self.semaphore.acquire()
+        except BaseException:
+            self._done()
+            raise
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.semaphore.release()
+        self._done()
+
+    def _done(self):
+        self.pending -= 1
+        UPSTREAM_CALLS.dec(kind=self.kind)
+
+
+def pending_upstream_calls():
+    return sum(slots.pending for slots in upstream_slots)
+
+
+class AdmissionController:
+    """Admits /listen sessions while this worker has headroom, queueing a few and rejecting the rest."""
+
+    def __init__(self, max_sessions, max_upstream_calls, queue_size, queue_timeout, retry_after):
+        self.max_sessions = max_sessions
+        self.max_upstream_calls = max_upstream_calls
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.active = 0
+        self.waiting = 0
+        self.changed = asyncio.Condition()
+        # Set on SIGTERM: no new sessions, and open ones end at their next pause
+        self.draining = asyncio.Event()
+
+    def has_headroom(self):
+        if self.draining.is_set():
+            return False
+        return self.active < self.max_sessions and pending_upstream_calls() < self.max_upstream_calls
+
+    def start_draining(self):
+        logging.info(f"Draining: turning away new sessions, {self.active} still active")
+        WORKER_DRAINING.set(1)
+        self.draining.set()
+
+    def status(self):
+        """Current load for the readiness check."""
+        return {
+            "draining": self.draining.is_set(),
+            "sessions": self.active,
+            "max_sessions": self.max_sessions,
+            "queued_sessions": self.waiting,
+            "upstream_calls": pending_upstream_calls(),
+            "max_upstream_calls": self.max_upstream_calls,
+        }
+
+    def can_queue(self):
+        return self.waiting < self.queue_size
+
+    async def admit(self):
+        """Wait for a free session slot, returning False if the queue timeout runs out first."""
+        if self.has_headroom():
+            self.active += 1
+            ADMISSIONS.inc(result="admitted")
+            return True
+
+        started_at = time.perf_counter()
+        deadline = started_at + self.queue_timeout
+        self.waiting += 1
+        try:
+            async with self.changed:
+                while not self.has_headroom():
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0 or self.draining.is_set():
+                        return False
+                    try:
+                        await asyncio.wait_for(self.changed.wait(), min(remaining, ADMISSION_RECHECK_SECONDS))
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        ADMISSIONS.inc(result="queued")
+        ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - started_at)
+        return True
+
+    def reject(self, reason="rejected"):
+        ADMISSIONS.inc(result=reason)
+        logging.warning(
+            f"Turning session away ({reason}): {self.active} active, {self.waiting} queued, "
+            f"{pending_upstream_calls()} upstream calls pending"
+        )
+
+    async def release(self):
+        self.active -= 1
+        async with self.changed:
+            self.changed.notify()
+
+
+admission = AdmissionController(
+    MAX_SESSIONS, MAX_UPSTREAM_CALLS, ADMISSION_QUEUE_SIZE, ADMISSION_QUEUE_TIMEOUT, ADMISSION_RETRY_AFTER
+)
@@ -1,25 +1,20 @@
-from openai import OpenAI
-from dotenv import load_dotenv
-import os
 import json
 import logging
+from clients import upstream
+from config import LLM_LARGE_MODEL
 from .prompts import json_extraction_query
 
-load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-def extract_context(prompt):   
-    completion = client.chat.completions.create(
-        model="gpt-4",
-        messages=[
+async def extract_context(prompt):   
+    llm = upstream.default.llm
+    response_text = await llm.complete(
+        llm.model_for(LLM_LARGE_MODEL),
+        [
             {
                 "role": "user",
                 "content": f"{json_extraction_query} {prompt}",
             }
         ]
     )
-
-    response_text = completion.choices[0].message.content
     
     try:
         extracted_data = json.loads(response_text)
@@ -0,0 +1,83 @@
+import asyncio
+import logging
+from config import MEMORY_TOKEN_BUDGET, MEMORY_SUMMARY_MAX_WORDS
+from .prompts import bot_background_information, basic_response, conversation_summary_query
+from .response import response_generator
+
+
+def estimate_tokens(text):
+    """Rough token count, about four characters per token for English text."""
+    return len(text) // 4 + 1
+
+
+class ConversationMemory:
+    """Token-budgeted window of recent turns with older turns folded into a rolling summary."""
+    
+    def __init__(self, token_budget=MEMORY_TOKEN_BUDGET):
+        self.token_budget = token_budget
+        self.summary = ""
+        self.profile = ""
+        self.recent_turns = []
+        self.unsummarized_turns = []
+        self.summary_task = None
+        
+    def is_empty(self):
+        return not self.summary and not self.recent_turns and not self.profile
+        
+    def build_messages(self, user_message):
+        """Chat messages for the next reply: background, summary, recent turns and the new message."""
+        system_prompt = bot_background_information
+        if self.profile:
+            system_prompt += f"\n    Background information on the user: {self.profile}"
+        if self.summary:
+            system_prompt += f"\n    Summary of the conversation so far: {self.summary}"
+            
+        return [
+            {"role": "system", "content": system_prompt},
+            *self.recent_turns,
+            {"role": "user", "content": f"{basic_response} {user_message}"}
+        ]
+        
+    def add_turn(self, user_message, assistant_message):
+        """Record a finished turn and move whatever no longer fits the budget out for summarizing."""
+        self.recent_turns.append({"role": "user", "content": user_message})
+        if assistant_message:
+            self.recent_turns.append({"role": "assistant", "content": assistant_message})
+            
+        while self.recent_turns and self._recent_tokens() > self.token_budget:
+            self.unsummarized_turns.append(self.recent_turns.pop(0))
+            
+    def schedule_summary(self):
+        """Fold evicted turns into the summary in the background, one summary call at a time."""
+        if not self.unsummarized_turns:
+            return None
+        if self.summary_task and not self.summary_task.done():
+            return self.summary_task
+        
+        self.summary_task = asyncio.create_task(self.summarize())
+        return self.summary_task
+        
+    async def summarize(self):
+        """Fold evicted turns into the rolling summary."""
+        turns = self.unsummarized_turns
+        self.unsummarized_turns = []
+        transcript = "\n".join(f"{turn['role']}: {turn['content']}" for turn in turns)
+        
+        try:
+            self.summary = await response_generator(
+                f"{conversation_summary_query.format(max_words=MEMORY_SUMMARY_MAX_WORDS)}\n"
+                f"Existing summary: {self.summary}\n"
+                f"New turns:\n{transcript}"
+            )
+        except Exception as e:
+            logging.error(f"Error summarizing conversation: {e}")
+            # Keep the turns so the next summary attempt includes them
+            self.unsummarized_turns = turns + self.unsummarized_turns
+            
+    def cancel(self):
+        if self.summary_task:
+            self.summary_task.cancel()
+            self.summary_task = None
+            
+    def _recent_tokens(self):
+        return sum(estimate_tokens(turn["content"]) for turn in self.recent_turns)
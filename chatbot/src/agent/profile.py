@@ -0,0 +1,230 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from config import (
+    PROFILE_DB_PATH, PROFILE_BATCH_TURNS, PROFILE_WORKERS, PROFILE_QUEUE_SIZE, PROFILE_MAX_NOTES,
+    PROFILE_CACHE_SIZE
+)
+from .extractor import extract_context
+
+
+def merge_profile(profile, extracted):
+    """Merge freshly extracted fields into a stored profile."""
+    merged = dict(profile)
+    for field in ("first_name", "last_name"):
+        value = extracted.get(field)
+        if isinstance(value, str) and value.strip() and value.strip().lower() != "none":
+            merged[field] = value.strip()
+
+    notes = list(merged.get("notes", []))
+    for note in extracted.get("notes") or []:
+        if isinstance(note, str) and note.strip() and note.strip() not in notes:
+            notes.append(note.strip())
+    merged["notes"] = notes[-PROFILE_MAX_NOTES:]
+    return merged
+
+
+def compact_profile(profile):
+    """One-paragraph profile suitable for the system prompt."""
+    if not profile:
+        return ""
+
+    parts = []
+    name = " ".join(filter(None, [profile.get("first_name"), profile.get("last_name")]))
+    if name:
+        parts.append(f"The user's name is {name}.")
+    if profile.get("notes"):
+        parts.append("What you know about the user: " + "; ".join(profile["notes"]) + ".")
+    return " ".join(parts)
+
+
+class ProfileStore:
+    """SQLite-backed user profiles with a bounded in-memory read-through cache.
+
+    Profiles merged but not yet written are never evicted, so the writer always finds them.
+    """
+
+    def __init__(self, path, cache_size=PROFILE_CACHE_SIZE):
+        self.path = path
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.dirty = set()
+        self.reader = None
+        # Reads run on worker threads, which must not share the connection at the same time
+        self.read_lock = threading.Lock()
+        self.writer = None
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS profiles (user_id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+        return conn
+
+    async def open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.writer = await asyncio.to_thread(self._connect)
+        self.reader = await asyncio.to_thread(self._connect)
+
+    async def close(self):
+        for conn in (self.reader, self.writer):
+            if conn:
+                await asyncio.to_thread(conn.close)
+        self.reader = self.writer = None
+
+    async def get(self, user_id):
+        """Return the stored profile for a user, loading it into the cache on first use."""
+        if user_id in self.cache:
+            self.cache.move_to_end(user_id)
+            return self.cache[user_id]
+        loaded = await asyncio.to_thread(self._read, user_id)
+        # Another worker may have merged into the cache while we were reading
+        if user_id not in self.cache:
+            self._remember(user_id, loaded)
+        return self.cache[user_id]
+
+    def get_cached(self, user_id):
+        if user_id not in self.cache:
+            return {}
+        # Open sessions read their profile every turn, which keeps it from ageing out
+        self.cache.move_to_end(user_id)
+        return self.cache[user_id]
+
+    def put(self, user_id, profile):
+        """Cache a merged profile, kept until write_many has persisted it."""
+        self.dirty.add(user_id)
+        self._remember(user_id, profile)
+
+    async def write_many(self, profiles):
+        """Persist a batch of profiles in a single transaction."""
+        for user_id, profile in profiles.items():
+            self._remember(user_id, profile)
+        rows = [(user_id, json.dumps(profile)) for user_id, profile in profiles.items()]
+        await asyncio.to_thread(self._write, rows)
+        for user_id, profile in profiles.items():
+            # A newer merge that landed during the write still has to be written
+            if self.cache.get(user_id) is profile:
+                self.dirty.discard(user_id)
+        self._evict()
+
+    def _remember(self, user_id, profile):
+        self.cache[user_id] = profile
+        self.cache.move_to_end(user_id)
+        self._evict()
+
+    def _evict(self):
+        """Drop the least recently used written profiles until the cache fits."""
+        for user_id in list(self.cache):
+            if len(self.cache) <= self.cache_size:
+                break
+            if user_id not in self.dirty:
+                del self.cache[user_id]
+
+    def _read(self, user_id):
+        with self.read_lock:
+            row = self.reader.execute("SELECT data FROM profiles WHERE user_id = ?", (user_id,)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def _write(self, rows):
+        with self.writer:
+            self.writer.executemany(
+                "INSERT INTO profiles (user_id, data) VALUES (?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET data = excluded.data",
+                rows
+            )
+
+
+class ProfilePipeline:
+    """Batches finished turns per session and extracts user profiles off the critical path."""
+
+    def __init__(self, store):
+        self.store = store
+        self.pending_turns = {}
+        self.jobs = None
+        self.updates = None
+        self.tasks = []
+
+    async def start(self):
+        await self.store.open()
+        self.jobs = asyncio.Queue(maxsize=PROFILE_QUEUE_SIZE)
+        self.updates = asyncio.Queue()
+        self.tasks = [asyncio.create_task(self._extract_worker()) for _ in range(PROFILE_WORKERS)]
+        # A single writer serializes database writes, so sessions never contend on SQLite locks
+        self.tasks.append(asyncio.create_task(self._write_worker()))
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        await self._flush_updates()
+        await self.store.close()
+
+    async def load(self, user_id):
+        """Warm the cache for a user at session start and return their compact profile."""
+        try:
+            return compact_profile(await self.store.get(user_id))
+        except Exception as e:
+            logging.error(f"Error loading profile for {user_id}: {e}")
+            return ""
+
+    def compact(self, user_id):
+        return compact_profile(self.store.get_cached(user_id))
+
+    def record_turn(self, session_id, user_id, user_message):
+        """Queue a finished user turn, submitting an extraction job once the batch is full."""
+        if not user_id or self.jobs is None:
+            return
+        turns = self.pending_turns.setdefault(session_id, [])
+        turns.append(user_message)
+        if len(turns) >= PROFILE_BATCH_TURNS:
+            self.flush_session(session_id, user_id)
+
+    def flush_session(self, session_id, user_id):
+        """Submit whatever turns the session has left, e.g. when it disconnects."""
+        turns = self.pending_turns.pop(session_id, None)
+        if not turns or not user_id or self.jobs is None:
+            return
+        try:
+            self.jobs.put_nowait((user_id, " ".join(turns)))
+        except asyncio.QueueFull:
+            logging.warning(f"Profile extraction queue full, dropping batch for {user_id}")
+
+    async def _extract_worker(self):
+        while True:
+            user_id, text = await self.jobs.get()
+            try:
+                extracted = await extract_context(text)
+                if isinstance(extracted, dict):
+                    profile = await self.store.get(user_id)
+                    merged = merge_profile(profile, extracted)
+                    self.store.put(user_id, merged)
+                    self.updates.put_nowait(user_id)
+            except Exception as e:
+                logging.error(f"Error extracting profile for {user_id}: {e}")
+
+    async def _write_worker(self):
+        while True:
+            user_id = await self.updates.get()
+            dirty = {user_id}
+            while not self.updates.empty():
+                dirty.add(self.updates.get_nowait())
+            try:
+                await self.store.write_many({uid: self.store.get_cached(uid) for uid in dirty})
+            except Exception as e:
+                logging.error(f"Error writing profiles: {e}")
+
+    async def _flush_updates(self):
+        dirty = set()
+        while self.updates and not self.updates.empty():
+            dirty.add(self.updates.get_nowait())
+        if dirty:
+            await self.store.write_many({uid: self.store.get_cached(uid) for uid in dirty})
+
+
+profiles = ProfilePipeline(ProfileStore(PROFILE_DB_PATH))
@@ -1,3 +1,5 @@
+from config import REPLY_MAX_WORDS
+
 bot_background_information = """
     Your name is Yori. You are a friendly assistant meant to show the user companionship \
         Use background information on the user if provided. Be friendly and kind to the user
@@ -7,8 +9,8 @@ bot_background_information = """
         DO NOT USE LISTS AND SUCH, respond in a conversationsal manner.
 """
 
-basic_response = """
-    Respond to the users prompt in less than 30 words used. Do not use any "-":  \
+basic_response = f"""
+    Respond to the users prompt in less than {REPLY_MAX_WORDS} words used. Do not use any "-":  \
 """
 
 json_extraction_query = f"""
@@ -22,4 +24,10 @@ json_extraction_query = f"""
     In the notes section there should be information picked up regarding the user \
         This is any relevant information needed for a companion to know about the user.
     Extract the following information from the text and return it as a JSON object: \
-"""
\ No newline at end of file
+"""
+
+conversation_summary_query = """
+    Summarize the conversation below between a user and their companion Yori in less than {max_words} words. \
+        Keep names, facts about the user and anything the user asked Yori to remember. \
+        Start from the existing summary and fold the new turns into it.
+"""
@@ -1,24 +1,143 @@
-from openai import OpenAI
-import os
-from dotenv import load_dotenv
+import time
+from clients import upstream
+from admission import UpstreamSlots
+from cache import ResponseCache, normalize_prompt
+from resilience import resilient_stream, resilient_call, upstream_provider
+from backends.base import provider_name, split_provider_name
+from config import (
+    LLM_MAX_CONCURRENCY, LLM_CACHE_ENABLED, LLM_CACHE_SIZE, LLM_CACHE_TTL,
+    LLM_CACHE_MAX_WORDS, CACHE_DIR, LLM_LARGE_MODEL, LLM_FALLBACK_MODEL, LLM_HEDGE_DELAY,
+    LLM_FIRST_TOKEN_TIMEOUT, LLM_TIMEOUT
+)
+from metrics import LLM_ROUTES, LLM_FIRST_TOKEN_SECONDS, LLM_REPLY_SECONDS, LLM_TOKENS, LLM_TRUNCATED
 from .prompts import bot_background_information, basic_response
+from .router import route_turn
 
-load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-def ai_response(user_message):
-    return response_generator(f"{bot_background_information} {basic_response} {user_message}")
-
-def response_generator(prompt):    
-    completion = client.chat.completions.create(
-        model="gpt-4",
-        max_tokens= 250,
-        messages=[
-            {
-                "role": "user",
-                "content": f"{prompt}"
-            }
-        ]
+# Bounds how many completions this worker runs at once
+llm_slots = UpstreamSlots("llm", LLM_MAX_CONCURRENCY)
+
+response_cache = (
+    ResponseCache("llm", LLM_CACHE_SIZE, LLM_CACHE_TTL, CACHE_DIR or None)
+    if LLM_CACHE_ENABLED else None
+)
+
+async def ai_response(user_message):
+    return await response_generator(f"{bot_background_information} {basic_response} {user_message}")
+
+def _response_cache_key(user_message, model):
+    """Cache key for short, generic prompts, or None if the reply should not be cached."""
+    if response_cache is None:
+        return None
+    prompt = normalize_prompt(user_message)
+    if not prompt or len(prompt.split()) > LLM_CACHE_MAX_WORDS:
+        return None
+    return (model, prompt)
+
+def _prompt_messages(prompt):
+    return [
+        {
+            "role": "user",
+            "content": f"{prompt}"
+        }
+    ]
+
+async def stream_ai_response(user_message, memory=None, backends=None):
+    """Stream the AI response to the user message token by token, from the session's LLM backend."""
+    route = route_turn(user_message, memory)
+    LLM_ROUTES.inc(route=route.name, reason=route.reason)
+    providers = _llm_providers(route.model, backends)
+    if memory is None or memory.is_empty():
+        messages = _prompt_messages(f"{bot_background_information} {basic_response} {user_message}")
+        cache_key = _response_cache_key(user_message, providers[0].name)
+    else:
+        # Replies that depend on earlier turns are not cacheable
+        messages = memory.build_messages(user_message)
+        cache_key = None
+        
+    if cache_key:
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            yield cached.decode("utf-8")
+            return
+    
+    response_text = ""
+    async for token in response_stream_generator(messages, route, providers):
+        response_text += token
+        yield token
+        
+    if cache_key and response_text:
+        await response_cache.set(cache_key, response_text.encode("utf-8"))
+
+def _llm_providers(model, backends=None, kind="llm", first_result_timeout=LLM_FIRST_TOKEN_TIMEOUT):
+    """The routed model, then the fallback model, then the local model for when both are failing.
+
+    Whole completions are a different kind of call from streamed replies, with their own breakers,
+    latency history and timeout, so a slow summary never opens the circuit for live turns.
+    """
+    backends = backends or upstream.default
+    llm = backends.llm
+    models = [llm.model_for(model)]
+    if LLM_FALLBACK_MODEL and llm.model_for(LLM_FALLBACK_MODEL) not in models:
+        models.append(llm.model_for(LLM_FALLBACK_MODEL))
+    names = [provider_name(llm, name) for name in models]
+    if backends.fallback_llm:
+        names.append(provider_name(backends.fallback_llm, backends.fallback_llm.model_for(model)))
+    return [upstream_provider(kind, name, LLM_HEDGE_DELAY, first_result_timeout) for name in names]
+
+def _chat_model(name):
+    """The LLM backend and model a provider name refers to."""
+    backend, model = split_provider_name(name)
+    return upstream.llm[backend], model
+
+async def response_generator(prompt):    
+    # Summaries are off the reply path, so they fall back but are never hedged
+    return await resilient_call(
+        "llm_complete", _llm_providers(LLM_LARGE_MODEL, kind="llm_complete", first_result_timeout=LLM_TIMEOUT),
+        lambda name: _complete(name, prompt), hedge=False
     )
 
-    return completion.choices[0].message.content
\ No newline at end of file
+async def _complete(name, prompt):
+    llm, model = _chat_model(name)
+    async with llm_slots:
+        return await llm.complete(model, _prompt_messages(prompt), max_tokens=250)
+
+async def _completion_deltas(name, messages, max_tokens):
+    """Yield ChatDelta pieces from one streamed request."""
+    llm, model = _chat_model(name)
+    async with llm_slots:
+        deltas = llm.stream(model, messages, max_tokens)
+        try:
+            async for delta in deltas:
+                yield delta
+        finally:
+            await deltas.aclose()
+
+async def response_stream_generator(messages, route, providers=None):
+    """Yield completion tokens as soon as the LLM backend streams them back.
+    
+    A slow first token fires a hedged duplicate request, and a failing model falls back to
+    LLM_FALLBACK_MODEL, then to the local model, before any token has been yielded.
+    """
+    started_at = time.perf_counter()
+    first_token = True
+    deltas = resilient_stream(
+        "llm", providers or _llm_providers(route.model),
+        lambda name: _completion_deltas(name, messages, route.max_tokens)
+    )
+    try:
+        async for delta in deltas:
+            if delta.usage:
+                prompt_tokens, completion_tokens = delta.usage
+                LLM_TOKENS.inc(prompt_tokens, route=route.name, kind="prompt")
+                LLM_TOKENS.inc(completion_tokens, route=route.name, kind="completion")
+            if delta.finish_reason == "length":
+                LLM_TRUNCATED.inc(route=route.name)
+            if delta.text:
+                if first_token:
+                    first_token = False
+                    LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started_at, route=route.name)
+                yield delta.text
+    finally:
+        await deltas.aclose()
+                
+    LLM_REPLY_SECONDS.observe(time.perf_counter() - started_at, route=route.name)
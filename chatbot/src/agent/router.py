@@ -0,0 +1,59 @@
+import logging
+import math
+import re
+from config import (
+    LLM_ROUTING_ENABLED, LLM_FAST_MODEL, LLM_LARGE_MODEL, LLM_ROUTE_MAX_FAST_WORDS,
+    LLM_TOKENS_PER_WORD, REPLY_MAX_WORDS
+)
+
+# Openers for questions that want reasoning or advice rather than small talk
+HARD_QUESTION = re.compile(
+    r"\b(why|how (do|does|did|can|could|should|would|come)|explain|what's the difference|"
+    r"what is the difference|compare|should i|what should|help me|advice|recommend|figure out|plan)\b"
+)
+# References back to earlier turns or to what Yori knows about the user
+RECALL = re.compile(
+    r"\b(remember|last time|you said|earlier|before|told you|my name|about me|what did i|do you know)\b"
+)
+
+
+class Route:
+    """Model and completion budget picked for one turn."""
+
+    def __init__(self, name, model, max_tokens, reason):
+        self.name = name
+        self.model = model
+        self.max_tokens = max_tokens
+        self.reason = reason
+
+
+def reply_max_tokens(max_words=REPLY_MAX_WORDS):
+    """Completion budget for a reply of max_words, with room to finish the last sentence."""
+    return math.ceil(max_words * LLM_TOKENS_PER_WORD)
+
+
+def classify(user_message, memory=None):
+    """Why a turn needs the large model, or None if it is small talk the fast model can answer."""
+    text = user_message.lower()
+    if len(text.split()) > LLM_ROUTE_MAX_FAST_WORDS:
+        return "long"
+    if text.count("?") > 2:
+        return "multi_question"
+    if HARD_QUESTION.search(text):
+        return "reasoning"
+    if RECALL.search(text) and memory is not None and not memory.is_empty():
+        return "recall"
+    return None
+
+
+def route_turn(user_message, memory=None):
+    """Pick the model for a reply to user_message."""
+    max_tokens = reply_max_tokens()
+    if not LLM_ROUTING_ENABLED:
+        return Route("large", LLM_LARGE_MODEL, max_tokens, "routing_disabled")
+
+    reason = classify(user_message, memory)
+    route = (Route("large", LLM_LARGE_MODEL, max_tokens, reason) if reason
+             else Route("fast", LLM_FAST_MODEL, max_tokens, "small_talk"))
+    logging.debug(f"Routing turn to {route.model} ({route.reason})")
+    return route
@@ -1,86 +1,451 @@
-import tempfile
 import base64
 import logging
 import asyncio
-import os
 import json
 import re
-from deepgram import SpeakOptions
+import time
+from config import (
+    TTS_MAX_CONCURRENCY, TTS_TIMEOUT, TTS_LOOKAHEAD, TTS_CACHE_SIZE, TTS_CACHE_TTL, CACHE_DIR,
+    TTS_HEDGE_DELAY, TTS_FIRST_BYTE_TIMEOUT, TTS_CHUNK_PLANNER
+)
+from .chunking import ChunkPlanner, plan_chunks
+from .protocol import JSON_PROTOCOL, BINARY_PROTOCOL, MP3_CONTENT_TYPE, encode_audio_frame
+from metrics import TTS_SENTENCE_SECONDS, TTS_FIRST_CHUNK_SECONDS, SPEECH_FAILURES
+from cache import ResponseCache, normalize_text
+from admission import UpstreamSlots
+from resilience import resilient_stream, upstream_provider
+from backends.base import provider_name, split_provider_name
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+(?=[A-Z])')
+
+# Bounds how many TTS requests this worker runs at once
+tts_slots = UpstreamSlots("tts", TTS_MAX_CONCURRENCY)
+
+speech_cache = ResponseCache("tts", TTS_CACHE_SIZE, TTS_CACHE_TTL, CACHE_DIR or None)
+
+
+def voice_providers(backends, options=None):
+    """The session's voices, then the local engine's voice for when they are all failing."""
+    engines = [backends.tts]
+    if backends.fallback_tts and backends.fallback_tts.supports(options or {}):
+        engines.append(backends.fallback_tts)
+    return [
+        upstream_provider("tts", provider_name(engine, voice), TTS_HEDGE_DELAY, TTS_FIRST_BYTE_TIMEOUT)
+        for engine in engines for voice in engine.voices()
+    ]
 
 
 async def split_into_sentences(text):
     """Split text into sentences for progressive audio generation."""
-    sentences = re.split(r'(?<=[.!?])\s+(?=[A-Z])', text)
+    sentences = SENTENCE_BOUNDARY.split(text)
     return [s.strip() for s in sentences if s.strip()]
 
 
+def text_segmenter():
+    """Splitter for streamed reply text: the chunk planner, or one TTS call per sentence."""
+    return ChunkPlanner() if TTS_CHUNK_PLANNER else SentenceSegmenter()
+
+
+async def preseed_speech_cache(backends, phrases):
+    """Synthesize common phrases into the TTS cache ahead of the first session."""
+    audio_processor = AudioProcessor(backends)
+    await asyncio.gather(*(audio_processor.generate_speech_audio(phrase) for phrase in phrases))
+    logging.info(f"Pre-seeded TTS cache with {len(phrases)} phrases")
+
+
+class SentenceSegmenter:
+    """Incrementally splits streamed tokens into sentences as soon as they end."""
+    
+    def __init__(self):
+        self.buffer = ""
+        
+    def feed(self, token):
+        """Add a token and return any sentences completed by it."""
+        self.buffer += token
+        parts = SENTENCE_BOUNDARY.split(self.buffer)
+        # The last part may still be growing, keep it until its boundary shows up
+        self.buffer = parts.pop()
+        return [s.strip() for s in parts if s.strip()]
+        
+    def flush(self):
+        """Return whatever is left in the buffer once the stream has ended."""
+        remainder = self.buffer.strip()
+        self.buffer = ""
+        return [remainder] if remainder else []
+
+
+class PlaybackChunker:
+    """Re-slices streamed audio into fixed-size playback chunks, or passes it through as it arrives."""
+    
+    def __init__(self, chunk_bytes=None):
+        self.chunk_bytes = chunk_bytes
+        self.buffer = b""
+        
+    def feed(self, data):
+        """Add audio and return any chunks that are now complete."""
+        if not self.chunk_bytes:
+            return [data] if data else []
+        self.buffer += data
+        complete = len(self.buffer) - len(self.buffer) % self.chunk_bytes
+        chunks = [self.buffer[i:i + self.chunk_bytes] for i in range(0, complete, self.chunk_bytes)]
+        self.buffer = self.buffer[complete:]
+        return chunks
+        
+    def flush(self):
+        """Return the final short chunk once the sentence has ended."""
+        remainder, self.buffer = self.buffer, b""
+        return [remainder] if remainder else []
+
+
 class AudioProcessor:
     """Handles text-to-speech conversion and audio generation."""
     
-    def __init__(self, deepgram_client):
-        self.deepgram_client = deepgram_client
+    def __init__(self, backends, protocol=JSON_PROTOCOL, output_format=None):
+        self.backends = backends
+        self.engines = {engine.name: engine for engine in (backends.tts, backends.fallback_tts) if engine}
+        # Cached audio is looked up under the session's default voice
+        self.voice = provider_name(backends.tts, backends.tts.default_voice)
+        self.protocol = protocol
+        # A negotiated streaming format sends each sentence as small chunks while it is synthesized
+        self.output_format = output_format
+        self.audio_sequence = 0
+        
+    def content_type(self, voice):
+        """Content type of per-sentence audio from a voice, by the engine it belongs to."""
+        return self.engines[split_provider_name(voice)[0]].content_type
+        
+    async def generate_speech_audio(self, sentence, served_by=None):
+        """Convert a single sentence to speech audio bytes, reusing cached audio when possible.
+        
+        served_by, if given, records which voice the audio is in.
+        """
+        served_by = {} if served_by is None else served_by
+        cache_key = (self.voice, normalize_text(sentence))
+        audio_bytes = await speech_cache.get(cache_key)
+        if audio_bytes is not None:
+            served_by["name"] = self.voice
+            return audio_bytes
         
-    async def generate_speech_audio(self, sentence):
-        """Convert a single sentence to speech audio bytes."""
         try:
-            with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as temp_file:
-                temp_filename = temp_file.name
-                
-            speak_options = {"text": sentence}
-            options = SpeakOptions(
-                model="aura-2-thalia-en",
+            audio_bytes = await asyncio.wait_for(
+                self._buffer_speech_audio(sentence, served_by), timeout=TTS_TIMEOUT
             )
-            
-            _ = self.deepgram_client.speak.rest.v("1").save(temp_filename, speak_options, options)
-            
-            with open(temp_filename, 'rb') as f:
-                audio_bytes = f.read()
-                
-            try:
-                os.unlink(temp_filename)
-            except:
-                pass
-                
+            if audio_bytes:
+                # Audio from the fallback voice is cached under that voice, never the primary
+                await speech_cache.set((served_by["name"], normalize_text(sentence)), audio_bytes)
             return audio_bytes
         
+        except asyncio.TimeoutError:
+            logging.error(f"Speech generation timed out after {TTS_TIMEOUT}s")
+            return None
+        
         except Exception as e:
             logging.error(f"Error generating speech for sentence: {e}")
             return None
+        
+    async def stream_speech_audio(self, sentence, served_by=None, **options):
+        """Yield speech audio chunks for a sentence as the TTS backend streams them back.
+        
+        A slow first byte fires a hedged duplicate request, and a failing voice falls back to
+        TTS_FALLBACK_VOICE, then to the local engine. served_by, if given, records which voice answered.
+        """
+        chunks = resilient_stream(
+            "tts", voice_providers(self.backends, options),
+            lambda voice: self._voice_stream(sentence, voice, options), served_by=served_by
+        )
+        try:
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await chunks.aclose()
+            
+    async def _voice_stream(self, sentence, name, options):
+        engine, voice = split_provider_name(name)
+        async with tts_slots:
+            async for chunk in self.engines[engine].stream(sentence, voice, **options):
+                yield chunk
+                
+    async def _buffer_speech_audio(self, sentence, served_by=None):
+        """Collect the streamed audio for a sentence into a single in-memory buffer."""
+        audio_buffer = bytearray()
+        async for chunk in self.stream_speech_audio(sentence, served_by):
+            audio_buffer.extend(chunk)
+        return bytes(audio_buffer)
     
     async def process_response_audio(self, websocket, response_text, conversation_state):
         """Process AI response text and generate streaming audio."""
-        sentences = await split_into_sentences(response_text)
+        sentences = plan_chunks(response_text) if TTS_CHUNK_PLANNER else await split_into_sentences(response_text)
         
         # Send transcript to frontend first
         await websocket.send_text(json.dumps({"transcript": response_text}))
         
-        for i, sentence in enumerate(sentences):
-            if not conversation_state.ai_currently_speaking:
-                print(f"AI speech interrupted, stopping at sentence {i}")
-                break
+        sentence_queue = asyncio.Queue()
+        for sentence in sentences:
+            sentence_queue.put_nowait(sentence)
+        sentence_queue.put_nowait(None)
+        
+        await self._speak_sentences(websocket, sentence_queue, conversation_state)
+        
+    async def process_response_stream(self, websocket, token_stream, conversation_state):
+        """Generate audio for each sentence while the AI response is still streaming."""
+        sentence_queue = asyncio.Queue()
+        collector = conversation_state.track_ai_task(asyncio.create_task(
+            self._collect_sentences(websocket, token_stream, sentence_queue, conversation_state)
+        ))
+        
+        try:
+            await self._speak_sentences(websocket, sentence_queue, conversation_state)
+        finally:
+            if not collector.done():
+                collector.cancel()
+            await asyncio.wait([collector])
                 
-            print(f"Generating audio for sentence {i+1}/{len(sentences)}: {sentence}")
-            audio_bytes = await self.generate_speech_audio(sentence)
-            
-            if not conversation_state.ai_currently_speaking:
-                print(f"AI speech interrupted during audio generation for sentence {i}")
-                break
+        if collector.cancelled():
+            logging.info("AI response stream cancelled after interruption")
+            return None
+        return collector.result()
+        
+    async def _collect_sentences(self, websocket, token_stream, sentence_queue, conversation_state):
+        """Read the token stream, forward the growing transcript and queue finished sentences."""
+        segmenter = text_segmenter()
+        response_text = ""
+        
+        try:
+            async for token in token_stream:
+                if not response_text:
+                    conversation_state.mark_turn("llm_first_token")
+                response_text += token
+                await websocket.send_text(json.dumps({
+                    "transcript": response_text,
+                    "partial": True
+                }))
+                
+                for sentence in segmenter.feed(token):
+                    sentence_queue.put_nowait(sentence)
+                    
+            for sentence in segmenter.flush():
+                sentence_queue.put_nowait(sentence)
+            conversation_state.mark_turn("llm_complete")
+                
+            await websocket.send_text(json.dumps({"transcript": response_text}))
+            return response_text
+        
+        finally:
+            sentence_queue.put_nowait(None)
             
-            if audio_bytes:
-                await self._send_audio_to_frontend(websocket, audio_bytes, sentence)
-                await asyncio.sleep(0.1)
+    async def _speak_sentences(self, websocket, sentence_queue, conversation_state):
+        """Synthesize queued sentences ahead of playback and send them strictly in order."""
+        window = asyncio.Semaphore(TTS_LOOKAHEAD)
+        synthesis_queue = asyncio.Queue()
+        scheduler = conversation_state.track_ai_task(asyncio.create_task(
+            self._schedule_synthesis(sentence_queue, synthesis_queue, window, conversation_state)
+        ))
+        
+        try:
+            i = 0
+            while True:
+                item = await synthesis_queue.get()
+                if item is None:
+                    break
+                    
+                sentence, synthesis, chunks = item
+                i += 1
+                if chunks is not None:
+                    # Later sentences keep synthesizing into their own queues while this one plays
+                    completed = await self._stream_audio_to_frontend(
+                        websocket, chunks, sentence, i - 1, conversation_state
+                    )
+                    window.release()
+                    if not completed:
+                        logging.info(f"AI speech interrupted while streaming sentence {i}")
+                        break
+                    continue
+                
+                await asyncio.wait([synthesis])
+                window.release()
+                
+                if not conversation_state.ai_currently_speaking:
+                    logging.info(f"AI speech interrupted during audio generation for sentence {i}")
+                    break
+                
+                audio_bytes, content_type = (None, None) if synthesis.cancelled() else synthesis.result()
+                if audio_bytes:
+                    # Awaiting the send waits for room in the session's outbound queue
+                    await self._send_audio_to_frontend(websocket, audio_bytes, sentence, i - 1, content_type)
+                    conversation_state.mark_turn("first_audio_sent")
+                else:
+                    await self._send_speech_failed(websocket, sentence, i - 1)
+        finally:
+            scheduler.cancel()
+            while not synthesis_queue.empty():
+                item = synthesis_queue.get_nowait()
+                if item:
+                    item[1].cancel()
         
         # Signal completion if not interrupted
         if conversation_state.ai_currently_speaking:
-            print("AI finished speaking")
+            logging.info("AI finished speaking")
             conversation_state.reset_ai_speaking()
             await websocket.send_text(json.dumps({"ai_finished_speaking": True}))
+            
+    async def _schedule_synthesis(self, sentence_queue, synthesis_queue, window, conversation_state):
+        """Start synthesis for upcoming sentences, keeping at most the look-ahead window in flight."""
+        try:
+            while True:
+                await window.acquire()
+                sentence = await sentence_queue.get()
+                if sentence is None:
+                    break
+                
+                logging.debug(f"Generating audio for sentence: {sentence}")
+                if self.output_format:
+                    chunks = asyncio.Queue()
+                    synthesis = conversation_state.track_ai_task(
+                        asyncio.create_task(self._stream_sentence(sentence, chunks, conversation_state))
+                    )
+                else:
+                    chunks = None
+                    synthesis = conversation_state.track_ai_task(
+                        asyncio.create_task(self._synthesize_sentence(sentence, conversation_state))
+                    )
+                synthesis_queue.put_nowait((sentence, synthesis, chunks))
+        finally:
+            synthesis_queue.put_nowait(None)
+    
+    async def _synthesize_sentence(self, sentence, conversation_state):
+        """Synthesize a sentence and record how long it took, returning its audio and content type."""
+        started_at = time.perf_counter()
+        served_by = {}
+        audio_bytes = await self.generate_speech_audio(sentence, served_by)
+        elapsed = time.perf_counter() - started_at
+        
+        TTS_SENTENCE_SECONDS.observe(elapsed)
+        logging.debug(f"[{conversation_state.session_id}] tts_sentence {elapsed * 1000:.0f} ms: {sentence}")
+        if conversation_state.recorder and audio_bytes:
+            conversation_state.recorder.record_speech(sentence, audio_bytes)
+        return audio_bytes, self.content_type(served_by["name"]) if audio_bytes else None
+    
+    async def _stream_sentence(self, sentence, chunks, conversation_state):
+        """Queue a sentence's audio in playback chunks as it is synthesized, ending with None."""
+        started_at = time.perf_counter()
+        cache_key = (self.voice, self.output_format["content_type"], normalize_text(sentence))
+        chunker = PlaybackChunker(self.output_format["chunk_bytes"])
+        try:
+            audio_bytes = await speech_cache.get(cache_key)
+            if audio_bytes is not None:
+                for chunk in chunker.feed(audio_bytes) + chunker.flush():
+                    chunks.put_nowait(chunk)
+                return
+            
+            audio_buffer = bytearray()
+            served_by = {}
+            await asyncio.wait_for(
+                self._pump_speech_audio(sentence, chunker, chunks, audio_buffer, started_at, served_by),
+                timeout=TTS_TIMEOUT
+            )
+            for chunk in chunker.flush():
+                chunks.put_nowait(chunk)
+            
+            elapsed = time.perf_counter() - started_at
+            TTS_SENTENCE_SECONDS.observe(elapsed)
+            logging.debug(f"[{conversation_state.session_id}] tts_sentence {elapsed * 1000:.0f} ms: {sentence}")
+            if audio_buffer:
+                audio_bytes = bytes(audio_buffer)
+                await speech_cache.set(
+                    (served_by["name"], self.output_format["content_type"], normalize_text(sentence)), audio_bytes
+                )
+                if conversation_state.recorder:
+                    conversation_state.recorder.record_speech(sentence, audio_bytes)
+        
+        except asyncio.TimeoutError:
+            logging.error(f"Speech streaming timed out after {TTS_TIMEOUT}s")
+        
+        except Exception as e:
+            logging.error(f"Error streaming speech for sentence: {e}")
+        
+        finally:
+            chunks.put_nowait(None)
+            
+    async def _pump_speech_audio(self, sentence, chunker, chunks, audio_buffer, started_at, served_by):
+        async for data in self.stream_speech_audio(sentence, served_by, **self.output_format["options"]):
+            if not audio_buffer:
+                TTS_FIRST_CHUNK_SECONDS.observe(time.perf_counter() - started_at)
+            audio_buffer.extend(data)
+            for chunk in chunker.feed(data):
+                chunks.put_nowait(chunk)
     
-    async def _send_audio_to_frontend(self, websocket, audio_bytes, sentence):
+    async def _stream_audio_to_frontend(self, websocket, chunks, sentence, sentence_index, conversation_state):
+        """Forward a sentence's chunks as they arrive, bracketed by start and end metadata.
+        
+        Returns False if the AI was interrupted before the sentence finished.
+        """
+        await websocket.send_text(json.dumps({
+            "sentence_start": True,
+            "sentence": sentence,
+            "sentence_index": sentence_index,
+            "content_type": self.output_format["content_type"],
+            "sample_rate": self.output_format["sample_rate"]
+        }))
+        
+        sent = False
+        while True:
+            chunk = await chunks.get()
+            if chunk is None:
+                break
+            if not conversation_state.ai_currently_speaking:
+                return False
+            await self._send_audio_chunk(websocket, chunk, sentence_index)
+            conversation_state.mark_turn("first_audio_sent")
+            sent = True
+        
+        if not sent and conversation_state.ai_currently_speaking:
+            await self._send_speech_failed(websocket, sentence, sentence_index)
+        
+        await websocket.send_text(json.dumps({"sentence_end": True, "sentence_index": sentence_index}))
+        return conversation_state.ai_currently_speaking
+        
+    async def _send_speech_failed(self, websocket, sentence, sentence_index):
+        """Send the text of a sentence no voice could synthesize, so it is shown instead of skipped."""
+        SPEECH_FAILURES.inc()
+        logging.error(f"No audio for sentence {sentence_index}, sending it as text: {sentence}")
+        await websocket.send_text(json.dumps({
+            "speech_failed": True,
+            "sentence": sentence,
+            "sentence_index": sentence_index
+        }))
+        
+    async def _send_audio_chunk(self, websocket, chunk, sentence_index):
+        """Send one streamed chunk, as a binary frame or base64 JSON depending on the protocol."""
+        content_type = self.output_format["content_type"]
+        if self.protocol == BINARY_PROTOCOL:
+            await websocket.send_bytes(encode_audio_frame(self.audio_sequence, sentence_index, content_type, chunk))
+        else:
+            await websocket.send_text(json.dumps({
+                "audio": base64.b64encode(chunk).decode("utf-8"),
+                "content_type": content_type,
+                "sentence_index": sentence_index,
+                "sequence": self.audio_sequence
+            }), audio=True)
+        self.audio_sequence += 1
+        
+    async def _send_audio_to_frontend(self, websocket, audio_bytes, sentence, sentence_index=0,
+                                      content_type=MP3_CONTENT_TYPE):
         """Send audio data to frontend via WebSocket."""
+        if self.protocol == BINARY_PROTOCOL:
+            await websocket.send_text(json.dumps({
+                "sentence": sentence,
+                "sentence_index": sentence_index,
+                "sequence": self.audio_sequence
+            }), audio=True)
+            await websocket.send_bytes(encode_audio_frame(
+                self.audio_sequence, sentence_index, content_type, audio_bytes
+            ))
+            self.audio_sequence += 1
+            return
+        
         audio_base64 = base64.b64encode(audio_bytes).decode('utf-8')
         await websocket.send_text(json.dumps({
             "audio": audio_base64,
-            "content_type": "audio/mp3",
+            "content_type": content_type,
             "sentence": sentence
-        }))
\ No newline at end of file
+        }), audio=True)
@@ -0,0 +1,118 @@
+import re
+from config import TTS_FIRST_CHUNK_MIN_WORDS, TTS_CHUNK_MIN_CHARS, TTS_CHUNK_MAX_CHARS
+
+# Terminal punctuation, closing quotes or brackets, and whitespace, decided once the next character is in
+SENTENCE_END = re.compile(r'(\.\.\.|…|[.!?]+)["\')\]]*\s+(?=(\S))')
+# Where the first chunk may be cut early: after a comma or similar pause, or before a conjunction
+# that starts a clause. "so", "or", "while" and "though" as often sit inside one ("I love you so
+# much", "even though"), so they only end a clause after a comma
+CLAUSE_END = re.compile(
+    r'(?:[,;:—]|\.\.\.|…)["\')\]]*\s+(?=\S)|\s+(?=(?:and|but|because)\s)'
+)
+# Never end a sentence, the next word belongs with them
+TITLES = {"mr.", "mrs.", "ms.", "dr.", "prof.", "st.", "jr.", "sr.", "vs.", "e.g.", "i.e.", "approx."}
+# Often end a sentence, so they only count as one before a capital letter
+ABBREVIATIONS = {"etc.", "a.m.", "p.m.", "inc.", "ltd."}
+
+
+def _word_before(text, end):
+    return text[:end].rsplit(None, 1)[-1].lower() if text[:end].strip() else ""
+
+
+def sentence_end(text):
+    """Index just past the first complete sentence in text, or None if none has ended yet."""
+    for match in SENTENCE_END.finditer(text):
+        punctuation, following = match.group(1), match.group(2)
+        if punctuation == ".":
+            word = _word_before(text, match.start(1) + 1)
+            if word in TITLES or re.fullmatch(r"[a-z]\.", word):
+                # Titles and initials such as "J. R. R. Tolkien"
+                continue
+            if word in ABBREVIATIONS and not following.isupper():
+                continue
+        if punctuation in ("...", "…") and not following.isupper():
+            # A trailing-off pause inside the sentence
+            continue
+        if following.isupper() or following.isdigit() or following in "\"'":
+            return match.end()
+    return None
+
+
+def clause_end(text, min_words):
+    """Index just past the first clause boundary with at least min_words before it, or None."""
+    for match in CLAUSE_END.finditer(text):
+        if len(text[:match.start()].split()) >= min_words:
+            return match.end()
+    return None
+
+
+class ChunkPlanner:
+    """Turns streamed reply text into TTS chunks as soon as each one is decided.
+
+    The first chunk is kept short so audio starts early: it ends at the first sentence end, or
+    at a clause boundary once it has a few words. Later sentences are merged into chunks of at
+    least min_chars, without going past max_chars, so a reply costs fewer TTS round trips.
+    """
+
+    def __init__(self, first_min_words=TTS_FIRST_CHUNK_MIN_WORDS, min_chars=TTS_CHUNK_MIN_CHARS,
+                 max_chars=TTS_CHUNK_MAX_CHARS):
+        self.first_min_words = first_min_words
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.buffer = ""
+        self.pending = []
+        self.first_sent = False
+
+    def feed(self, token):
+        """Add a token and return any chunks completed by it."""
+        self.buffer += token
+        chunks = []
+        while True:
+            cut = sentence_end(self.buffer)
+            if not self.first_sent:
+                clause = clause_end(self.buffer, self.first_min_words)
+                if clause is not None and (cut is None or clause < cut):
+                    cut = clause
+            if cut is None:
+                break
+
+            piece, self.buffer = self.buffer[:cut].strip(), self.buffer[cut:]
+            if not self.first_sent:
+                self.first_sent = True
+                chunks.append(piece)
+            else:
+                chunks.extend(self._merge(piece))
+        return chunks
+
+    def flush(self):
+        """Return what is left once the stream has ended."""
+        remainder = self.buffer.strip()
+        self.buffer = ""
+        if remainder and not self.first_sent:
+            self.first_sent = True
+            return [remainder]
+
+        chunks = self._merge(remainder) if remainder else []
+        if self.pending:
+            chunks.append(" ".join(self.pending))
+            self.pending = []
+        return chunks
+
+    def _merge(self, sentence):
+        chunks = []
+        merged = " ".join(self.pending)
+        if self.pending and len(merged) + 1 + len(sentence) > self.max_chars:
+            chunks.append(merged)
+            self.pending = []
+        self.pending.append(sentence)
+        merged = " ".join(self.pending)
+        if len(merged) >= self.min_chars:
+            chunks.append(merged)
+            self.pending = []
+        return chunks
+
+
+def plan_chunks(text, **limits):
+    """Split a complete reply into TTS chunks the same way ChunkPlanner does while streaming."""
+    planner = ChunkPlanner(**limits)
+    return planner.feed(text) + planner.flush()
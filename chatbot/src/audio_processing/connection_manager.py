@@ -1,31 +1,63 @@
-from deepgram import LiveTranscriptionEvents
+import asyncio
 import logging
 import json
+import time
+from config import DEEPGRAM_RECONNECT_ATTEMPTS, DEEPGRAM_RECONNECT_BASE_DELAY, DEEPGRAM_REPLAY_SECONDS
+from metrics import DEEPGRAM_RECONNECTS, DEEPGRAM_RECONNECT_SECONDS
+from backends.base import LiveEvents
+from .reconnect import AudioReplayBuffer, TranscriptSeam
+
+# finish() joins the SDK's socket threads, which can hang on a dead connection and hold up session cleanup
+FINISH_TIMEOUT_SECONDS = 5
 
 class DeepgramConnectionManager:
-    """Manages Deepgram WebSocket connections including creation, health monitoring, and cleanup."""
+    """Manages live transcription connections including creation, health monitoring, and cleanup.
+    
+    Connections come from the session's STT backend: Deepgram, or a local engine with the same interface.
+    """
     
-    def __init__(self, deepgram_client):
-        self.deepgram_client = deepgram_client
+    def __init__(self, stt, supervisor=None, container_audio=True):
+        self.stt = stt
+        self.supervisor = supervisor
+        self.container_audio = container_audio
         self.connection = None
         self.is_connected = False
         self.reconnect_attempts = 0
-        self.max_reconnect_attempts = 3
+        self.max_reconnect_attempts = DEEPGRAM_RECONNECT_ATTEMPTS
+        self.reconnect_task = None
+        self.event_handlers = None
+        self.options = None
+        self.loop = None
+        self.last_sent_at = time.monotonic()
+        # Recent audio is kept so a dropped connection can be re-opened without losing words
+        self.replay_buffer = AudioReplayBuffer(DEEPGRAM_REPLAY_SECONDS, keep_header=container_audio)
+        self.seam = TranscriptSeam(DEEPGRAM_REPLAY_SECONDS)
         
-    async def create_connection(self, on_message, options):
+    async def create_connection(self, event_handlers, options):
         """Create a new Deepgram connection."""
+        self.event_handlers = event_handlers
+        self.options = options
+        self.loop = asyncio.get_running_loop()
         try:
             await self.close_connection()
             
-            conn = self.deepgram_client.listen.websocket.v("1")
-            conn.on(LiveTranscriptionEvents.Transcript, on_message)
-            conn.start(options)
+            conn = self.stt.acquire(self.container_audio)
+            if conn:
+                self._register_handlers(conn, event_handlers)
+                logging.info("Using pre-opened Deepgram connection")
+            else:
+                conn = self.stt.connection()
+                self._register_handlers(conn, event_handlers)
+                # start() does a blocking websocket handshake, keep it off the event loop
+                if not await asyncio.to_thread(conn.start, options):
+                    raise ConnectionError("Deepgram live connection did not start")
+                logging.info(f"Created new {self.stt.name} live connection")
             
             self.connection = conn
             self.is_connected = True
             self.reconnect_attempts = 0
+            self.last_sent_at = time.monotonic()
             
-            logging.info("Created new Deepgram connection")
             return conn
             
         except Exception as e:
@@ -33,32 +65,118 @@ class DeepgramConnectionManager:
             self.is_connected = False
             return None
     
+    def _register_handlers(self, conn, event_handlers):
+        for event, handler in event_handlers.items():
+            self.stt.subscribe(conn, event, handler)
+        
+        # Runs on the SDK's thread; connections we closed ourselves are no longer current
+        def on_close(sender, *args, **kwargs):
+            if conn is self.connection:
+                self.loop.call_soon_threadsafe(self.schedule_reconnect)
+                
+        self.stt.subscribe(conn, LiveEvents.Close, on_close)
+            
     async def close_connection(self):
         """Safely close the current Deepgram connection."""
-        if self.connection:
+        conn, self.connection = self.connection, None
+        self.is_connected = False
+        if conn:
             try:
-                self.connection.finish()
+                await asyncio.wait_for(asyncio.to_thread(conn.finish), FINISH_TIMEOUT_SECONDS)
                 logging.info("Closed Deepgram connection")
+            except asyncio.TimeoutError:
+                logging.warning(f"Deepgram connection did not finish within {FINISH_TIMEOUT_SECONDS}s")
             except Exception as e:
                 logging.error(f"Error closing Deepgram connection: {e}")
-            finally:
-                self.connection = None
-                self.is_connected = False
-                return True
+            return True
         return False
     
+    def reset_stream(self):
+        """Forget buffered audio and transcript history, e.g. when the client starts a new stream."""
+        self.replay_buffer.clear()
+        self.seam.reset()
+    
     def send_audio(self, audio_data):
-        """Send audio data to Deepgram if connection is active."""
-        if self.connection and self.is_connected and hasattr(self.connection, 'is_connected') and self.connection.is_connected():
-            try:
-                self.connection.send(audio_data)
+        """Send audio data to Deepgram, buffering it for replay and reconnecting if the send fails."""
+        self.replay_buffer.append(audio_data)
+        if not self.is_connection_healthy():
+            return False
+        if self._send(audio_data):
+            return True
+        self.schedule_reconnect()
+        return False
+    
+    def _send(self, audio_data):
+        try:
+            # The SDK reports a closed socket by returning False rather than raising
+            if self.connection.send(audio_data) is False:
+                raise ConnectionError("Deepgram live connection is closed")
+            self.last_sent_at = time.monotonic()
+            return True
+        except Exception as e:
+            logging.error(f"Error sending audio data: {e}")
+            self.is_connected = False
+            return False
+    
+    def is_reconnecting(self):
+        return self.reconnect_task is not None and not self.reconnect_task.done()
+    
+    def schedule_reconnect(self):
+        """Start reconnecting in the background, unless a reconnect is already running."""
+        self.is_connected = False
+        if self.is_reconnecting() or self.event_handlers is None:
+            return
+        coro = self.reconnect()
+        if self.supervisor:
+            self.reconnect_task = self.supervisor.spawn(coro, name=f"deepgram-reconnect-{self.supervisor.session_id}")
+        else:
+            self.reconnect_task = asyncio.create_task(coro)
+    
+    async def reconnect(self):
+        """Re-open the live connection with exponential backoff and replay the buffered audio into it."""
+        dropped_at = time.perf_counter()
+        self.seam.open()
+        while self.reconnect_attempts < self.max_reconnect_attempts:
+            if self.reconnect_attempts:
+                await asyncio.sleep(DEEPGRAM_RECONNECT_BASE_DELAY * 2 ** (self.reconnect_attempts - 1))
+            self.reconnect_attempts += 1
+            DEEPGRAM_RECONNECTS.inc()
+            
+            if await self.create_connection(self.event_handlers, self.options):
+                # Nothing new can be sent between the handshake and the replay, so ordering holds
+                chunks = self.replay_buffer.replay()
+                for chunk in chunks:
+                    if not self._send(chunk):
+                        break
+                else:
+                    elapsed = time.perf_counter() - dropped_at
+                    DEEPGRAM_RECONNECT_SECONDS.observe(elapsed)
+                    logging.info(
+                        f"Reconnected to Deepgram in {elapsed * 1000:.0f} ms, "
+                        f"replayed {sum(len(c) for c in chunks)} bytes"
+                    )
+                    return True
+                
+        logging.error(f"Giving up on Deepgram after {self.reconnect_attempts} reconnect attempts")
+        self.reconnect_attempts = 0
+        await self.close_connection()
+        self.reset_stream()
+        return False
+    
+    def keep_alive(self):
+        """Send Deepgram's protocol-level KeepAlive, which is not billed as audio."""
+        try:
+            if self.connection.keep_alive():
+                self.last_sent_at = time.monotonic()
                 return True
-            except Exception as e:
-                logging.error(f"Error sending audio data: {e}")
-                self.is_connected = False
-                return False
+        except Exception as e:
+            logging.warning(f"Keepalive failed: {e}")
         return False
     
+    def idle_seconds(self):
+        """Seconds since anything was last sent on the live connection."""
+        return time.monotonic() - self.last_sent_at
+    
     def is_connection_healthy(self):
         """Check if the connection is healthy."""
         return (self.connection is not None and 
@@ -66,9 +184,10 @@ class DeepgramConnectionManager:
                 hasattr(self.connection, 'is_connected') and 
                 self.connection.is_connected())
     
-    async def handle_start_listening(self, websocket, on_message, options):
+    async def handle_start_listening(self, websocket, event_handlers, options):
         """Handle start listening command."""
-        conn = await self.create_connection(on_message, options)
+        self.reset_stream()
+        conn = await self.create_connection(event_handlers, options)
         if conn:
             await websocket.send_text(json.dumps({
                 "status": "listening",
@@ -83,7 +202,11 @@ class DeepgramConnectionManager:
     
     async def handle_stop_listening(self, websocket):
         """Handle stop listening command."""
+        if self.reconnect_task:
+            self.reconnect_task.cancel()
+            self.reconnect_task = None
         await self.close_connection()
+        self.reset_stream()
         await websocket.send_text(json.dumps({
             "status": "stopped", 
             "message": "Connection closed"
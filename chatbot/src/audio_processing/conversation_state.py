@@ -1,21 +1,50 @@
-import queue
+import asyncio
 import time
+from agent.memory import ConversationMemory
+from .session import SessionSupervisor
 
 class ConversationState:
     """Manages the state of the conversation including AI speaking status, transcripts, and timing."""
     
-    def __init__(self):
-        self.transcript_queue = queue.Queue()
+    def __init__(self, session_id=None, user_id=None, supervisor=None, recorder=None):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.supervisor = supervisor or SessionSupervisor(session_id)
+        self.recorder = recorder
+        self.current_turn = None
+        self.memory = ConversationMemory()
+        # Transcripts arrive on the Deepgram SDK's callback thread and are
+        # handed to this loop, so the processor wakes as soon as one lands
+        self.loop = asyncio.get_running_loop()
+        self.transcript_queue = asyncio.Queue()
         self.ai_currently_speaking = False
         self.ai_speaking_start_time = None
         self.last_audio_time = time.time()
+        self.last_speech_time = 0.0
         self.partial_transcript = ""
+        self.ai_tasks = set()
         
     def reset_ai_speaking(self):
-        """Reset AI speaking state."""
+        """Reset AI speaking state and cancel any in-flight LLM or TTS calls."""
         self.ai_currently_speaking = False
         self.ai_speaking_start_time = None
         
+        for task in list(self.ai_tasks):
+            task.cancel()
+        self.ai_tasks.clear()
+        
+    def mark_turn(self, stage):
+        """Record a timing span on the current turn, if one is in progress."""
+        if self.current_turn:
+            self.current_turn.mark(stage)
+            
+    def track_ai_task(self, task):
+        """Register an upstream call so it is cancelled when the AI stops speaking."""
+        self.supervisor.adopt(task)
+        self.ai_tasks.add(task)
+        task.add_done_callback(self.ai_tasks.discard)
+        return task
+        
     def start_ai_speaking(self):
         """Start AI speaking state."""
         self.ai_currently_speaking = True
@@ -25,21 +54,31 @@ class ConversationState:
         """Update the last audio received time."""
         self.last_audio_time = time.time()
         
+    def note_speech(self):
+        """Record that Deepgram heard the user. Safe to call from any thread."""
+        self.last_speech_time = time.time()
+        
+    def is_idle(self, quiet_seconds):
+        """True between turns: no reply in flight, nothing buffered, and the user has gone quiet."""
+        return (not self.ai_currently_speaking and
+                not self.partial_transcript and
+                self.transcript_queue.empty() and
+                time.time() - self.last_speech_time >= quiet_seconds)
+        
     def add_transcript(self, transcript, timestamp=None):
-        """Add a transcript to the processing queue."""
+        """Add a transcript to the processing queue. Safe to call from any thread."""
         if timestamp is None:
             timestamp = time.time()
         
-        self.transcript_queue.put({
+        self.loop.call_soon_threadsafe(self.transcript_queue.put_nowait, {
             "transcript": transcript,
-            "timestamp": timestamp
+            "timestamp": timestamp,
+            "received_at": time.perf_counter()
         })
         
-    def get_next_transcript(self):
-        """Get the next transcript from the queue, or None if empty."""
-        if not self.transcript_queue.empty():
-            return self.transcript_queue.get()
-        return None
+    async def get_next_transcript(self):
+        """Wait for the next transcript from the queue."""
+        return await self.transcript_queue.get()
         
     def should_ignore_user_input(self, transcript_time):
         """Check if user input should be ignored (within 2 seconds of AI starting to speak)."""
@@ -55,12 +94,12 @@ class ConversationState:
             return time_since_ai_started > 2.0
         return False
         
-    def needs_keepalive(self):
-        """Check if a keepalive signal should be sent to Deepgram."""
-        current_time = time.time()
-        return (self.ai_currently_speaking and 
-                current_time - self.last_audio_time > 8)
-                
+    def peek_partial_transcript(self, transcript):
+        """Return what the transcript would combine to, without consuming the partial buffer."""
+        if self.partial_transcript:
+            return self.partial_transcript + " " + transcript
+        return transcript
+        
     def handle_partial_transcript(self, transcript):
         """Handle partial transcript accumulation."""
         if self.partial_transcript:
@@ -84,8 +123,9 @@ class ConversationState:
         while not self.transcript_queue.empty():
             try:
                 self.transcript_queue.get_nowait()
-            except queue.Empty:
+            except asyncio.QueueEmpty:
                 break
                 
         self.reset_ai_speaking()
-        self.partial_transcript = ""
\ No newline at end of file
+        self.partial_transcript = ""
+        self.memory.cancel()
\ No newline at end of file
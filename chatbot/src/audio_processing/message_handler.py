@@ -2,22 +2,27 @@ import json
 import base64
 import logging
 import asyncio
+from config import FULL_DUPLEX
+
+# Deepgram closes live connections after 10 s without audio or a KeepAlive
+KEEPALIVE_INTERVAL = 3
 
 class WebSocketMessageHandler:
     """Handles WebSocket message processing including commands and audio data routing."""
     
-    def __init__(self, connection_manager, conversation_state):
+    def __init__(self, connection_manager, conversation_state, vad_gate=None):
         self.connection_manager = connection_manager
         self.conversation_state = conversation_state
+        self.vad_gate = vad_gate
         self.keepalive_task = None
         
-    async def handle_text_message(self, websocket, message_text, on_message, options):
+    async def handle_text_message(self, websocket, message_text, event_handlers, options):
         """Handle text-based WebSocket messages (commands and JSON data)."""
         try:
             message = json.loads(message_text)
             
             if message.get("action") == "start_listening":
-                await self._handle_start_listening(websocket, on_message, options)
+                await self._handle_start_listening(websocket, event_handlers, options)
                 
             elif message.get("action") == "stop_listening":
                 await self._handle_stop_listening(websocket)
@@ -28,73 +33,88 @@ class WebSocketMessageHandler:
         except json.JSONDecodeError:
             logging.error("Received invalid JSON message")
             
-    async def handle_bytes_message(self, websocket, audio_bytes, on_message, options):
+    async def handle_bytes_message(self, websocket, audio_bytes, event_handlers, options):
         """Handle binary audio data messages."""
-        if not self.conversation_state.ai_currently_speaking:
+        if self.conversation_state.recorder:
+            self.conversation_state.recorder.record_audio(audio_bytes)
+            
+        if FULL_DUPLEX or not self.conversation_state.ai_currently_speaking:
             self.conversation_state.update_audio_time()
             
-            if self.connection_manager.is_connection_healthy():
-                self.connection_manager.send_audio(audio_bytes)
+            if self.connection_manager.is_connection_healthy() or self.connection_manager.is_reconnecting():
+                # Audio that arrives while reconnecting is buffered and replayed
+                self._forward_audio(audio_bytes)
+            elif self.connection_manager.connection is not None:
+                # The live socket dropped without a Close event, reconnect and replay what it missed
+                self._forward_audio(audio_bytes)
+                self.connection_manager.schedule_reconnect()
             else:
-                await self._handle_start_listening(websocket, on_message, options)
+                await self._handle_start_listening(websocket, event_handlers, options)
                 
                 if self.connection_manager.is_connection_healthy():
-                    self.connection_manager.send_audio(audio_bytes)
+                    self._forward_audio(audio_bytes)
                     
                     await websocket.send_text(json.dumps({
                         "status": "listening",
                         "message": "Auto-started listening"
                     }))
         else:
-            print("AI is speaking, ignoring audio bytes")
+            logging.debug("AI is speaking, ignoring audio bytes")
             
-    async def _handle_start_listening(self, websocket, on_message, options):
+    async def _handle_start_listening(self, websocket, event_handlers, options):
         """Handle start listening command."""
-        await self.connection_manager.handle_start_listening(websocket, on_message, options)
+        await self.connection_manager.handle_start_listening(websocket, event_handlers, options)
         
         if self.connection_manager.is_connection_healthy() and not self.keepalive_task:
-            self.keepalive_task = asyncio.create_task(self._send_keepalive())
+            self.keepalive_task = self.conversation_state.supervisor.spawn(self._send_keepalive())
             
     async def _handle_stop_listening(self, websocket):
         """Handle stop listening command."""
-        print("Stop listening command received")
+        logging.info("Stop listening command received")
         
         if self.conversation_state.ai_currently_speaking:
-            print("Stopping AI speech due to stop command")
+            logging.info("Stopping AI speech due to stop command")
             self.conversation_state.reset_ai_speaking()
         
         if self.keepalive_task:
             self.keepalive_task.cancel()
             self.keepalive_task = None
-            print("Cancelled keepalive task")
+            logging.debug("Cancelled keepalive task")
         
         await self.connection_manager.handle_stop_listening(websocket)
-        print("Stop listening completed")
+        logging.info("Stop listening completed")
         
     async def _handle_audio_data(self, message):
         """Handle JSON-encoded audio data."""
-        if not self.conversation_state.ai_currently_speaking:
+        if FULL_DUPLEX or not self.conversation_state.ai_currently_speaking:
             audio_data = base64.b64decode(message["data"])
-            self.connection_manager.send_audio(audio_data)
+            if self.conversation_state.recorder:
+                self.conversation_state.recorder.record_audio(audio_data)
+            self._forward_audio(audio_data)
             self.conversation_state.update_audio_time()
             
+    def _forward_audio(self, audio_bytes):
+        """Send inbound audio to Deepgram, holding back silence when the VAD gate is active."""
+        if not self.vad_gate:
+            self.connection_manager.send_audio(audio_bytes)
+            return
+        for chunk in self.vad_gate.process(audio_bytes):
+            self.connection_manager.send_audio(chunk)
+            
     async def _send_keepalive(self):
-        """Send periodic keepalive to prevent Deepgram timeout during AI speech"""
+        """Keep the Deepgram connection open while no audio flows, e.g. during AI speech or gated silence."""
         while True:
-            await asyncio.sleep(8)
+            await asyncio.sleep(KEEPALIVE_INTERVAL)
             
-            if (self.conversation_state.needs_keepalive() and 
+            if (self.connection_manager.idle_seconds() >= KEEPALIVE_INTERVAL and 
                 self.connection_manager.is_connection_healthy()):
-                try:
-                    silent_audio = b'\x00' * 320
-                    self.connection_manager.send_audio(silent_audio)
-                    print("Sent keepalive to Deepgram during AI speech")
-                except Exception as e:
-                    print(f"Keepalive failed: {e}")
-                    break
+                if self.connection_manager.keep_alive():
+                    logging.debug("Sent KeepAlive to Deepgram")
                     
     async def cleanup(self):
         """Clean up message handler resources."""
         if self.keepalive_task:
             self.keepalive_task.cancel()
-            self.keepalive_task = None
\ No newline at end of file
+            self.keepalive_task = None
+        if self.vad_gate:
+            self.vad_gate.record_session(self.conversation_state.session_id)
\ No newline at end of file
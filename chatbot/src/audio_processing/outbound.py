@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from config import OUTBOUND_QUEUE_BYTES, OUTBOUND_SEND_TIMEOUT, OUTBOUND_AUDIO_MAX_AGE
+from metrics import OUTBOUND_DROPPED, SLOW_CLIENT_DISCONNECTS
+
+# WebSocket close code for a client that stopped reading (policy violation)
+SLOW_CLIENT_CLOSE_CODE = 1008
+
+
+class OutboundQueue:
+    """Bounded per-session send queue in front of the client WebSocket.
+
+    Stands in for the socket wherever the session sends, so one client on a bad link can neither
+    block a reply nor pile up memory. Control messages are always delivered in order. Audio waits
+    for room in the queue, is skipped once it is too old to be worth playing, and is discarded on
+    interruption. A client that stops reading altogether is disconnected, and the server can end
+    a session after flushing what is queued.
+    """
+
+    def __init__(self, websocket, session_id, max_bytes=OUTBOUND_QUEUE_BYTES,
+                 send_timeout=OUTBOUND_SEND_TIMEOUT, audio_max_age=OUTBOUND_AUDIO_MAX_AGE):
+        self.websocket = websocket
+        self.session_id = session_id
+        self.max_bytes = max_bytes
+        self.send_timeout = send_timeout
+        self.audio_max_age = audio_max_age
+        self.items = deque()
+        self.size = 0
+        self.ready = asyncio.Event()
+        self.drained = asyncio.Event()
+        self.drained.set()
+        self.stalled = asyncio.Event()
+        self.ending = False
+        self.close_code = SLOW_CLIENT_CLOSE_CODE
+        self.closed = asyncio.Event()
+        self.closed_waiter = None
+
+    async def send_text(self, text, audio=False):
+        await self._put("text", text, audio)
+
+    async def send_bytes(self, data, audio=True):
+        await self._put("bytes", data, audio)
+
+    async def _put(self, kind, payload, audio):
+        if self.stalled.is_set() or self.closed.is_set():
+            return
+        if audio and self.size >= self.max_bytes:
+            # Backpressure on audio producers only, a client that never catches up is stalled
+            self.drained.clear()
+            try:
+                await asyncio.wait_for(self.drained.wait(), self.send_timeout)
+            except asyncio.TimeoutError:
+                self._stall("outbound queue stayed full")
+                return
+
+        self.items.append((kind, payload, audio, time.monotonic()))
+        self.size += len(payload)
+        self.ready.set()
+
+    def discard_audio(self):
+        """Drop queued audio that has not been sent yet, e.g. after the user interrupts."""
+        kept = deque(item for item in self.items if not item[2])
+        dropped = len(self.items) - len(kept)
+        if dropped:
+            OUTBOUND_DROPPED.inc(dropped, reason="interrupted")
+            self.items = kept
+            self.size = sum(len(item[1]) for item in kept)
+            self._check_drained()
+
+    def end(self, code):
+        """Send what is already queued, then close the socket with this code."""
+        self.ending = True
+        self.close_code = code
+        self.ready.set()
+
+    async def run(self):
+        """Write queued messages to the client until the session ends or the client stalls or leaves."""
+        try:
+            while not self.stalled.is_set():
+                await self.ready.wait()
+                if not self.items:
+                    if self.ending:
+                        break
+                    self.ready.clear()
+                    continue
+
+                kind, payload, audio, queued_at = self.items.popleft()
+                self.size -= len(payload)
+                self._check_drained()
+                if audio and time.monotonic() - queued_at > self.audio_max_age:
+                    OUTBOUND_DROPPED.inc(reason="stale")
+                    continue
+
+                send = self.websocket.send_text if kind == "text" else self.websocket.send_bytes
+                try:
+                    await asyncio.wait_for(send(payload), self.send_timeout)
+                except asyncio.TimeoutError:
+                    self._stall(f"send blocked for {self.send_timeout}s")
+                except Exception as e:
+                    # The client disconnected or the socket is already closed
+                    logging.info(f"[{self.session_id}] Send failed, dropping queued messages: {e}")
+                    self._stop()
+        finally:
+            # Producers waiting for room and receive() only return once this is set
+            await self._close()
+
+    def _check_drained(self):
+        if self.size < self.max_bytes:
+            self.drained.set()
+
+    def _stall(self, reason):
+        if self.stalled.is_set():
+            return
+        logging.warning(f"[{self.session_id}] Disconnecting slow client: {reason}")
+        SLOW_CLIENT_DISCONNECTS.inc()
+        self.close_code = SLOW_CLIENT_CLOSE_CODE
+        self._stop()
+
+    def _stop(self):
+        """Stop sending: drop what is queued and release producers waiting for room."""
+        self.stalled.set()
+        self.items.clear()
+        self.size = 0
+        self.drained.set()
+        self.ready.set()
+
+    async def _close(self):
+        try:
+            await asyncio.wait_for(self.websocket.close(code=self.close_code), 1)
+        except Exception as e:
+            logging.debug(f"[{self.session_id}] Closing socket failed: {e}")
+        finally:
+            self.closed.set()
+
+    async def receive(self):
+        """Receive the next client message, or a disconnect once the server has closed the socket."""
+        if self.closed_waiter is None:
+            self.closed_waiter = asyncio.ensure_future(self.closed.wait())
+        receive = asyncio.ensure_future(self.websocket.receive())
+        await asyncio.wait({receive, self.closed_waiter}, return_when=asyncio.FIRST_COMPLETED)
+        if receive.done():
+            return receive.result()
+
+        receive.cancel()
+        return {"type": "websocket.disconnect", "code": self.close_code}
+
+    def close(self):
+        if self.closed_waiter:
+            self.closed_waiter.cancel()
+            self.closed_waiter = None
@@ -1,35 +1,33 @@
 from fastapi import WebSocket, WebSocketDisconnect
 import logging
 import asyncio
-from deepgram import DeepgramClient, LiveOptions
-from dotenv import load_dotenv
-import os
 import json
+import uuid
 
 from .connection_manager import DeepgramConnectionManager
 from .conversation_state import ConversationState
 from .message_handler import WebSocketMessageHandler
 from .audio import AudioProcessor
 from .transcript_processor import TranscriptProcessor
+from .protocol import negotiate_protocol, negotiate_input_audio, negotiate_output_audio
+from .vad import VoiceActivityGate
+from .session import session_registry
+from .outbound import OutboundQueue
+from .recorder import SessionRecorder
+from clients import upstream
+from admission import admission
+from agent.profile import profiles
+from config import SESSION_RECORD_DIR, VAD_ENABLED, DRAIN_IDLE_SECONDS
 
-load_dotenv()
+# WebSocket close code telling the client the server is restarting and it should reconnect
+SERVICE_RESTART = 1012
+DRAIN_POLL_SECONDS = 0.1
 
-DEEPGRAM_API_KEY = os.getenv('DEEPGRAM_API_KEY')
-deepgram = DeepgramClient(DEEPGRAM_API_KEY)
 
-
-async def live_text_transcription(websocket: WebSocket):
-    """Main loop for real-time audio transcription and response."""
-    
-    connection_manager = DeepgramConnectionManager(deepgram)
-    conversation_state = ConversationState()
-    message_handler = WebSocketMessageHandler(connection_manager, conversation_state)
-    audio_processor = AudioProcessor(deepgram)
-    transcript_processor = TranscriptProcessor(conversation_state, audio_processor)
-    
-    on_message = transcript_processor.setup_deepgram_callback()
-    
-    options = LiveOptions(
+def live_options(input_audio=None):
+    """Live transcription options in Deepgram's terms, plus the raw encoding if the client negotiated one."""
+    return dict(
+        **(input_audio or {}),
         model="nova-3", 
         interim_results=True, 
         language="en-US",
@@ -40,28 +38,93 @@ async def live_text_transcription(websocket: WebSocket):
         smart_format=True,
         utterance_end_ms="1000"
     )
+
+
+async def end_when_drained(session_id, transcript_processor, outbound):
+    """Once the worker starts draining, close the session at the end of the current turn."""
+    await admission.draining.wait()
+    while not transcript_processor.between_turns(DRAIN_IDLE_SECONDS):
+        await asyncio.sleep(DRAIN_POLL_SECONDS)
+    logging.info(f"[{session_id}] Ending session for shutdown")
+    await outbound.send_text(json.dumps({
+        "status": "draining",
+        "message": "Server restarting, reconnect to continue",
+        "retry_after": 0
+    }))
+    outbound.end(SERVICE_RESTART)
+
+
+async def live_text_transcription(websocket: WebSocket):
+    """Main loop for real-time audio transcription and response."""
+    
+    # Clients opt into raw binary audio frames with ?protocol=binary
+    protocol = negotiate_protocol(websocket.query_params.get("protocol"))
+    # ?output=linear16 or ?output=opus streams each sentence in small chunks instead of one MP3
+    output_format = negotiate_output_audio(websocket.query_params.get("output"))
+    # Raw PCM can be gated on voice activity, webm/opus from MediaRecorder is passed through
+    input_audio = negotiate_input_audio(
+        websocket.query_params.get("encoding"), websocket.query_params.get("sample_rate")
+    )
+    
+    session_id = uuid.uuid4().hex[:12]
+    user_id = websocket.query_params.get("user_id")
+    backends = upstream.session_backends(websocket.query_params)
+    if output_format and not backends.tts.supports(output_format["options"]):
+        # e.g. Opus from the local engine, which only streams linear16
+        output_format = None
+    
+    supervisor = session_registry.open(session_id)
+    # Everything the session sends goes through a bounded queue so a slow client cannot stall it
+    outbound = OutboundQueue(websocket, session_id)
+    supervisor.spawn(outbound.run(), name=f"outbound-{session_id}")
+    connection_manager = DeepgramConnectionManager(backends.stt, supervisor, container_audio=input_audio is None)
+    recorder = SessionRecorder(session_id, SESSION_RECORD_DIR) if SESSION_RECORD_DIR else None
+    conversation_state = ConversationState(session_id, user_id, supervisor, recorder)
+    if user_id:
+        conversation_state.memory.profile = await profiles.load(user_id)
+    vad_gate = VoiceActivityGate(input_audio["sample_rate"]) if input_audio and VAD_ENABLED else None
+    message_handler = WebSocketMessageHandler(connection_manager, conversation_state, vad_gate)
+    audio_processor = AudioProcessor(backends, protocol, output_format)
+    transcript_processor = TranscriptProcessor(
+        conversation_state, audio_processor, connection_manager.seam, backends
+    )
+    
+    event_handlers = transcript_processor.setup_deepgram_events()
+    
+    options = live_options(input_audio)
     
     # Main WebSocket loop
     try:
-        await websocket.send_text(json.dumps({
+        await outbound.send_text(json.dumps({
             "status": "ready",
-            "message": "Server ready to accept commands"
+            "message": "Server ready to accept commands",
+            "protocol": protocol,
+            "input_encoding": input_audio["encoding"] if input_audio else "container",
+            "output_content_type": output_format["content_type"] if output_format else backends.tts.content_type,
+            "backends": backends.names()
         }))
         
-        queue_task = asyncio.create_task(transcript_processor.start_processing(websocket))
+        supervisor.spawn(transcript_processor.start_processing(outbound), name=f"transcripts-{session_id}")
+        supervisor.spawn(
+            end_when_drained(session_id, transcript_processor, outbound), name=f"drain-{session_id}"
+        )
         
         while True:
             try:
-                message_data = await websocket.receive()
+                message_data = await outbound.receive()
+                
+                if message_data["type"] == "websocket.disconnect":
+                    logging.info("WebSocket disconnected")
+                    break
                 
                 if "text" in message_data:
                     await message_handler.handle_text_message(
-                        websocket, message_data["text"], on_message, options
+                        outbound, message_data["text"], event_handlers, options
                     )
                 
                 elif "bytes" in message_data:
                     await message_handler.handle_bytes_message(
-                        websocket, message_data["bytes"], on_message, options
+                        outbound, message_data["bytes"], event_handlers, options
                     )
                 
             except WebSocketDisconnect:
@@ -70,7 +133,7 @@ async def live_text_transcription(websocket: WebSocket):
             
             except Exception as e:
                 logging.error(f"Error processing data: {e}")
-                await websocket.send_text(json.dumps({"error": str(e)}))
+                await outbound.send_text(json.dumps({"error": str(e)}))
                 
     except WebSocketDisconnect:
         logging.info("Disconnected")
@@ -78,11 +141,15 @@ async def live_text_transcription(websocket: WebSocket):
         logging.error(f"Error in WebSocket handler: {e}")
     
     finally:
+        profiles.flush_session(session_id, user_id)
         try:
             await message_handler.cleanup()
-            await connection_manager.close_connection()
             conversation_state.clear_state()
-            if queue_task in locals():
-                queue_task.cancel()
+            # Reaps the processing loop, outbound writer, keepalive and any in-flight LLM/TTS calls
+            await session_registry.close(session_id)
+            outbound.close()
+            await connection_manager.close_connection()
+            if recorder:
+                await recorder.save()
         except Exception as e:
             logging.error(f"Error in cleaning connection or finalizing events: {e}")
\ No newline at end of file
@@ -0,0 +1,93 @@
+import struct
+from config import TTS_STREAM_CHUNK_MS
+
+# Binary audio frames are a fixed header followed by the raw audio payload:
+# version (u8), codec (u8), sentence index (u16), sequence number (u32), big-endian
+AUDIO_FRAME_HEADER = struct.Struct("!BBHI")
+AUDIO_FRAME_VERSION = 1
+
+JSON_PROTOCOL = "json"
+BINARY_PROTOCOL = "binary"
+
+# Raw input encodings a client may offer with ?encoding=...&sample_rate=..., anything
+# else is a container such as MediaRecorder's webm/opus that Deepgram detects itself
+RAW_INPUT_ENCODINGS = {"linear16"}
+DEFAULT_INPUT_SAMPLE_RATE = 16000
+
+# Streaming output formats a client may request with ?output=..., everyone else gets one MP3
+# per sentence. chunk_bytes re-slices raw PCM into whole-sample playback chunks, Ogg/Opus is
+# forwarded as the TTS backend sends it
+MP3_CONTENT_TYPE = "audio/mp3"
+# Per-sentence audio from the local TTS engine
+WAV_CONTENT_TYPE = "audio/wav"
+LINEAR16_OUTPUT_SAMPLE_RATE = 24000
+OUTPUT_FORMATS = {
+    "linear16": {
+        "content_type": "audio/l16",
+        "sample_rate": LINEAR16_OUTPUT_SAMPLE_RATE,
+        "chunk_bytes": LINEAR16_OUTPUT_SAMPLE_RATE * 2 * TTS_STREAM_CHUNK_MS // 1000,
+        "options": {"encoding": "linear16", "container": "none", "sample_rate": LINEAR16_OUTPUT_SAMPLE_RATE},
+    },
+    "opus": {
+        "content_type": "audio/ogg",
+        "sample_rate": 48000,
+        "chunk_bytes": None,
+        "options": {"encoding": "opus", "container": "ogg"},
+    },
+}
+
+CODECS = {
+    MP3_CONTENT_TYPE: 1,
+    "audio/l16": 2,
+    "audio/ogg": 3,
+    WAV_CONTENT_TYPE: 4,
+}
+CONTENT_TYPES = {code: content_type for content_type, code in CODECS.items()}
+
+
+def negotiate_protocol(requested):
+    """Pick the outbound audio protocol for a client, falling back to JSON."""
+    if requested == BINARY_PROTOCOL:
+        return BINARY_PROTOCOL
+    return JSON_PROTOCOL
+
+
+def negotiate_output_audio(requested):
+    """The streaming output format a client asked for, or None to keep per-sentence MP3."""
+    return OUTPUT_FORMATS.get(requested)
+
+
+def negotiate_input_audio(encoding, sample_rate=None):
+    """Deepgram options for the client's raw inbound audio, or None for containerized audio."""
+    if encoding not in RAW_INPUT_ENCODINGS:
+        return None
+    try:
+        sample_rate = int(sample_rate or DEFAULT_INPUT_SAMPLE_RATE)
+    except ValueError:
+        sample_rate = DEFAULT_INPUT_SAMPLE_RATE
+    return {"encoding": encoding, "sample_rate": sample_rate, "channels": 1}
+
+
+def encode_audio_frame(sequence, sentence_index, content_type, payload):
+    """Pack audio bytes into a binary WebSocket frame."""
+    header = AUDIO_FRAME_HEADER.pack(
+        AUDIO_FRAME_VERSION,
+        CODECS[content_type],
+        sentence_index & 0xFFFF,
+        sequence & 0xFFFFFFFF
+    )
+    return header + payload
+
+
+def decode_audio_frame(frame):
+    """Unpack a binary WebSocket frame into its header fields and audio payload."""
+    version, codec, sentence_index, sequence = AUDIO_FRAME_HEADER.unpack_from(frame)
+    if version != AUDIO_FRAME_VERSION:
+        raise ValueError(f"Unsupported audio frame version: {version}")
+    
+    return {
+        "sequence": sequence,
+        "sentence_index": sentence_index,
+        "content_type": CONTENT_TYPES[codec],
+        "audio": frame[AUDIO_FRAME_HEADER.size:]
+    }
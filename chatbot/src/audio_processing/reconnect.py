@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import deque
+from metrics import TRANSCRIPT_SEAM_WORDS
+
+# Hard cap on buffered audio, in case a client sends far faster than real time
+REPLAY_MAX_BYTES = 4 * 1024 * 1024
+# Committed words remembered for matching against transcripts of replayed audio
+SEAM_HISTORY_WORDS = 64
+# Words a new transcript must share with the committed history before it counts as a repeat
+SEAM_MIN_OVERLAP_WORDS = 2
+
+
+def _normalize_word(word):
+    return "".join(c for c in word.lower() if c.isalnum())
+
+
+def _common_prefix(left, right):
+    count = 0
+    for a, b in zip(left, right):
+        if a != b:
+            break
+        count += 1
+    return count
+
+
+class AudioReplayBuffer:
+    """The last few seconds of audio sent to Deepgram, replayed into a new connection after a drop."""
+
+    def __init__(self, max_seconds, keep_header=False, max_bytes=REPLAY_MAX_BYTES):
+        self.max_seconds = max_seconds
+        self.max_bytes = max_bytes
+        # Container streams such as MediaRecorder's webm only carry their header in the first
+        # chunk, and a new connection cannot decode the clusters that follow without it
+        self.keep_header = keep_header
+        self.header = None
+        self.chunks = deque()
+        self.size = 0
+
+    def append(self, chunk):
+        if self.keep_header and self.header is None:
+            self.header = chunk
+        now = time.monotonic()
+        self.chunks.append((now, chunk))
+        self.size += len(chunk)
+        while self.chunks and (self.size > self.max_bytes or now - self.chunks[0][0] > self.max_seconds):
+            self.size -= len(self.chunks.popleft()[1])
+
+    def replay(self):
+        """Chunks to send into a fresh connection, oldest first, led by the container header."""
+        chunks = [chunk for _, chunk in self.chunks]
+        if self.header is not None and (not chunks or chunks[0] is not self.header):
+            chunks.insert(0, self.header)
+        return chunks
+
+    def clear(self):
+        self.header = None
+        self.chunks.clear()
+        self.size = 0
+
+
+class TranscriptSeam:
+    """Drops words a new connection transcribes again because its replayed audio overlaps the old one.
+
+    Final transcripts arrive on the Deepgram SDK's callback thread, so all state is behind a lock.
+    """
+
+    def __init__(self, max_seconds, history_words=SEAM_HISTORY_WORDS):
+        # Replayed audio is transcribed well within this long, later speech is never a repeat
+        self.max_seconds = max_seconds
+        self.committed = deque(maxlen=history_words)
+        self.expected = None
+        self.active = False
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def open(self):
+        """Start matching new transcripts against the committed history, called on reconnect."""
+        with self.lock:
+            self.active = True
+            self.expected = None
+            self.opened_at = time.monotonic()
+
+    def is_open(self):
+        """Whether transcripts may still describe replayed audio."""
+        if self.active and time.monotonic() - self.opened_at > self.max_seconds:
+            self.active = False
+        return self.active
+
+    def reset(self):
+        with self.lock:
+            self.committed.clear()
+            self.expected = None
+            self.active = False
+
+    def final(self, transcript):
+        """Return the part of a final transcript that was not already committed, and commit it."""
+        words = transcript.split()
+        with self.lock:
+            skip = self._duplicate_prefix([_normalize_word(w) for w in words]) if self.is_open() else 0
+            fresh = words[skip:]
+            self.committed.extend(_normalize_word(w) for w in fresh)
+        if skip:
+            TRANSCRIPT_SEAM_WORDS.inc(skip)
+        return " ".join(fresh)
+
+    def _duplicate_prefix(self, keys):
+        if self.expected is None:
+            skip, self.expected = self._align(keys)
+        else:
+            skip = _common_prefix(keys, self.expected)
+            self.expected = self.expected[skip:]
+        # The seam is crossed once a transcript has new words or the repeated history runs out
+        if skip < len(keys) or not self.expected:
+            self.active = False
+        return skip
+
+    def _align(self, keys):
+        """Find where the replayed audio starts in the committed history, preferring the latest match."""
+        history = list(self.committed)
+        needed = min(SEAM_MIN_OVERLAP_WORDS, len(keys))
+        best_length, best_end = 0, len(history)
+        for start in range(len(history)):
+            length = _common_prefix(keys, history[start:])
+            if length >= needed and length >= best_length and length:
+                best_length, best_end = length, start + length
+        return best_length, history[best_end:]
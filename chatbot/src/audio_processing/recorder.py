@@ -0,0 +1,61 @@
+import asyncio
+import base64
+import json
+import logging
+import os
+import time
+
+RECORDING_VERSION = 1
+
+
+class SessionRecorder:
+    """Captures a /listen session so it can be replayed offline against stub upstreams."""
+
+    def __init__(self, session_id, directory):
+        self.session_id = session_id
+        self.path = os.path.join(directory, f"{session_id}.json")
+        self.started_at = time.perf_counter()
+        self.audio = []
+        self.events = []
+        self.replies = []
+        self.speech = []
+
+    def _offset(self):
+        return round(time.perf_counter() - self.started_at, 4)
+
+    def record_audio(self, audio_bytes):
+        """Record an inbound audio frame and when it arrived."""
+        self.audio.append({"t": self._offset(), "data": base64.b64encode(audio_bytes).decode("ascii")})
+
+    def record_event(self, result):
+        """Record a Deepgram live event; called from the SDK's callback thread."""
+        self.events.append({"t": self._offset(), "payload": result.to_dict()})
+
+    def record_reply(self, transcript, response_text):
+        self.replies.append({"t": self._offset(), "transcript": transcript, "response": response_text})
+
+    def record_speech(self, sentence, audio_bytes):
+        self.speech.append({"sentence": sentence, "audio": base64.b64encode(audio_bytes).decode("ascii")})
+
+    def to_dict(self):
+        return {
+            "version": RECORDING_VERSION,
+            "session_id": self.session_id,
+            "audio": self.audio,
+            "events": self.events,
+            "replies": self.replies,
+            "speech": self.speech,
+        }
+
+    async def save(self):
+        """Write the recording to disk off the event loop."""
+        try:
+            await asyncio.to_thread(self._write)
+            logging.info(f"Recorded session to {self.path}")
+        except OSError as e:
+            logging.error(f"Could not save session recording: {e}")
+
+    def _write(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "w") as f:
+            json.dump(self.to_dict(), f)
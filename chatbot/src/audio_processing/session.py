@@ -0,0 +1,68 @@
+import asyncio
+import logging
+from metrics import ACTIVE_SESSIONS
+
+
+class SessionSupervisor:
+    """Owns every task spawned for one /listen connection and tears them all down together."""
+    
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.tasks = set()
+        self.closed = False
+        
+    def spawn(self, coro, name=None):
+        """Start a task owned by this session."""
+        return self.adopt(asyncio.create_task(coro, name=name))
+        
+    def adopt(self, task):
+        """Take ownership of a task created elsewhere."""
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        if self.closed:
+            # Started while the session unwinds: cancelled at once, and shutdown still waits for it
+            task.cancel()
+        return task
+        
+    async def shutdown(self):
+        """Cancel every owned task and wait until they have all finished."""
+        self.closed = True
+        # Tasks may spawn children while they unwind, keep going until nothing is left
+        while self.tasks:
+            pending = list(self.tasks)
+            for task in pending:
+                # adopt() has already cancelled late arrivals, a second cancel would cut their cleanup short
+                if not task.cancelling():
+                    task.cancel()
+            results = await asyncio.gather(*pending, return_exceptions=True)
+            for result in results:
+                if isinstance(result, Exception):
+                    logging.error(f"[{self.session_id}] Task failed during shutdown: {result}")
+                    
+                    
+class SessionRegistry:
+    """Tracks live sessions on this worker and the tasks they own."""
+    
+    def __init__(self):
+        self.sessions = {}
+        
+    def open(self, session_id):
+        supervisor = SessionSupervisor(session_id)
+        self.sessions[session_id] = supervisor
+        ACTIVE_SESSIONS.set(len(self.sessions))
+        return supervisor
+        
+    async def close(self, session_id):
+        supervisor = self.sessions.pop(session_id, None)
+        ACTIVE_SESSIONS.set(len(self.sessions))
+        if supervisor:
+            await supervisor.shutdown()
+            
+    def session_count(self):
+        return len(self.sessions)
+        
+    def task_count(self):
+        return sum(len(supervisor.tasks) for supervisor in self.sessions.values())
+
+
+session_registry = SessionRegistry()
@@ -1,86 +1,286 @@
 import json
+import time
 import asyncio
 import logging
-from agent.response import ai_response
+from agent.response import stream_ai_response
+from backends.base import LiveEvents
+from agent.profile import profiles
+from config import (
+    FULL_DUPLEX, BARGE_IN_GUARD_SECONDS, BARGE_IN_MIN_WORDS, BARGE_IN_ON_SPEECH_STARTED,
+    SPECULATIVE_RESPONSES, SPECULATION_STABLE_INTERIMS
+)
+from metrics import (
+    TurnSpans, TRANSCRIPT_HANDOFF_SECONDS, INTERRUPTIONS, INTERRUPT_LATENCY_SECONDS,
+    SPECULATIONS, SPECULATION_SAVED_SECONDS
+)
+from .turn_detector import EndOfTurnDetector, SpeculativeResponse
 
 class TranscriptProcessor:
     """Handles transcript processing, AI response generation, and conversation flow."""
     
-    def __init__(self, conversation_state, audio_processor):
+    def __init__(self, conversation_state, audio_processor, seam=None, backends=None):
         self.conversation_state = conversation_state
+        self.seam = seam
+        self.backends = backends
         self.audio_processor = audio_processor
+        self.websocket = None
+        self.reply_task = None
+        self.turn_detector = EndOfTurnDetector(SPECULATION_STABLE_INTERIMS)
+        self.speculation = None
+        # Whether this turn started a speculative reply, counted once as a hit or miss when it is committed
+        self.speculated = False
+        
+    def between_turns(self, quiet_seconds):
+        """True when no reply is being generated or spoken and the user has gone quiet."""
+        replying = self.reply_task is not None and not self.reply_task.done()
+        return not replying and self.conversation_state.is_idle(quiet_seconds)
         
     async def start_processing(self, websocket):
         """Start the transcript processing loop."""
+        self.websocket = websocket
         while True:
             await self._process_next_transcript(websocket)
-            await asyncio.sleep(0.1)
     
     async def _process_next_transcript(self, websocket):
-        """Process the next transcript from the queue."""
-        transcript_data = self.conversation_state.get_next_transcript()
-        if not transcript_data:
-            return
+        """Wait for the next transcript from the queue and process it."""
+        transcript_data = await self.conversation_state.get_next_transcript()
             
         transcript = transcript_data["transcript"]
         transcript_time = transcript_data["timestamp"]
         
+        handoff = time.perf_counter() - transcript_data["received_at"]
+        TRANSCRIPT_HANDOFF_SECONDS.observe(handoff)
+        logging.debug(f"Transcript handoff latency: {handoff * 1000:.2f} ms")
+        
         # Handle interruption logic
         if self.conversation_state.should_ignore_user_input(transcript_time):
-            print(f"Ignoring user input during AI speech (within 2 seconds): {transcript}")
+            logging.info(f"Ignoring user input during AI speech (within 2 seconds): {transcript}")
             return
             
         elif self.conversation_state.is_user_interrupting(transcript_time):
-            print(f"User interruption detected: {transcript}")
-            self.conversation_state.reset_ai_speaking()
-            await websocket.send_text(json.dumps({"interrupt": True}))
+            logging.info(f"User interruption detected: {transcript}")
+            await self.interrupt(websocket, transcript_data["received_at"])
             return
         
         if not self.conversation_state.ai_currently_speaking:
-            await self._handle_user_input(websocket, transcript)
+            self._handle_user_input(websocket, transcript, transcript_data["received_at"])
+            
+    async def interrupt(self, websocket, detected_at):
+        """Stop the AI mid-reply: cancel queued TTS and the LLM stream, then tell the client."""
+        if not self.conversation_state.ai_currently_speaking:
+            return
+        
+        INTERRUPTIONS.inc()
+        self.conversation_state.mark_turn("interrupted")
+        self.conversation_state.reset_ai_speaking()
+        if self.reply_task:
+            self.reply_task.cancel()
+            self.reply_task = None
+        # Audio from the interrupted reply that the client has not received yet is stale
+        websocket.discard_audio()
+            
+        await websocket.send_text(json.dumps({"interrupt": True}))
+        INTERRUPT_LATENCY_SECONDS.observe(time.perf_counter() - detected_at)
     
-    async def _handle_user_input(self, websocket, transcript):
-        """Handle user input and generate AI response."""
+    def _handle_user_input(self, websocket, transcript, received_at=None):
+        """Handle user input and start generating the AI response."""
         transcript = self.conversation_state.handle_partial_transcript(transcript)
         
         if not self.conversation_state.is_complete_sentence(transcript):
             self.conversation_state.set_partial_transcript(transcript)
-            print(f"Incomplete sentence, keeping in buffer: {transcript}")
+            logging.debug(f"Incomplete sentence, keeping in buffer: {transcript}")
             return
         
-        print(f"User Input: {transcript}")
+        logging.info(f"User Input: {transcript}")
+        self.turn_detector.reset()
+        speculation = self._take_speculation(transcript)
+        
+        self.conversation_state.current_turn = TurnSpans(self.conversation_state.session_id, received_at)
+        self.conversation_state.mark_turn("transcript_handled")
         self.conversation_state.start_ai_speaking()
         
+        # The reply runs as its own task so this loop stays free to notice interruptions
+        self.reply_task = self.conversation_state.supervisor.spawn(
+            self._respond(websocket, transcript, speculation)
+        )
+        
+    async def _respond(self, websocket, transcript, speculation=None):
+        """Generate and speak the AI response to a complete user utterance."""
+        memory = self.conversation_state.memory
         try:
-            response_text = ai_response(transcript)
-            print(f"AI Response: {response_text}")
+            if speculation:
+                token_stream = speculation.replay()
+            else:
+                self._refresh_profile()
+                token_stream = stream_ai_response(transcript, memory, self.backends)
+            
+            response_text = await self.audio_processor.process_response_stream(
+                websocket, token_stream, self.conversation_state
+            )
+            logging.info(f"AI Response: {response_text}")
             
-            await self.audio_processor.process_response_audio(
-                websocket, response_text, self.conversation_state
+            # The reply has been spoken, so summarizing now never delays it
+            memory.add_turn(transcript, response_text)
+            if self.conversation_state.recorder:
+                self.conversation_state.recorder.record_reply(transcript, response_text)
+            summary_task = memory.schedule_summary()
+            if summary_task:
+                self.conversation_state.supervisor.adopt(summary_task)
+            profiles.record_turn(
+                self.conversation_state.session_id, self.conversation_state.user_id, transcript
             )
             
+        except asyncio.CancelledError:
+            memory.add_turn(transcript, None)
+            raise
+            
         except Exception as e:
             logging.error(f"Error generating AI response: {e}")
             self.conversation_state.reset_ai_speaking()
             await websocket.send_text(json.dumps({
                 "error": "Failed to generate AI response"
             }))
+            
+        finally:
+            if speculation:
+                speculation.discard()
+                
+    def _refresh_profile(self):
+        if self.conversation_state.user_id:
+            self.conversation_state.memory.profile = profiles.compact(self.conversation_state.user_id)
+            
+    def _speculate(self, hypothesis):
+        """Start generating a reply to a stable interim hypothesis before the final transcript lands."""
+        if self.conversation_state.ai_currently_speaking:
+            return
+        
+        transcript = self.conversation_state.peek_partial_transcript(hypothesis)
+        if self.speculation and self.speculation.matches(transcript):
+            return
+        self._discard_speculation()
+        if not self.conversation_state.is_complete_sentence(transcript):
+            return
+        
+        logging.debug(f"Speculatively answering: {transcript}")
+        self._refresh_profile()
+        self.speculated = True
+        self.speculation = SpeculativeResponse(
+            transcript,
+            stream_ai_response(transcript, self.conversation_state.memory, self.backends),
+            self.conversation_state.supervisor
+        )
+        
+    def _take_speculation(self, transcript):
+        """Hand over the speculative reply if it answered exactly this transcript, else discard it."""
+        speculation, self.speculation = self.speculation, None
+        speculated, self.speculated = self.speculated, False
+        if speculation and speculation.matches(transcript):
+            SPECULATIONS.inc(result="hit")
+            SPECULATION_SAVED_SECONDS.observe(speculation.saved_seconds(time.perf_counter()))
+            return speculation
+        
+        if speculation:
+            speculation.discard()
+        if speculated:
+            SPECULATIONS.inc(result="miss")
+        return None
+        
+    def _discard_speculation(self):
+        """Drop a speculative reply the latest interim no longer matches, the turn is counted at commit."""
+        if self.speculation:
+            self.speculation.discard()
+            self.speculation = None
+            
+    def _on_interim(self, transcript):
+        hypothesis = self.turn_detector.update(transcript)
+        if hypothesis:
+            self._speculate(hypothesis)
+            
+    def _on_utterance_end(self):
+        hypothesis = self.turn_detector.utterance_ended()
+        if hypothesis:
+            self._speculate(hypothesis)
+            
+    def _request_barge_in(self, reason):
+        """Called from the Deepgram callback thread when the user may be talking over the AI."""
+        state = self.conversation_state
+        if not FULL_DUPLEX or not state.ai_currently_speaking or not state.ai_speaking_start_time:
+            return
+        # Echo guard: the first moments of AI speech are most likely to leak back into the mic
+        if time.time() - state.ai_speaking_start_time < BARGE_IN_GUARD_SECONDS:
+            return
+        
+        detected_at = time.perf_counter()
+        logging.info(f"Barge-in detected ({reason})")
+        state.loop.call_soon_threadsafe(self._start_interrupt, detected_at)
+        
+    def _start_interrupt(self, detected_at):
+        if self.websocket and self.conversation_state.ai_currently_speaking:
+            self.conversation_state.supervisor.spawn(self.interrupt(self.websocket, detected_at))
     
     def setup_deepgram_callback(self):
         """Create and return the Deepgram message callback function."""
         def on_message(sender, result, **kwargs):
             try:
                 transcript = result.channel.alternatives[0].transcript
+                if transcript:
+                    self.conversation_state.note_speech()
                 is_final = getattr(result, 'is_final', None)
                 if is_final is None:
                     is_final = getattr(result.channel.alternatives[0], 'is_final', False)
                 
                 if is_final and len(transcript) > 0:
-                    print(f"Final transcript: {transcript}")
+                    if self.seam:
+                        # After a reconnect the replayed audio is transcribed a second time
+                        transcript = self.seam.final(transcript)
+                        if not transcript:
+                            logging.debug("Final transcript of replayed audio dropped")
+                            return
+                    logging.debug(f"Final transcript: {transcript}")
                     self.conversation_state.add_transcript(transcript)
+                elif self.seam and self.seam.is_open():
+                    logging.debug("Interim transcript of replayed audio ignored")
+                elif len(transcript) > 0:
+                    if len(transcript.split()) >= BARGE_IN_MIN_WORDS:
+                        self._request_barge_in("interim transcript")
+                    if SPECULATIVE_RESPONSES:
+                        self.conversation_state.loop.call_soon_threadsafe(self._on_interim, transcript)
                 else:
-                    logging.info("Interim transcript ignored")
+                    logging.debug("Empty interim transcript ignored")
             except Exception as e:
                 logging.error(f"Error processing transcript: {e}")
         
-        return on_message
\ No newline at end of file
+        return on_message
+    
+    def setup_deepgram_events(self):
+        """Create the Deepgram live event handlers for this session."""
+        def on_speech_started(sender, speech_started, **kwargs):
+            if BARGE_IN_ON_SPEECH_STARTED:
+                self._request_barge_in("speech started")
+                
+        def on_utterance_end(sender, utterance_end, **kwargs):
+            if SPECULATIVE_RESPONSES:
+                self.conversation_state.loop.call_soon_threadsafe(self._on_utterance_end)
+                
+        handlers = {
+            LiveEvents.Transcript: self.setup_deepgram_callback(),
+            LiveEvents.SpeechStarted: on_speech_started,
+            LiveEvents.UtteranceEnd: on_utterance_end,
+        }
+        if self.conversation_state.recorder:
+            handlers = {event: self._recording(handler) for event, handler in handlers.items()}
+        return handlers
+        
+    def _recording(self, handler):
+        """Wrap a Deepgram event handler so the raw event is captured for replay."""
+        recorder = self.conversation_state.recorder
+        
+        # The SDK passes the event under a per-event keyword (result, speech_started, ...)
+        def on_event(sender, **kwargs):
+            for payload in kwargs.values():
+                if hasattr(payload, "to_dict"):
+                    recorder.record_event(payload)
+                    break
+            handler(sender, **kwargs)
+            
+        return on_event
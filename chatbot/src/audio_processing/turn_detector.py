@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import time
+from cache import normalize_prompt
+
+
+class EndOfTurnDetector:
+    """Decides when an interim hypothesis is stable enough to start answering it early."""
+
+    def __init__(self, stable_interims):
+        self.stable_interims = stable_interims
+        self.hypothesis = ""
+        self.repeats = 0
+
+    def update(self, transcript):
+        """Record an interim hypothesis and return it once it has stopped changing."""
+        normalized = normalize_prompt(transcript)
+        if not normalized:
+            return None
+
+        if normalized == normalize_prompt(self.hypothesis):
+            self.repeats += 1
+        else:
+            self.hypothesis = transcript
+            self.repeats = 1
+
+        if self.repeats >= self.stable_interims:
+            return self.hypothesis
+        return None
+
+    def utterance_ended(self):
+        """Deepgram saw the end of the utterance, so the latest hypothesis is as good as final."""
+        return self.hypothesis or None
+
+    def reset(self):
+        self.hypothesis = ""
+        self.repeats = 0
+
+
+class SpeculativeResponse:
+    """An LLM reply generated ahead of the final transcript, buffered until it is committed or discarded."""
+
+    def __init__(self, transcript, token_stream, supervisor):
+        self.transcript = transcript
+        self.key = normalize_prompt(transcript)
+        self.started_at = time.perf_counter()
+        self.first_token_at = None
+        self.tokens = []
+        self.done = False
+        self.error = None
+        self.updated = asyncio.Event()
+        self.task = supervisor.spawn(self._consume(token_stream))
+
+    def matches(self, transcript):
+        return self.key == normalize_prompt(transcript)
+
+    async def _consume(self, token_stream):
+        try:
+            async for token in token_stream:
+                if self.first_token_at is None:
+                    self.first_token_at = time.perf_counter()
+                self.tokens.append(token)
+                self.updated.set()
+        except Exception as e:
+            logging.error(f"Speculative response failed: {e}")
+            self.error = e
+        finally:
+            self.done = True
+            self.updated.set()
+
+    def saved_seconds(self, committed_at):
+        """How much sooner the first token is ready than if the reply had started at committed_at.
+
+        That is the head start, but never more than the first token took: a reply that was ready
+        well before the final transcript only saved its time to first token.
+        """
+        head_start = committed_at - self.started_at
+        if self.first_token_at is None:
+            return head_start
+        return min(head_start, self.first_token_at - self.started_at)
+
+    async def replay(self):
+        """Yield the buffered tokens, then keep following the stream until it ends."""
+        sent = 0
+        while True:
+            while sent < len(self.tokens):
+                yield self.tokens[sent]
+                sent += 1
+            if self.done:
+                break
+            self.updated.clear()
+            await self.updated.wait()
+
+        if self.error:
+            raise self.error
+
+    def discard(self):
+        self.task.cancel()
@@ -0,0 +1,121 @@
+import array
+import logging
+import math
+import sys
+from collections import deque
+from config import VAD_THRESHOLD, VAD_PREROLL_SECONDS, VAD_HANGOVER_SECONDS
+from metrics import VAD_AUDIO_BYTES, VAD_REDUCTION_RATIO
+
+try:
+    import audioop  # C implementation of RMS, removed from the standard library in Python 3.13
+except ImportError:
+    audioop = None
+
+# Analysis frame length, short enough to catch the onset of a word
+VAD_FRAME_SECONDS = 0.02
+SAMPLE_WIDTH = 2
+# The speech threshold tracks the background noise, at this multiple of its level
+NOISE_FLOOR_MULTIPLIER = 3.0
+NOISE_FLOOR_SMOOTHING = 0.05
+
+
+def frame_rms(pcm):
+    """RMS level of a little-endian 16-bit PCM frame."""
+    if not pcm:
+        return 0.0
+    if audioop:
+        return audioop.rms(pcm, SAMPLE_WIDTH)
+    samples = array.array("h", pcm)
+    if sys.byteorder == "big":
+        samples.byteswap()
+    return math.sqrt(sum(s * s for s in samples) / len(samples))
+
+
+class VoiceActivityGate:
+    """Forwards speech from a linear16 stream with a short pre-roll and holds back the silence between."""
+
+    def __init__(self, sample_rate, channels=1, threshold=VAD_THRESHOLD,
+                 preroll_seconds=VAD_PREROLL_SECONDS, hangover_seconds=VAD_HANGOVER_SECONDS):
+        self.block_align = SAMPLE_WIDTH * channels
+        bytes_per_second = sample_rate * self.block_align
+        frame_samples = max(1, int(sample_rate * VAD_FRAME_SECONDS))
+        self.frame_bytes = frame_samples * self.block_align
+        self.threshold = threshold
+        self.noise_floor = None
+        self.max_preroll_bytes = int(bytes_per_second * preroll_seconds)
+        # Keep forwarding this long after the last speech frame so Deepgram still sees the
+        # silence it needs for endpointing and UtteranceEnd
+        self.hangover_bytes = int(bytes_per_second * hangover_seconds)
+        self.silence_bytes = self.hangover_bytes + 1
+        self.preroll = deque()
+        self.preroll_bytes = 0
+        self.carry = b""
+        self.is_open = False
+        self.received_bytes = 0
+        self.forwarded_bytes = 0
+
+    def process(self, chunk):
+        """Return the audio to forward for an inbound chunk, an empty list while the user is silent."""
+        self.received_bytes += len(chunk)
+        data = self.carry + chunk
+        # Only whole samples are forwarded or dropped, so the stream never loses alignment
+        aligned = len(data) - len(data) % self.block_align
+        data, self.carry = data[:aligned], data[aligned:]
+        if not data:
+            return []
+
+        if self._contains_speech(data):
+            self.silence_bytes = 0
+        else:
+            self.silence_bytes += len(data)
+
+        if self.silence_bytes <= self.hangover_bytes:
+            forwarded = [data]
+            if not self.is_open:
+                forwarded = list(self.preroll) + forwarded
+                self.preroll.clear()
+                self.preroll_bytes = 0
+                self.is_open = True
+            self.forwarded_bytes += sum(len(part) for part in forwarded)
+            return forwarded
+
+        self.is_open = False
+        self._remember(data)
+        return []
+
+    def _contains_speech(self, data):
+        speech = False
+        for start in range(0, len(data), self.frame_bytes):
+            level = frame_rms(data[start:start + self.frame_bytes])
+            if level > max(self.threshold, (self.noise_floor or 0) * NOISE_FLOOR_MULTIPLIER):
+                speech = True
+            elif self.noise_floor is None:
+                self.noise_floor = level
+            else:
+                self.noise_floor += (level - self.noise_floor) * NOISE_FLOOR_SMOOTHING
+        return speech
+
+    def _remember(self, data):
+        """Keep the most recent silence so the start of the next word is not clipped."""
+        self.preroll.append(data)
+        self.preroll_bytes += len(data)
+        while self.preroll and self.preroll_bytes - len(self.preroll[0]) >= self.max_preroll_bytes:
+            self.preroll_bytes -= len(self.preroll.popleft())
+
+    @property
+    def reduction_ratio(self):
+        """Fraction of inbound audio that never reached Deepgram."""
+        if not self.received_bytes:
+            return 0.0
+        return 1 - self.forwarded_bytes / self.received_bytes
+
+    def record_session(self, session_id):
+        """Report how much audio the gate held back over the session."""
+        VAD_AUDIO_BYTES.inc(self.received_bytes, stage="received")
+        VAD_AUDIO_BYTES.inc(self.forwarded_bytes, stage="forwarded")
+        if self.received_bytes:
+            VAD_REDUCTION_RATIO.observe(self.reduction_ratio)
+        logging.info(
+            f"[{session_id}] VAD forwarded {self.forwarded_bytes} of {self.received_bytes} bytes "
+            f"({self.reduction_ratio:.0%} reduction)"
+        )
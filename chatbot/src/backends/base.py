@@ -0,0 +1,127 @@
+class LiveEvents:
+    """Live transcription event names, the values of the Deepgram SDK's LiveTranscriptionEvents."""
+
+    Transcript = "Results"
+    SpeechStarted = "SpeechStarted"
+    UtteranceEnd = "UtteranceEnd"
+    Close = "Close"
+
+
+class ChatDelta:
+    """One piece of a streamed completion: new text, and on the last piece why it stopped and the token usage."""
+
+    def __init__(self, text="", finish_reason=None, usage=None):
+        self.text = text
+        self.finish_reason = finish_reason
+        # (prompt_tokens, completion_tokens), when the backend reports it
+        self.usage = usage
+
+
+def provider_name(backend, model):
+    """Name of a (backend, model or voice) pair as used for circuit breakers and caches."""
+    return f"{backend.name}/{model}"
+
+
+def split_provider_name(name):
+    """The backend and model or voice names in a provider name."""
+    backend, _, model = name.partition("/")
+    return backend, model
+
+
+class SpeechToText:
+    """Streaming speech recognizer.
+
+    connection() returns a live connection with the Deepgram SDK's interface: start(options),
+    send(audio), keep_alive(), finish() and is_connected(), emitting LiveEvents with result
+    objects shaped like Deepgram's to handlers registered with subscribe().
+    """
+
+    name = None
+    # Local engines run in-process on the CPU and can stand in while cloud providers are down
+    local = False
+
+    def available(self):
+        return True
+
+    def acquire(self, container_audio=True):
+        """A connection that is already started, or None to open one with connection()."""
+        return None
+
+    def connection(self):
+        raise NotImplementedError
+
+    def subscribe(self, conn, event, handler):
+        """Call handler(conn, **payload) for each LiveEvents event on the connection."""
+        conn.on(event, handler)
+
+    async def start(self, live_options=None):
+        """Load models or open pooled connections ahead of the first session."""
+
+    def status(self):
+        return None
+
+    async def close(self):
+        pass
+
+
+class ChatModel:
+    """Chat completion backend."""
+
+    name = None
+    local = False
+
+    def available(self):
+        return True
+
+    def model_for(self, requested):
+        """The model this backend runs for a turn routed to the requested model."""
+        return requested
+
+    def stream(self, model, messages, max_tokens):
+        """Async iterator of ChatDelta for the reply."""
+        raise NotImplementedError
+
+    async def complete(self, model, messages, max_tokens):
+        """The whole reply text."""
+        raise NotImplementedError
+
+    async def warm_up(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+class TextToSpeech:
+    """Speech synthesis backend."""
+
+    name = None
+    # Content type of stream() output when no streaming format options are given
+    content_type = None
+    local = False
+    default_voice = None
+    fallback_voice = None
+
+    def available(self):
+        return True
+
+    def supports(self, options):
+        """Whether the backend can produce the streaming output format with these options."""
+        return True
+
+    def voices(self):
+        """The default voice, then the fallback voice for when it is failing."""
+        voices = [self.default_voice]
+        if self.fallback_voice and self.fallback_voice != self.default_voice:
+            voices.append(self.fallback_voice)
+        return voices
+
+    def stream(self, text, voice, **options):
+        """Async iterator of audio chunks for the text."""
+        raise NotImplementedError
+
+    async def warm_up(self):
+        pass
+
+    async def close(self):
+        pass
@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import os
+import httpx
+from openai import AsyncOpenAI
+from deepgram import DeepgramClient, DeepgramClientOptions, LiveTranscriptionEvents
+from config import (
+    LLM_TIMEOUT, TTS_TIMEOUT, HTTP2_ENABLED, HTTP_MAX_CONNECTIONS, HTTP_KEEPALIVE_EXPIRY,
+    DEEPGRAM_LIVE_POOL_SIZE, TTS_FALLBACK_VOICE
+)
+from audio_processing.protocol import MP3_CONTENT_TYPE
+from .base import ChatDelta, SpeechToText, ChatModel, TextToSpeech
+
+# Idle pooled live connections need a KeepAlive well inside Deepgram's 10 s timeout
+LIVE_POOL_KEEPALIVE_INTERVAL = 5
+
+
+class DeepgramLivePool:
+    """Keeps a few live transcription connections open and ready to hand out."""
+
+    def __init__(self, deepgram_client, size):
+        self.deepgram_client = deepgram_client
+        self.size = size
+        self.options = None
+        self.ready = []
+        self.maintain_task = None
+
+    async def start(self, options):
+        """Open the pool and keep it topped up in the background."""
+        self.options = options
+        await self._refill()
+        self.maintain_task = asyncio.create_task(self._maintain())
+
+    def acquire(self):
+        """Take a ready connection, or None if the pool is empty."""
+        while self.ready:
+            conn = self.ready.pop()
+            if conn.is_connected():
+                return conn
+        return None
+
+    async def _open(self):
+        conn = self.deepgram_client.listen.websocket.v("1")
+        if not await asyncio.to_thread(conn.start, self.options):
+            return None
+        return conn
+
+    async def _refill(self):
+        missing = self.size - len(self.ready)
+        if missing <= 0:
+            return
+
+        opened = await asyncio.gather(*(self._open() for _ in range(missing)), return_exceptions=True)
+        for conn in opened:
+            if isinstance(conn, Exception) or conn is None:
+                logging.warning(f"Could not pre-open Deepgram live connection: {conn}")
+                continue
+            self.ready.append(conn)
+
+    async def _maintain(self):
+        while True:
+            await asyncio.sleep(LIVE_POOL_KEEPALIVE_INTERVAL)
+            try:
+                for conn in list(self.ready):
+                    if not conn.is_connected() or not conn.keep_alive():
+                        self.ready.remove(conn)
+                await self._refill()
+            except Exception as e:
+                logging.error(f"Error maintaining Deepgram live pool: {e}")
+
+    async def close(self):
+        if self.maintain_task:
+            self.maintain_task.cancel()
+            self.maintain_task = None
+        for conn in self.ready:
+            try:
+                await asyncio.to_thread(conn.finish)
+            except Exception as e:
+                logging.error(f"Error closing pooled Deepgram connection: {e}")
+        self.ready = []
+
+
+class DeepgramSpeechToText(SpeechToText):
+    """Deepgram live transcription, optionally from a pool of pre-opened connections."""
+
+    name = "deepgram"
+
+    def __init__(self, deepgram_client, pool_size=0):
+        self.deepgram_client = deepgram_client
+        self.pool_size = pool_size
+        self.live_pool = None
+
+    def acquire(self, container_audio=True):
+        # Pooled connections were opened for containerized audio, so raw PCM sessions open their own
+        if self.live_pool and container_audio:
+            return self.live_pool.acquire()
+        return None
+
+    def connection(self):
+        return self.deepgram_client.listen.websocket.v("1")
+
+    def subscribe(self, conn, event, handler):
+        conn.on(LiveTranscriptionEvents(event), handler)
+
+    async def start(self, live_options=None):
+        if self.pool_size > 0 and live_options is not None:
+            self.live_pool = DeepgramLivePool(self.deepgram_client, self.pool_size)
+            await self.live_pool.start(live_options)
+
+    def status(self):
+        return {"live_pool_ready": len(self.live_pool.ready) if self.live_pool else None}
+
+    async def close(self):
+        if self.live_pool:
+            await self.live_pool.close()
+            self.live_pool = None
+
+
+class OpenAIChat(ChatModel):
+    """OpenAI chat completions over the shared keep-alive HTTP pool."""
+
+    name = "openai"
+
+    def __init__(self, client):
+        self.client = client
+
+    async def stream(self, model, messages, max_tokens):
+        stream = await self.client.chat.completions.create(
+            model=model,
+            max_tokens=max_tokens,
+            stream=True,
+            stream_options={"include_usage": True},
+            messages=messages
+        )
+        try:
+            async for chunk in stream:
+                usage = (chunk.usage.prompt_tokens, chunk.usage.completion_tokens) if chunk.usage else None
+                if not chunk.choices:
+                    yield ChatDelta(usage=usage)
+                    continue
+                choice = chunk.choices[0]
+                yield ChatDelta(choice.delta.content or "", choice.finish_reason, usage)
+        finally:
+            # Releases the connection when a hedge loses or the reply is interrupted
+            await stream.close()
+
+    async def complete(self, model, messages, max_tokens=None):
+        options = {"max_tokens": max_tokens} if max_tokens else {}
+        completion = await self.client.chat.completions.create(model=model, messages=messages, **options)
+        return completion.choices[0].message.content
+
+    async def warm_up(self):
+        await self.client.with_options(max_retries=0).models.list()
+
+    async def close(self):
+        # Also closes the HTTP pool it was given
+        await self.client.close()
+
+
+class DeepgramTextToSpeech(TextToSpeech):
+    """Deepgram TTS over a shared keep-alive HTTP pool instead of a client per request."""
+
+    name = "deepgram"
+    content_type = MP3_CONTENT_TYPE
+    default_voice = "aura-2-thalia-en"
+    fallback_voice = TTS_FALLBACK_VOICE
+
+    def __init__(self, http, api_key, base_url):
+        self.http = http
+        self.api_key = api_key
+        self.base_url = base_url
+
+    async def stream(self, text, voice, **options):
+        """Yield audio chunks for the text as Deepgram streams them back."""
+        params = {"model": voice, **options}
+        async with self.http.stream(
+            "POST",
+            f"{self.base_url}/v1/speak",
+            params=params,
+            json={"text": text},
+            headers={"Authorization": f"Token {self.api_key}"}
+        ) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes():
+                yield chunk
+
+    async def warm_up(self):
+        """Open a pooled connection so the first sentence skips the TLS handshake."""
+        await self.http.head(self.base_url)
+
+    async def close(self):
+        await self.http.aclose()
+
+
+def _http_pool(timeout):
+    return httpx.AsyncClient(
+        http2=HTTP2_ENABLED,
+        timeout=httpx.Timeout(timeout),
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+        )
+    )
+
+
+def cloud_backends():
+    """The Deepgram and OpenAI backends as (stage, backend) pairs, each on its own keep-alive HTTP pool."""
+    openai = AsyncOpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        timeout=LLM_TIMEOUT,
+        # Retries, hedging and fallback happen in resilience.py, per model
+        max_retries=0,
+        http_client=_http_pool(LLM_TIMEOUT)
+    )
+
+    deepgram_host = os.getenv("DEEPGRAM_HOST", "api.deepgram.com")
+    deepgram_options = DeepgramClientOptions(url=deepgram_host)
+    deepgram = DeepgramClient(os.getenv("DEEPGRAM_API_KEY", ""), deepgram_options)
+
+    return [
+        ("stt", DeepgramSpeechToText(deepgram, DEEPGRAM_LIVE_POOL_SIZE)),
+        ("llm", OpenAIChat(openai)),
+        ("tts", DeepgramTextToSpeech(_http_pool(TTS_TIMEOUT), deepgram.api_key, deepgram_options.url)),
+    ]
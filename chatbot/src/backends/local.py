@@ -0,0 +1,418 @@
+import array
+import asyncio
+import io
+import json
+import logging
+import os
+import queue
+import re
+import shutil
+import struct
+import subprocess
+import sys
+import threading
+import wave
+from config import (
+    LOCAL_STT_MODEL_PATH, LOCAL_LLM_MODEL_PATH, LOCAL_LLM_THREADS, LOCAL_LLM_CONTEXT,
+    LOCAL_TTS_VOICE, LOCAL_TTS_RATE
+)
+from audio_processing.protocol import WAV_CONTENT_TYPE
+from .base import LiveEvents, ChatDelta, SpeechToText, ChatModel, TextToSpeech
+
+try:
+    import vosk
+except ImportError:
+    vosk = None
+
+try:
+    import llama_cpp
+except ImportError:
+    llama_cpp = None
+
+try:
+    import audioop  # C implementation of resampling, removed from the standard library in Python 3.13
+except ImportError:
+    audioop = None
+
+# Vosk recognizes 16-bit mono PCM; container audio is decoded to this rate by ffmpeg
+RECOGNIZER_SAMPLE_RATE = 16000
+DECODER_READ_BYTES = 4000
+SAMPLE_WIDTH = 2
+# Vosk transcripts are unpunctuated, finals get a question mark when they open like a question
+QUESTION_OPENER = re.compile(
+    r"^(who|what|when|where|why|how|which|is|are|do|does|did|can|could|will|would|should|have|has)\b"
+)
+
+
+class LocalEvent:
+    """A live transcription event with the attributes and to_dict() of the Deepgram SDK's responses."""
+
+    def __init__(self, payload):
+        self.payload = payload
+        for key, value in payload.items():
+            setattr(self, key, _attribute(value))
+
+    def to_dict(self):
+        return self.payload
+
+
+def _attribute(value):
+    if isinstance(value, dict):
+        return LocalEvent(value)
+    if isinstance(value, list):
+        return [_attribute(item) for item in value]
+    return value
+
+
+def _transcript_result(transcript, start, duration, is_final):
+    return LocalEvent({
+        "type": "Results",
+        "channel_index": [0, 1],
+        "duration": round(duration, 3),
+        "start": round(start, 3),
+        "is_final": is_final,
+        "speech_final": is_final,
+        "channel": {"alternatives": [{"transcript": transcript, "confidence": 1.0, "words": []}]},
+    })
+
+
+def _punctuate(text):
+    """Capitalize and end a final transcript like Deepgram's smart formatting would."""
+    text = text.strip()
+    if not text:
+        return text
+    ending = "?" if QUESTION_OPENER.match(text) else "."
+    return text[0].upper() + text[1:] + ending
+
+
+class VoskLiveConnection:
+    """A live transcription connection to an in-process Vosk recognizer, running on its own threads.
+
+    Raw linear16 audio goes straight to the recognizer; containerized audio such as webm/opus is
+    decoded through an ffmpeg subprocess first.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.handlers = {}
+        self.audio = queue.Queue()
+        self.decoder = None
+        self.recognizer = None
+        self.sample_rate = RECOGNIZER_SAMPLE_RATE
+        self.connected = False
+        # Seconds of audio recognized so far, and where the current utterance began
+        self.position = 0.0
+        self.utterance_start = None
+        self.last_partial = ""
+
+    def on(self, event, handler):
+        self.handlers.setdefault(event, []).append(handler)
+
+    def _emit(self, event, **payload):
+        for handler in self.handlers.get(event, []):
+            try:
+                handler(self, **payload)
+            except Exception as e:
+                logging.error(f"Error in local transcription handler: {e}")
+
+    def start(self, options):
+        encoding = options.get("encoding")
+        if encoding:
+            self.sample_rate = options.get("sample_rate") or RECOGNIZER_SAMPLE_RATE
+        try:
+            self.recognizer = vosk.KaldiRecognizer(self.engine.load(), self.sample_rate)
+            if not encoding:
+                self.decoder = subprocess.Popen(
+                    ["ffmpeg", "-loglevel", "error", "-i", "pipe:0", "-f", "s16le", "-ac", "1",
+                     "-ar", str(RECOGNIZER_SAMPLE_RATE), "pipe:1"],
+                    stdin=subprocess.PIPE, stdout=subprocess.PIPE
+                )
+        except Exception as e:
+            logging.error(f"Could not start local transcription: {e}")
+            return False
+
+        self.connected = True
+        if self.decoder:
+            threading.Thread(target=self._feed_decoder, daemon=True).start()
+            read = lambda: self.decoder.stdout.read(DECODER_READ_BYTES) or None
+        else:
+            read = self.audio.get
+        threading.Thread(target=self._recognize, args=(read,), daemon=True).start()
+        return True
+
+    def send(self, audio_data):
+        if not self.connected:
+            return False
+        self.audio.put(audio_data)
+        return True
+
+    def keep_alive(self):
+        return self.connected
+
+    def is_connected(self):
+        return self.connected
+
+    def finish(self):
+        self.connected = False
+        self.audio.put(None)
+        return True
+
+    def _feed_decoder(self):
+        try:
+            while (chunk := self.audio.get()) is not None:
+                self.decoder.stdin.write(chunk)
+                self.decoder.stdin.flush()
+        except (BrokenPipeError, ValueError) as e:
+            logging.debug(f"Audio decoder closed: {e}")
+        finally:
+            try:
+                self.decoder.stdin.close()
+            except OSError:
+                pass
+
+    def _recognize(self, read):
+        try:
+            while (pcm := read()) is not None:
+                self._accept(pcm)
+            self._final(json.loads(self.recognizer.FinalResult()).get("text", ""))
+        except Exception as e:
+            logging.error(f"Local transcription failed: {e}")
+        finally:
+            self.connected = False
+            if self.decoder:
+                self.decoder.kill()
+                self.decoder.wait()
+            self._emit(LiveEvents.Close, close=LocalEvent({"type": "Close"}))
+
+    def _accept(self, pcm):
+        self.position += len(pcm) / (SAMPLE_WIDTH * self.sample_rate)
+        if self.recognizer.AcceptWaveform(pcm):
+            self._final(json.loads(self.recognizer.Result()).get("text", ""))
+            return
+
+        partial = json.loads(self.recognizer.PartialResult()).get("partial", "")
+        if not partial or partial == self.last_partial:
+            return
+        if not self.last_partial:
+            self.utterance_start = self.position
+            self._emit(LiveEvents.SpeechStarted, speech_started=LocalEvent({
+                "type": "SpeechStarted", "channel": [0], "timestamp": round(self.position, 3)
+            }))
+        self.last_partial = partial
+        self._emit(LiveEvents.Transcript, result=_transcript_result(
+            partial, self.utterance_start, self.position - self.utterance_start, False
+        ))
+
+    def _final(self, text):
+        start = self.utterance_start if self.utterance_start is not None else self.position
+        self.last_partial = ""
+        self.utterance_start = None
+        if not text:
+            return
+        self._emit(LiveEvents.Transcript, result=_transcript_result(
+            _punctuate(text), start, self.position - start, True
+        ))
+        self._emit(LiveEvents.UtteranceEnd, utterance_end=LocalEvent({
+            "type": "UtteranceEnd", "channel": [0, 1], "last_word_end": round(self.position, 3)
+        }))
+
+
+class VoskSpeechToText(SpeechToText):
+    """Offline recognition with a small Vosk model, loaded once per worker."""
+
+    name = "vosk"
+    local = True
+
+    def __init__(self, model_path=LOCAL_STT_MODEL_PATH):
+        self.model_path = model_path
+        self.model = None
+        self.load_lock = threading.Lock()
+
+    def available(self):
+        return vosk is not None and os.path.isdir(self.model_path)
+
+    def load(self):
+        with self.load_lock:
+            if self.model is None:
+                vosk.SetLogLevel(-1)
+                self.model = vosk.Model(self.model_path)
+            return self.model
+
+    def connection(self):
+        return VoskLiveConnection(self)
+
+    async def start(self, live_options=None):
+        await asyncio.to_thread(self.load)
+
+
+class LlamaCppChat(ChatModel):
+    """A small GGUF chat model run on the CPU by llama.cpp, whatever model the turn was routed to."""
+
+    name = "llama_cpp"
+    local = True
+
+    def __init__(self, model_path=LOCAL_LLM_MODEL_PATH, threads=LOCAL_LLM_THREADS, context=LOCAL_LLM_CONTEXT):
+        self.model_path = model_path
+        self.threads = threads
+        self.context = context
+        self.model = os.path.splitext(os.path.basename(model_path))[0] or "local"
+        self.llama = None
+        self.load_lock = threading.Lock()
+        # llama.cpp runs one generation at a time per loaded model
+        self.generation_lock = asyncio.Lock()
+
+    def available(self):
+        return llama_cpp is not None and os.path.isfile(self.model_path)
+
+    def model_for(self, requested):
+        return self.model
+
+    def _load(self):
+        with self.load_lock:
+            if self.llama is None:
+                self.llama = llama_cpp.Llama(
+                    model_path=self.model_path, n_ctx=self.context, n_threads=self.threads, verbose=False
+                )
+            return self.llama
+
+    async def stream(self, model, messages, max_tokens):
+        async with self.generation_lock:
+            loop = asyncio.get_running_loop()
+            deltas = asyncio.Queue()
+            stop = threading.Event()
+
+            def generate():
+                try:
+                    chunks = self._load().create_chat_completion(
+                        messages=messages, max_tokens=max_tokens, stream=True
+                    )
+                    for chunk in chunks:
+                        if stop.is_set():
+                            break
+                        choice = chunk["choices"][0]
+                        delta = ChatDelta(choice["delta"].get("content") or "", choice.get("finish_reason"))
+                        loop.call_soon_threadsafe(deltas.put_nowait, delta)
+                except Exception as e:
+                    loop.call_soon_threadsafe(deltas.put_nowait, e)
+                finally:
+                    loop.call_soon_threadsafe(deltas.put_nowait, None)
+
+            worker = asyncio.ensure_future(asyncio.to_thread(generate))
+            try:
+                while (delta := await deltas.get()) is not None:
+                    if isinstance(delta, Exception):
+                        raise delta
+                    yield delta
+            finally:
+                # The model must be idle again before the next generation takes the lock
+                stop.set()
+                await asyncio.gather(worker, return_exceptions=True)
+
+    async def complete(self, model, messages, max_tokens=None):
+        async with self.generation_lock:
+            completion = await asyncio.to_thread(
+                lambda: self._load().create_chat_completion(messages=messages, max_tokens=max_tokens)
+            )
+        return completion["choices"][0]["message"]["content"]
+
+    async def warm_up(self):
+        await asyncio.to_thread(self._load)
+
+
+def _read_wav(data):
+    """PCM samples and sample rate from a 16-bit mono WAV, tolerating espeak's unset streaming sizes."""
+    if data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        raise ValueError("Not a WAV stream")
+    sample_rate = None
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_id, size = struct.unpack_from("<4sI", data, offset)
+        offset += 8
+        if chunk_id == b"fmt ":
+            sample_rate = struct.unpack_from("<I", data, offset + 4)[0]
+        elif chunk_id == b"data":
+            pcm = data[offset:offset + size]
+            return pcm[:len(pcm) - len(pcm) % SAMPLE_WIDTH], sample_rate
+        offset += size + size % 2
+    raise ValueError("WAV stream has no audio")
+
+
+def _wav(pcm, sample_rate):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(SAMPLE_WIDTH)
+        out.setframerate(sample_rate)
+        out.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def resample(pcm, from_rate, to_rate):
+    """Resample little-endian 16-bit mono PCM by linear interpolation."""
+    if from_rate == to_rate or not pcm:
+        return pcm
+    if audioop:
+        return audioop.ratecv(pcm, SAMPLE_WIDTH, 1, from_rate, to_rate, None)[0]
+    samples = array.array("h", pcm)
+    if sys.byteorder == "big":
+        samples.byteswap()
+    count = len(samples) * to_rate // from_rate
+    step = from_rate / to_rate
+    out = array.array("h", bytes(SAMPLE_WIDTH * count))
+    for i in range(count):
+        position = i * step
+        left = int(position)
+        right = min(left + 1, len(samples) - 1)
+        out[i] = int(samples[left] + (samples[right] - samples[left]) * (position - left))
+    if sys.byteorder == "big":
+        out.byteswap()
+    return out.tobytes()
+
+
+class EspeakTextToSpeech(TextToSpeech):
+    """Offline formant synthesis with espeak-ng: robotic, but well under 100 ms a sentence on one core."""
+
+    name = "espeak"
+    content_type = WAV_CONTENT_TYPE
+    local = True
+
+    def __init__(self, voice=LOCAL_TTS_VOICE, rate=LOCAL_TTS_RATE):
+        self.default_voice = voice
+        self.rate = rate
+        self.binary = shutil.which("espeak-ng") or shutil.which("espeak")
+
+    def available(self):
+        return self.binary is not None
+
+    def supports(self, options):
+        # WAV per sentence or raw linear16; there is no Opus encoder in-process
+        return options.get("encoding", "linear16") == "linear16" and options.get("container", "none") == "none"
+
+    async def stream(self, text, voice, **options):
+        process = await asyncio.create_subprocess_exec(
+            self.binary, "--stdout", "--stdin", "-v", voice, "-s", str(self.rate),
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+        )
+        try:
+            output, _ = await process.communicate(text.encode("utf-8"))
+        finally:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+        if process.returncode:
+            raise RuntimeError(f"{os.path.basename(self.binary)} exited with {process.returncode}")
+
+        pcm, sample_rate = _read_wav(output)
+        if options.get("encoding") == "linear16":
+            yield resample(pcm, sample_rate, options.get("sample_rate", sample_rate))
+        else:
+            yield _wav(pcm, sample_rate)
+
+    async def warm_up(self):
+        async for _ in self.stream("Hi.", self.default_voice):
+            pass
+
+
+def local_backends():
+    """The local engines as (stage, backend) pairs; models load on first use or warm-up."""
+    return [("stt", VoskSpeechToText()), ("llm", LlamaCppChat()), ("tts", EspeakTextToSpeech())]
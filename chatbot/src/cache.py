@@ -0,0 +1,91 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from metrics import CACHE_REQUESTS
+
+
+def normalize_text(text):
+    """Collapse whitespace so trivially different strings share a cache entry."""
+    return " ".join(text.split())
+
+
+def normalize_prompt(text):
+    """Lowercase and strip punctuation so short prompts like "Hi!" and "hi" match."""
+    return " ".join(re.sub(r"[^\w\s']", " ", text.lower()).split())
+
+
+class ResponseCache:
+    """Bounded LRU cache with a TTL and an optional on-disk tier for byte values."""
+
+    def __init__(self, name, max_entries, ttl, disk_dir=None):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.disk_dir = os.path.join(disk_dir, name) if disk_dir else None
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def _disk_path(self, key):
+        digest = hashlib.sha256(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.disk_dir, f"{digest}.bin")
+
+    async def get(self, key):
+        """Return the cached value, or None on a miss or an expired entry."""
+        entry = self.entries.get(key)
+        if entry and entry[0] > time.time():
+            self.entries.move_to_end(key)
+            CACHE_REQUESTS.inc(cache=self.name, result="hit")
+            return entry[1]
+        if entry:
+            del self.entries[key]
+
+        if self.disk_dir:
+            value = await asyncio.to_thread(self._read_disk, key)
+            if value is not None:
+                self._store(key, value)
+                CACHE_REQUESTS.inc(cache=self.name, result="disk_hit")
+                return value
+
+        CACHE_REQUESTS.inc(cache=self.name, result="miss")
+        return None
+
+    async def set(self, key, value):
+        """Store a value in memory and, when enabled, on disk."""
+        self._store(key, value)
+        if self.disk_dir:
+            await asyncio.to_thread(self._write_disk, key, value)
+
+    def _store(self, key, value):
+        self.entries[key] = (time.time() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _read_disk(self, key):
+        path = self._disk_path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                os.unlink(path)
+                return None
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logging.warning(f"Could not read {self.name} cache entry: {e}")
+            return None
+
+    def _write_disk(self, key, value):
+        path = self._disk_path(key)
+        try:
+            # Write then rename so a crash never leaves a truncated entry behind
+            with open(f"{path}.tmp", "wb") as f:
+                f.write(value)
+            os.replace(f"{path}.tmp", path)
+        except OSError as e:
+            logging.warning(f"Could not write {self.name} cache entry: {e}")
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import time
+from config import (
+    STT_BACKEND, LLM_BACKEND, TTS_BACKEND, SESSION_BACKEND_OVERRIDES, LOCAL_FALLBACK, UPSTREAM_WARM_UP
+)
+from metrics import STARTUP_SECONDS
+
+STAGES = ("stt", "llm", "tts")
+
+
+class SessionBackends:
+    """The STT, LLM and TTS backends one session uses, and the local engines it may fall back on."""
+
+    def __init__(self, stt, llm, tts, fallback_llm=None, fallback_tts=None):
+        self.stt = stt
+        self.llm = llm
+        self.tts = tts
+        self.fallback_llm = fallback_llm
+        self.fallback_tts = fallback_tts
+
+    def names(self):
+        return {"stt": self.stt.name, "llm": self.llm.name, "tts": self.tts.name}
+
+
+class UpstreamClients:
+    """Worker-wide STT, LLM and TTS backends, created on startup and closed on shutdown."""
+
+    def __init__(self):
+        # Installed backends for each stage, by name
+        self.backends = {stage: {} for stage in STAGES}
+        self.default = None
+        self.started = False
+        # Whether each backend answered the warm-up request, reported by /ready
+        self.warm = {}
+
+    @property
+    def llm(self):
+        return self.backends["llm"]
+
+    @property
+    def tts(self):
+        return self.backends["tts"]
+
+    def _register(self, stage, backend):
+        if backend.available():
+            self.backends[stage][backend.name] = backend
+
+    async def start(self, live_options=None):
+        """Build the backends, pre-warm the ones in use and open the live transcription pool."""
+        started_at = time.perf_counter()
+        # The provider SDKs are imported here, in the app's lifespan, so importing the app stays fast
+        from backends.cloud import cloud_backends
+        from backends.local import local_backends
+        for stage, backend in cloud_backends() + local_backends():
+            self._register(stage, backend)
+        STARTUP_SECONDS.observe(time.perf_counter() - started_at, phase="providers")
+
+        started_at = time.perf_counter()
+        self.default = self._select({"stt": STT_BACKEND, "llm": LLM_BACKEND, "tts": TTS_BACKEND})
+        if UPSTREAM_WARM_UP:
+            await self.warm_up()
+        await self.default.stt.start(live_options)
+        STARTUP_SECONDS.observe(time.perf_counter() - started_at, phase="warm_up")
+        self.started = True
+
+    def _select(self, names):
+        missing = [f"{stage}={names[stage]}" for stage in STAGES if names[stage] not in self.backends[stage]]
+        if missing:
+            raise ValueError(f"Backends not installed or not configured: {', '.join(missing)}")
+        stt, llm, tts = (self.backends[stage][names[stage]] for stage in STAGES)
+        return SessionBackends(stt, llm, tts, self._local_fallback("llm", llm), self._local_fallback("tts", tts))
+
+    def _local_fallback(self, stage, backend):
+        if not LOCAL_FALLBACK or backend.local:
+            return None
+        return next((other for other in self.backends[stage].values() if other.local), None)
+
+    def session_backends(self, query_params=None):
+        """The deployment's backends, or those a session asked for when SESSION_BACKEND_OVERRIDES is on."""
+        if not SESSION_BACKEND_OVERRIDES or not query_params:
+            return self.default
+        names = {stage: query_params.get(stage) or name for stage, name in self.default.names().items()}
+        try:
+            return self._select(names)
+        except ValueError as e:
+            logging.warning(f"Ignoring requested backends: {e}")
+            return self.default
+
+    async def warm_up(self):
+        """Establish connections to, or load the models of, the backends in use ahead of the first turn."""
+        backends = {
+            f"{stage}:{backend.name}": backend
+            for stage, backend in (
+                ("llm", self.default.llm), ("tts", self.default.tts),
+                ("llm", self.default.fallback_llm), ("tts", self.default.fallback_tts),
+            )
+            if backend
+        }
+        results = await asyncio.gather(*(backend.warm_up() for backend in backends.values()), return_exceptions=True)
+        for name, result in zip(backends, results):
+            self.warm[name] = not isinstance(result, Exception)
+            if isinstance(result, Exception):
+                logging.warning(f"Upstream warm-up failed for {name}: {result}")
+
+    def status(self):
+        """Warm-up and pool state for the readiness check."""
+        return {
+            "started": self.started,
+            "backends": self.default.names() if self.default else None,
+            "warm": dict(self.warm),
+            "stt": self.default.stt.status() if self.default else None,
+        }
+
+    async def close(self):
+        """Close pooled connections."""
+        self.started = False
+        for backends in self.backends.values():
+            for backend in backends.values():
+                await backend.close()
+        self.backends = {stage: {} for stage in STAGES}
+
+
+upstream = UpstreamClients()
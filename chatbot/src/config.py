@@ -0,0 +1,164 @@
+from dotenv import load_dotenv
+import os
+
+load_dotenv()
+
+# Log level for the voice pipeline, set to WARNING or higher to silence per-turn logs
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+# Upstream call limits, applied per worker process
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+TTS_MAX_CONCURRENCY = int(os.getenv("TTS_MAX_CONCURRENCY", "32"))
+
+# Admission control: past MAX_SESSIONS open sessions, or MAX_UPSTREAM_CALLS LLM and TTS calls
+# running or waiting for a slot, new sessions wait in a short queue and are then turned away
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "100"))
+MAX_UPSTREAM_CALLS = int(os.getenv("MAX_UPSTREAM_CALLS", str(2 * (LLM_MAX_CONCURRENCY + TTS_MAX_CONCURRENCY))))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "20"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "5"))
+# Seconds a rejected client is told to wait before trying again
+ADMISSION_RETRY_AFTER = float(os.getenv("ADMISSION_RETRY_AFTER", "10"))
+
+# Production serving: worker processes, and how long a worker keeps its open sessions after
+# SIGTERM. Keep DRAIN_TIMEOUT below the ECS task's stopTimeout so the drain is not cut short
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+PORT = int(os.getenv("PORT", "8000"))
+DRAIN_TIMEOUT = float(os.getenv("DRAIN_TIMEOUT", "25"))
+# While draining, a session is closed once the user has been silent this long with no reply in flight
+DRAIN_IDLE_SECONDS = float(os.getenv("DRAIN_IDLE_SECONDS", "1.5"))
+
+# Per-session outbound queue: bytes buffered for a client before audio producers wait, how long
+# a send may block before the client counts as stalled, and how old audio may get before it is skipped
+OUTBOUND_QUEUE_BYTES = int(os.getenv("OUTBOUND_QUEUE_BYTES", str(1024 * 1024)))
+OUTBOUND_SEND_TIMEOUT = float(os.getenv("OUTBOUND_SEND_TIMEOUT", "10"))
+OUTBOUND_AUDIO_MAX_AGE = float(os.getenv("OUTBOUND_AUDIO_MAX_AGE", "5"))
+
+# Shared keep-alive HTTP pools for OpenAI and TTS
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "64"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "120"))
+
+# Backend for each stage, per deployment: deepgram or vosk for recognition, openai or llama_cpp for
+# replies, deepgram or espeak for speech. vosk, llama_cpp and espeak are local CPU-only engines
+STT_BACKEND = os.getenv("STT_BACKEND", "deepgram")
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")
+TTS_BACKEND = os.getenv("TTS_BACKEND", "deepgram")
+# Let a session pick its own backends with ?stt=...&llm=...&tts=..., e.g. for benchmarks
+SESSION_BACKEND_OVERRIDES = os.getenv("SESSION_BACKEND_OVERRIDES", "false").lower() == "true"
+# Fall back to the installed local LLM and TTS engines once every cloud model or voice is failing
+LOCAL_FALLBACK = os.getenv("LOCAL_FALLBACK", "false").lower() == "true"
+# Local engines: a Vosk model directory, a GGUF chat model for llama.cpp, and an espeak-ng voice
+LOCAL_STT_MODEL_PATH = os.getenv("LOCAL_STT_MODEL_PATH", "")
+LOCAL_LLM_MODEL_PATH = os.getenv("LOCAL_LLM_MODEL_PATH", "")
+LOCAL_LLM_THREADS = int(os.getenv("LOCAL_LLM_THREADS", str(os.cpu_count() or 1)))
+LOCAL_LLM_CONTEXT = int(os.getenv("LOCAL_LLM_CONTEXT", "2048"))
+LOCAL_TTS_VOICE = os.getenv("LOCAL_TTS_VOICE", "en-us")
+# Speaking rate in words per minute
+LOCAL_TTS_RATE = int(os.getenv("LOCAL_TTS_RATE", "175"))
+
+# Open upstream connections and load local models at startup so the first turn skips that setup
+UPSTREAM_WARM_UP = os.getenv("UPSTREAM_WARM_UP", "true").lower() == "true"
+# Deepgram live connections kept open and ready for new sessions, 0 disables the pool
+DEEPGRAM_LIVE_POOL_SIZE = int(os.getenv("DEEPGRAM_LIVE_POOL_SIZE", "0"))
+
+# Dropped Deepgram live connections are re-opened with exponential backoff, and this many
+# seconds of recent audio are replayed into the new connection so no words are lost
+DEEPGRAM_RECONNECT_ATTEMPTS = int(os.getenv("DEEPGRAM_RECONNECT_ATTEMPTS", "5"))
+DEEPGRAM_RECONNECT_BASE_DELAY = float(os.getenv("DEEPGRAM_RECONNECT_BASE_DELAY", "0.1"))
+DEEPGRAM_REPLAY_SECONDS = float(os.getenv("DEEPGRAM_REPLAY_SECONDS", "5"))
+
+# Model routing: small talk goes to LLM_FAST_MODEL, long, reasoning and recall turns to LLM_LARGE_MODEL
+LLM_ROUTING_ENABLED = os.getenv("LLM_ROUTING_ENABLED", "true").lower() == "true"
+LLM_FAST_MODEL = os.getenv("LLM_FAST_MODEL", "gpt-4o-mini")
+LLM_LARGE_MODEL = os.getenv("LLM_LARGE_MODEL", "gpt-4")
+# Utterances longer than this many words always go to the large model
+LLM_ROUTE_MAX_FAST_WORDS = int(os.getenv("LLM_ROUTE_MAX_FAST_WORDS", "20"))
+# Spoken replies are capped at REPLY_MAX_WORDS, max_tokens is sized from it
+REPLY_MAX_WORDS = int(os.getenv("REPLY_MAX_WORDS", "30"))
+LLM_TOKENS_PER_WORD = float(os.getenv("LLM_TOKENS_PER_WORD", "2"))
+
+# Response caches: synthesized audio per (voice, sentence) and optional LLM replies to short prompts
+TTS_CACHE_SIZE = int(os.getenv("TTS_CACHE_SIZE", "512"))
+TTS_CACHE_TTL = float(os.getenv("TTS_CACHE_TTL", "86400"))
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "false").lower() == "true"
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "256"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "3600"))
+LLM_CACHE_MAX_WORDS = int(os.getenv("LLM_CACHE_MAX_WORDS", "6"))
+# Directory for the on-disk cache tier, empty keeps caches in memory only
+CACHE_DIR = os.getenv("CACHE_DIR", "")
+# Phrases synthesized into the TTS cache at startup, separated by "|"
+TTS_PRESEED_PHRASES = [p.strip() for p in os.getenv("TTS_PRESEED_PHRASES", "").split("|") if p.strip()]
+
+# Conversation memory: tokens of recent turns sent verbatim, older turns are summarized
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "600"))
+MEMORY_SUMMARY_MAX_WORDS = int(os.getenv("MEMORY_SUMMARY_MAX_WORDS", "120"))
+
+# Background user-profile extraction. At most PROFILE_CACHE_SIZE profiles are kept in memory,
+# least recently used first out, so keep it well above MAX_SESSIONS
+PROFILE_DB_PATH = os.getenv("PROFILE_DB_PATH", "data/profiles.sqlite3")
+PROFILE_BATCH_TURNS = int(os.getenv("PROFILE_BATCH_TURNS", "3"))
+PROFILE_WORKERS = int(os.getenv("PROFILE_WORKERS", "2"))
+PROFILE_QUEUE_SIZE = int(os.getenv("PROFILE_QUEUE_SIZE", "256"))
+PROFILE_MAX_NOTES = int(os.getenv("PROFILE_MAX_NOTES", "20"))
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "1024"))
+
+# Full duplex keeps mic audio flowing to Deepgram while the AI speaks so the user can barge in
+FULL_DUPLEX = os.getenv("FULL_DUPLEX", "false").lower() == "true"
+# Ignore barge-in this soon after the AI starts speaking, when echo is most likely
+BARGE_IN_GUARD_SECONDS = float(os.getenv("BARGE_IN_GUARD_SECONDS", "0.5"))
+# Interim transcript words needed before interrupting the AI
+BARGE_IN_MIN_WORDS = int(os.getenv("BARGE_IN_MIN_WORDS", "2"))
+# Also interrupt on Deepgram's SpeechStarted VAD event, faster but more prone to echo
+BARGE_IN_ON_SPEECH_STARTED = os.getenv("BARGE_IN_ON_SPEECH_STARTED", "false").lower() == "true"
+
+# Start the LLM on a stable interim hypothesis and keep the reply if the final transcript matches
+SPECULATIVE_RESPONSES = os.getenv("SPECULATIVE_RESPONSES", "false").lower() == "true"
+# Identical consecutive interim results needed before a hypothesis counts as stable
+SPECULATION_STABLE_INTERIMS = int(os.getenv("SPECULATION_STABLE_INTERIMS", "2"))
+
+# Directory to record /listen sessions into for offline replay, empty disables recording
+SESSION_RECORD_DIR = os.getenv("SESSION_RECORD_DIR", "")
+
+# Voice activity gating for clients that send raw linear16 audio; webm/opus is always forwarded as is
+VAD_ENABLED = os.getenv("VAD_ENABLED", "true").lower() == "true"
+# RMS level of 16-bit samples above which a frame counts as speech
+VAD_THRESHOLD = float(os.getenv("VAD_THRESHOLD", "500"))
+# Silence kept before speech so word onsets are not clipped
+VAD_PREROLL_SECONDS = float(os.getenv("VAD_PREROLL_SECONDS", "0.3"))
+# Silence still forwarded after speech, must cover Deepgram's endpointing and utterance_end_ms
+VAD_HANGOVER_SECONDS = float(os.getenv("VAD_HANGOVER_SECONDS", "1.2"))
+
+# Per-call timeouts in seconds
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "15"))
+TTS_TIMEOUT = float(os.getenv("TTS_TIMEOUT", "10"))
+
+# Hedging: a duplicate LLM or TTS call fires once the first result is later than this percentile
+# of the provider's recent latency, or the default delay until enough samples are in
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "true").lower() == "true"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.2"))
+# Calls per request at most: the original, its hedge, and a hedge of that or of a fast-failure retry
+HEDGE_MAX_ATTEMPTS = int(os.getenv("HEDGE_MAX_ATTEMPTS", "3"))
+LLM_HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", "2"))
+TTS_HEDGE_DELAY = float(os.getenv("TTS_HEDGE_DELAY", "1"))
+# A provider that gives no first token or audio byte within this long counts as failed
+LLM_FIRST_TOKEN_TIMEOUT = float(os.getenv("LLM_FIRST_TOKEN_TIMEOUT", "5"))
+TTS_FIRST_BYTE_TIMEOUT = float(os.getenv("TTS_FIRST_BYTE_TIMEOUT", "3"))
+# Circuit breakers: consecutive failures before a model or voice is skipped, and for how long
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+# Used while the primary model or voice is failing, empty disables the fallback
+LLM_FALLBACK_MODEL = os.getenv("LLM_FALLBACK_MODEL", "gpt-4o")
+TTS_FALLBACK_VOICE = os.getenv("TTS_FALLBACK_VOICE", "aura-2-andromeda-en")
+
+# How many sentences may be synthesized ahead of the one being played
+TTS_LOOKAHEAD = int(os.getenv("TTS_LOOKAHEAD", "3"))
+# Reply text is sent to TTS as a short first chunk, cut at a clause once it has this many words,
+# then as later sentences merged up to the size cap; false splits on every sentence instead
+TTS_CHUNK_PLANNER = os.getenv("TTS_CHUNK_PLANNER", "true").lower() == "true"
+TTS_FIRST_CHUNK_MIN_WORDS = int(os.getenv("TTS_FIRST_CHUNK_MIN_WORDS", "4"))
+TTS_CHUNK_MIN_CHARS = int(os.getenv("TTS_CHUNK_MIN_CHARS", "80"))
+TTS_CHUNK_MAX_CHARS = int(os.getenv("TTS_CHUNK_MAX_CHARS", "250"))
+# Playback chunk length for clients that stream linear16 output, in milliseconds
+TTS_STREAM_CHUNK_MS = int(os.getenv("TTS_STREAM_CHUNK_MS", "40"))
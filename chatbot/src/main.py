@@ -1,17 +1,34 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from routes.test import router as test_router
 from routes.audio import router as audio_router
+from routes.metrics import router as metrics_router
+from routes.health import router as health_router
+from config import LOG_LEVEL, TTS_PRESEED_PHRASES
+from clients import upstream
+from audio_processing.processor import live_options
+from audio_processing.audio import preseed_speech_cache
+from agent.profile import profiles
 import logging
 
-# logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s")
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s - %(levelname)s - %(message)s")
 
 import os
 import certifi
 
 os.environ['SSL_CERT_FILE'] = certifi.where()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    await upstream.start(live_options())
+    await preseed_speech_cache(upstream.default, TTS_PRESEED_PHRASES)
+    await profiles.start()
+    yield
+    await profiles.close()
+    await upstream.close()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -23,6 +40,8 @@ app.add_middleware(
 
 app.include_router(test_router)
 app.include_router(audio_router)
+app.include_router(metrics_router)
+app.include_router(health_router)
 
 if __name__ == "__main__":
     import uvicorn
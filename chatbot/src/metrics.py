@@ -0,0 +1,298 @@
+import logging
+import time
+from collections import deque
+
+# Observations kept per label set for quantile estimates
+SUMMARY_WINDOW = 2048
+SUMMARY_QUANTILES = (0.5, 0.95, 0.99)
+
+registry = []
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+def _quantile(sorted_values, q):
+    index = min(len(sorted_values) - 1, int(q * len(sorted_values)))
+    return sorted_values[index]
+
+
+class Metric:
+    """Base class for metrics exposed in the Prometheus text format."""
+
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Counter(Metric):
+    """Monotonically increasing count."""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        if not self.labelnames:
+            self.values[()] = 0
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self.values.get(self._key(labels), 0)
+
+
+class Gauge(Metric):
+    """Value that can go up and down."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        if not self.labelnames:
+            self.values[()] = 0
+
+    def set(self, value, **labels):
+        self.values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def get(self, **labels):
+        return self.values.get(self._key(labels), 0)
+
+
+class Summary(Metric):
+    """Latency distribution reported as p50/p95/p99 over a sliding window."""
+
+    kind = "summary"
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        if key not in self.values:
+            self.values[key] = {"window": deque(maxlen=SUMMARY_WINDOW), "sum": 0.0, "count": 0}
+        series = self.values[key]
+        series["window"].append(value)
+        series["sum"] += value
+        series["count"] += 1
+
+    def quantiles(self, **labels):
+        series = self.values.get(self._key(labels))
+        if not series or not series["window"]:
+            return {}
+        ordered = sorted(series["window"])
+        return {q: _quantile(ordered, q) for q in SUMMARY_QUANTILES}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for key, series in sorted(self.values.items()):
+            ordered = sorted(series["window"])
+            for q in SUMMARY_QUANTILES:
+                labels = _format_labels(self.labelnames, key, ("quantile", q))
+                lines.append(f"{self.name}{labels} {_quantile(ordered, q):.6f}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {series['sum']:.6f}")
+            lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+
+def render_metrics():
+    """Render every registered metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+TURN_STAGE_SECONDS = Summary(
+    "voice_turn_stage_seconds",
+    "Time from the final user transcript to each stage of the reply",
+    ["stage"]
+)
+LLM_ROUTES = Counter(
+    "voice_llm_routes_total",
+    "Replies by model route and the reason the route was picked",
+    ["route", "reason"]
+)
+LLM_FIRST_TOKEN_SECONDS = Summary(
+    "voice_llm_first_token_seconds",
+    "Time from requesting a reply to its first token, by model route",
+    ["route"]
+)
+LLM_REPLY_SECONDS = Summary(
+    "voice_llm_reply_seconds",
+    "Time to stream a complete reply, by model route",
+    ["route"]
+)
+LLM_TOKENS = Counter(
+    "voice_llm_tokens_total",
+    "Tokens used by replies, by model route and prompt or completion",
+    ["route", "kind"]
+)
+LLM_TRUNCATED = Counter(
+    "voice_llm_truncated_total",
+    "Replies cut off by max_tokens, by model route",
+    ["route"]
+)
+HEDGED_REQUESTS = Counter(
+    "voice_hedged_requests_total",
+    "Duplicate LLM and TTS calls fired past the hedge deadline, and which call won",
+    ["provider", "result"]
+)
+CIRCUIT_OPEN = Gauge(
+    "voice_circuit_open",
+    "1 while a model or voice is skipped after repeated failures",
+    ["provider"]
+)
+UPSTREAM_FAILURES = Counter(
+    "voice_upstream_failures_total",
+    "LLM and TTS calls that failed or timed out, by model or voice",
+    ["provider"]
+)
+UPSTREAM_FALLBACKS = Counter(
+    "voice_upstream_fallbacks_total",
+    "Calls sent to the fallback model or voice",
+    ["upstream"]
+)
+SPEECH_FAILURES = Counter(
+    "voice_speech_failures_total",
+    "Reply sentences sent as text only because no voice could synthesize them"
+)
+TTS_SENTENCE_SECONDS = Summary(
+    "voice_tts_sentence_seconds",
+    "Time to synthesize a single sentence"
+)
+TTS_FIRST_CHUNK_SECONDS = Summary(
+    "voice_tts_first_chunk_seconds",
+    "Time from requesting a streamed sentence to its first audio bytes"
+)
+TRANSCRIPT_HANDOFF_SECONDS = Summary(
+    "voice_transcript_handoff_seconds",
+    "Time from the Deepgram callback to the transcript handler picking it up"
+)
+CACHE_REQUESTS = Counter(
+    "voice_cache_requests_total",
+    "Cache lookups by cache name and result",
+    ["cache", "result"]
+)
+ACTIVE_SESSIONS = Gauge(
+    "voice_active_sessions",
+    "Open /listen sessions on this worker"
+)
+DEEPGRAM_RECONNECTS = Counter(
+    "voice_deepgram_reconnects_total",
+    "Attempts to re-open a dropped Deepgram live connection"
+)
+DEEPGRAM_RECONNECT_SECONDS = Summary(
+    "voice_deepgram_reconnect_seconds",
+    "Time from a Deepgram live connection dropping to the buffered audio being replayed"
+)
+TRANSCRIPT_SEAM_WORDS = Counter(
+    "voice_transcript_seam_words_total",
+    "Words dropped because a reconnected Deepgram connection transcribed replayed audio again"
+)
+ADMISSIONS = Counter(
+    "voice_admissions_total",
+    "New /listen sessions by admission outcome",
+    ["result"]
+)
+ADMISSION_WAIT_SECONDS = Summary(
+    "voice_admission_wait_seconds",
+    "Time a queued session waited before it was admitted"
+)
+UPSTREAM_CALLS = Gauge(
+    "voice_upstream_calls",
+    "LLM and TTS calls running or waiting for a concurrency slot",
+    ["kind"]
+)
+OUTBOUND_DROPPED = Counter(
+    "voice_outbound_dropped_total",
+    "Outbound audio messages skipped instead of sent to the client",
+    ["reason"]
+)
+WORKER_DRAINING = Gauge(
+    "voice_worker_draining",
+    "1 while this worker is draining sessions before shutdown"
+)
+STARTUP_SECONDS = Summary(
+    "voice_startup_seconds",
+    "Time the app lifespan spent before serving, by phase: building providers, or warming them up",
+    ["phase"]
+)
+SLOW_CLIENT_DISCONNECTS = Counter(
+    "voice_slow_client_disconnects_total",
+    "Sessions closed because the client stopped reading"
+)
+SESSION_TASKS = Gauge(
+    "voice_session_tasks",
+    "Tasks owned by open sessions on this worker"
+)
+INTERRUPTIONS = Counter(
+    "voice_interruptions_total",
+    "AI replies interrupted by the user"
+)
+INTERRUPT_LATENCY_SECONDS = Summary(
+    "voice_interrupt_latency_seconds",
+    "Time from detecting the user's voice to telling the client to stop playback"
+)
+SPECULATIONS = Counter(
+    "voice_speculations_total",
+    "Turns that started a speculative reply on an interim transcript, by whether the final transcript matched",
+    ["result"]
+)
+SPECULATION_SAVED_SECONDS = Summary(
+    "voice_speculation_saved_seconds",
+    "How much sooner a committed speculative reply had its first token, at most its time to first token"
+)
+VAD_AUDIO_BYTES = Counter(
+    "voice_vad_audio_bytes_total",
+    "Inbound linear16 audio received from clients and forwarded to Deepgram by the VAD gate",
+    ["stage"]
+)
+VAD_REDUCTION_RATIO = Summary(
+    "voice_vad_reduction_ratio",
+    "Fraction of a session's inbound audio the VAD gate kept from Deepgram"
+)
+
+
+class TurnSpans:
+    """Timing spans for one conversational turn, measured from the final transcript."""
+
+    def __init__(self, session_id, started_at=None):
+        self.session_id = session_id
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.stages = {}
+
+    def mark(self, stage):
+        """Record the first time a stage is reached in this turn."""
+        if stage in self.stages:
+            return
+        elapsed = time.perf_counter() - self.started_at
+        self.stages[stage] = elapsed
+        TURN_STAGE_SECONDS.observe(elapsed, stage=stage)
+        logging.debug(f"[{self.session_id}] {stage} +{elapsed * 1000:.0f} ms")
@@ -0,0 +1,260 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from config import (
+    HEDGE_ENABLED, HEDGE_PERCENTILE, HEDGE_MIN_SAMPLES, HEDGE_MIN_DELAY, HEDGE_MAX_ATTEMPTS,
+    CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS
+)
+from metrics import HEDGED_REQUESTS, CIRCUIT_OPEN, UPSTREAM_FAILURES, UPSTREAM_FALLBACKS
+
+# Recent first-result latencies kept per provider for the hedge deadline
+LATENCY_WINDOW = 512
+
+providers = {}
+
+
+class CircuitOpenError(Exception):
+    """Every provider for an upstream call is failing and has its circuit breaker open."""
+
+
+class LatencyTracker:
+    """Recent time to first result from one provider, to hedge calls that run past its tail."""
+
+    def __init__(self, default_delay, percentile=HEDGE_PERCENTILE, min_samples=HEDGE_MIN_SAMPLES):
+        self.default_delay = default_delay
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.samples = deque(maxlen=LATENCY_WINDOW)
+
+    def observe(self, seconds):
+        self.samples.append(seconds)
+
+    def hedge_delay(self):
+        """How long to wait for the first result before firing a duplicate call."""
+        if len(self.samples) < self.min_samples:
+            return self.default_delay
+        ordered = sorted(self.samples)
+        return max(HEDGE_MIN_DELAY, ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))])
+
+
+class CircuitBreaker:
+    """Stops calling a provider after repeated failures, letting one trial call through after a cool-down."""
+
+    def __init__(self, key, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_seconds=CIRCUIT_RESET_SECONDS):
+        self.key = key
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def allow(self):
+        if self.opened_at is None:
+            return True
+        if self.trial_running or time.monotonic() - self.opened_at < self.reset_seconds:
+            return False
+        self.trial_running = True
+        return True
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logging.info(f"Circuit for {self.key} closed")
+            CIRCUIT_OPEN.set(0, provider=self.key)
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def abandon(self):
+        """The caller gave up on a call before its first result, so it says nothing about the provider."""
+        self.trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.trial_running or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logging.warning(f"Circuit for {self.key} opened after {self.failures} failures")
+            self.opened_at = time.monotonic()
+            self.trial_running = False
+            CIRCUIT_OPEN.set(1, provider=self.key)
+
+
+class Provider:
+    """One model or voice behind an upstream, with its own breaker and latency history."""
+
+    def __init__(self, upstream, name, default_delay, first_result_timeout):
+        self.upstream = upstream
+        self.name = name
+        self.key = f"{upstream}:{name}"
+        self.first_result_timeout = first_result_timeout
+        self.breaker = CircuitBreaker(self.key)
+        self.latency = LatencyTracker(default_delay)
+
+
+def upstream_provider(upstream, name, default_delay, first_result_timeout):
+    """The shared Provider for a model or voice, created on first use."""
+    key = f"{upstream}:{name}"
+    if key not in providers:
+        providers[key] = Provider(upstream, name, default_delay, first_result_timeout)
+    return providers[key]
+
+
+async def _first(stream):
+    """The stream's first item, as (True, item), or (False, None) if it is empty."""
+    try:
+        return True, await stream.__anext__()
+    except StopAsyncIteration:
+        return False, None
+
+
+async def _discard(task, stream):
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    try:
+        await stream.aclose()
+    except Exception as e:
+        logging.debug(f"Closing a discarded upstream stream failed: {e}")
+
+
+async def hedged_stream(provider, open_stream, hedge=HEDGE_ENABLED):
+    """Yield from open_stream(provider.name), racing a duplicate call if the first result is slow.
+
+    The duplicate fires once the provider's usual time to first result has passed, or right away
+    if the first call fails before then. Either way the newest call is hedged in turn, up to
+    HEDGE_MAX_ATTEMPTS calls, so a fast failure followed by a stall is not left to the timeout.
+    Whichever produces a result first is kept.
+    """
+    started_at = time.perf_counter()
+    deadline = started_at + provider.first_result_timeout
+    hedge_at = started_at + provider.latency.hedge_delay() if hedge else None
+    attempts = {}
+    launched = 0
+    hedged = retried = False
+    winner = None
+
+    def attempt():
+        nonlocal launched
+        stream = open_stream(provider.name)
+        attempts[asyncio.ensure_future(_first(stream))] = (stream, time.perf_counter(), bool(attempts or hedged))
+        launched += 1
+
+    def next_hedge():
+        """When to hedge the newest call, or None once HEDGE_MAX_ATTEMPTS calls have been made."""
+        if launched >= HEDGE_MAX_ATTEMPTS:
+            return None
+        return time.perf_counter() + provider.latency.hedge_delay()
+
+    attempt()
+    try:
+        while winner is None:
+            now = time.perf_counter()
+            if now >= deadline:
+                raise asyncio.TimeoutError(
+                    f"{provider.key} gave no result within {provider.first_result_timeout}s"
+                )
+            wait = deadline - now if hedge_at is None else max(0, min(deadline, hedge_at) - now)
+            done, _ = await asyncio.wait(attempts, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                if hedge_at is not None and time.perf_counter() >= hedge_at:
+                    HEDGED_REQUESTS.inc(provider=provider.key, result="fired")
+                    attempt()
+                    hedged = True
+                    hedge_at = next_hedge()
+                continue
+
+            error = None
+            for task in done:
+                stream, attempt_started, is_hedge = attempts.pop(task)
+                if winner is None and task.exception() is None:
+                    winner = (task, stream)
+                    provider.latency.observe(time.perf_counter() - attempt_started)
+                    if hedged:
+                        HEDGED_REQUESTS.inc(provider=provider.key, result="hedge_won" if is_hedge else "primary_won")
+                elif task.exception() is not None:
+                    error = task.exception()
+                    await _discard(task, stream)
+                else:
+                    await _discard(task, stream)
+
+            if winner is None and not attempts:
+                if hedge_at is None or retried:
+                    raise error
+                # The call failed fast, so the hedge doubles as a retry, once
+                HEDGED_REQUESTS.inc(provider=provider.key, result="retry")
+                attempt()
+                hedged = retried = True
+                hedge_at = next_hedge()
+    finally:
+        for task, (stream, _, _) in list(attempts.items()):
+            await _discard(task, stream)
+
+    task, stream = winner
+    try:
+        has_item, item = task.result()
+        if has_item:
+            yield item
+            async for item in stream:
+                yield item
+    finally:
+        await stream.aclose()
+
+
+async def resilient_stream(upstream, candidates, open_stream, hedge=HEDGE_ENABLED, served_by=None):
+    """Stream from the first candidate provider whose breaker allows it, falling back on failure.
+
+    A provider that fails after it has started yielding is not retried, since its output may
+    already have been used. served_by, if given, records the name of the provider that answered.
+    """
+    last_error = None
+    for index, provider in enumerate(candidates):
+        if not provider.breaker.allow():
+            continue
+        if index:
+            UPSTREAM_FALLBACKS.inc(upstream=upstream)
+            logging.warning(f"Falling back to {provider.key}")
+
+        started = False
+        try:
+            async for item in hedged_stream(provider, open_stream, hedge):
+                if not started:
+                    started = True
+                    if served_by is not None:
+                        served_by["name"] = provider.name
+                yield item
+        except (asyncio.CancelledError, GeneratorExit):
+            # A caller that stops after the first result, as resilient_call does, still got an answer
+            if started:
+                provider.breaker.record_success()
+            else:
+                provider.breaker.abandon()
+            raise
+        except Exception as e:
+            provider.breaker.record_failure()
+            UPSTREAM_FAILURES.inc(provider=provider.key)
+            logging.warning(f"{provider.key} failed: {e!r}")
+            if started:
+                raise
+            last_error = e
+            continue
+
+        provider.breaker.record_success()
+        return
+
+    raise last_error or CircuitOpenError(f"No {upstream} provider available, all circuits are open")
+
+
+async def resilient_call(upstream, candidates, call, hedge=HEDGE_ENABLED):
+    """Await call(provider_name) with the same hedging, breakers and fallback as resilient_stream.
+
+    The whole call is the first result, so candidates need a first_result_timeout that covers it
+    and should not be the providers of a stream, whose breakers and latency history they would skew.
+    """
+    async def once(name):
+        yield await call(name)
+
+    stream = resilient_stream(upstream, candidates, once, hedge)
+    try:
+        async for result in stream:
+            return result
+    finally:
+        await stream.aclose()
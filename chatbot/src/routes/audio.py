@@ -1,7 +1,11 @@
 from fastapi import APIRouter, WebSocket
 from audio_processing.processor import live_text_transcription
-from audio_processing.test import test_live_transcription
+from admission import admission
 import logging
+import json
+
+# WebSocket close code telling the client to try again later
+TRY_AGAIN_LATER = 1013
 
 router = APIRouter()
 
@@ -9,9 +13,45 @@ router = APIRouter()
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
     logging.info("WebSocket connected")
-    await live_text_transcription(websocket)
+
+    if admission.draining.is_set():
+        # Another worker or task can take it straight away
+        await _turn_away(websocket, "draining", retry_after=0)
+        return
+
+    if not admission.has_headroom():
+        if not admission.can_queue():
+            await _turn_away(websocket)
+            return
+        await websocket.send_text(json.dumps({
+            "status": "queued",
+            "message": "Server busy, waiting for a free slot"
+        }))
+
+    if not await admission.admit():
+        if admission.draining.is_set():
+            await _turn_away(websocket, "draining", retry_after=0)
+        else:
+            await _turn_away(websocket, "timed_out")
+        return
+
+    try:
+        await live_text_transcription(websocket)
+    finally:
+        await admission.release()
+
+async def _turn_away(websocket, reason="rejected", retry_after=None):
+    admission.reject(reason)
+    await websocket.send_text(json.dumps({
+        "status": "busy",
+        "message": "Server shutting down" if reason == "draining" else "Server at capacity",
+        "retry_after": admission.retry_after if retry_after is None else retry_after
+    }))
+    await websocket.close(code=TRY_AGAIN_LATER)
 
 @router.get("/test-api")
 async def test_deepgram_api_key():
+    # Manual check only, kept out of the import graph workers load on startup
+    from audio_processing.test import test_live_transcription
     await test_live_transcription()
-    return {"status": "Deepgram API test completed"}
\ No newline at end of file
+    return {"status": "Deepgram API test completed"}
@@ -0,0 +1,29 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from admission import admission
+from clients import upstream
+
+router = APIRouter()
+
+@router.get("/health")
+def liveness():
+    """The worker process is up and serving requests."""
+    return {"status": "ok"}
+
+@router.get("/ready")
+def readiness():
+    """Whether this worker should be sent new sessions: warmed up, not draining, and under its limits."""
+    clients = upstream.status()
+    load = admission.status()
+    if load["draining"]:
+        status = "draining"
+    elif not clients["started"]:
+        status = "starting"
+    elif not admission.has_headroom():
+        status = "busy"
+    else:
+        status = "ready"
+    return JSONResponse(
+        {"status": status, "upstream": clients, "load": load},
+        status_code=200 if status == "ready" else 503
+    )
@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from metrics import render_metrics, SESSION_TASKS
+from audio_processing.session import session_registry
+
+router = APIRouter()
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    SESSION_TASKS.set(session_registry.task_count())
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,74 @@
+"""Production entry point: one uvicorn worker per core, each draining its sessions on SIGTERM.
+
+Usage:
+    python serve.py
+    WEB_CONCURRENCY=4 PORT=8000 python serve.py
+"""
+import asyncio
+import logging
+import time
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+from admission import admission
+from audio_processing.session import session_registry
+from config import WEB_CONCURRENCY, PORT, DRAIN_TIMEOUT, LOG_LEVEL
+
+DRAIN_POLL_SECONDS = 0.1
+
+
+class DrainingServer(uvicorn.Server):
+    """Uvicorn server that lets open conversations finish their turn before shutting down.
+
+    Uvicorn closes every WebSocket as soon as it starts shutting down, so the first SIGTERM only
+    stops admitting sessions. Each open session ends itself at its next pause, and the server
+    exits once none are left or DRAIN_TIMEOUT runs out. A second signal exits straight away.
+    """
+
+    def __init__(self, config, drain_timeout=DRAIN_TIMEOUT):
+        super().__init__(config)
+        self.drain_timeout = drain_timeout
+        self.loop = None
+        self.draining = False
+
+    async def serve(self, sockets=None):
+        self.loop = asyncio.get_running_loop()
+        await super().serve(sockets)
+
+    def handle_exit(self, sig, frame):
+        if self.loop is None or self.draining:
+            if self.should_exit:
+                self.force_exit = True
+            super().handle_exit(sig, frame)
+            return
+        self.draining = True
+        self.loop.call_soon_threadsafe(self.loop.create_task, self._drain(sig))
+
+    async def _drain(self, sig):
+        admission.start_draining()
+        deadline = time.monotonic() + self.drain_timeout
+        while session_registry.session_count() and time.monotonic() < deadline:
+            await asyncio.sleep(DRAIN_POLL_SECONDS)
+        remaining = session_registry.session_count()
+        if remaining:
+            logging.warning(f"Drain timed out after {self.drain_timeout}s with {remaining} sessions open")
+        else:
+            logging.info("Drained all sessions, shutting down")
+        super().handle_exit(sig, None)
+
+
+def main():
+    config = uvicorn.Config(
+        "main:app", host="0.0.0.0", port=PORT, workers=WEB_CONCURRENCY,
+        log_level=LOG_LEVEL.lower(), timeout_graceful_shutdown=5
+    )
+    server = DrainingServer(config)
+    if config.workers > 1:
+        # Each worker process serves the shared socket and drains on the SIGTERM the parent forwards
+        sock = config.bind_socket()
+        Multiprocess(config, target=server.run, sockets=[sock]).run()
+    else:
+        server.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import asyncio
+from admission import AdmissionController, UpstreamSlots
+from metrics import ADMISSIONS
+
+
+def controller(max_sessions=1, max_upstream_calls=10, queue_size=1, queue_timeout=1.0):
+    return AdmissionController(max_sessions, max_upstream_calls, queue_size, queue_timeout, retry_after=10)
+
+
+def test_sessions_are_admitted_while_there_is_headroom():
+    admission = controller(max_sessions=2)
+
+    async def run():
+        return [await admission.admit(), await admission.admit()]
+    assert asyncio.run(run()) == [True, True]
+    assert admission.active == 2
+    assert not admission.has_headroom()
+
+
+def test_queued_session_is_admitted_when_one_leaves():
+    admission = controller()
+    before = ADMISSIONS.get(result="queued")
+
+    async def run():
+        await admission.admit()
+        waiting = asyncio.create_task(admission.admit())
+        await asyncio.sleep(0.01)
+        assert admission.status()["queued_sessions"] == 1
+        assert not admission.can_queue()
+        await admission.release()
+        return await waiting
+    assert asyncio.run(run())
+    assert admission.active == 1
+    assert admission.waiting == 0
+    assert ADMISSIONS.get(result="queued") - before == 1
+
+
+def test_queued_session_gives_up_after_the_timeout():
+    admission = controller(queue_timeout=0.05)
+
+    async def run():
+        await admission.admit()
+        return await admission.admit()
+    assert not asyncio.run(run())
+    assert admission.active == 1
+    assert admission.waiting == 0
+
+
+def test_pending_upstream_calls_hold_back_new_sessions():
+    admission = controller(max_sessions=10, max_upstream_calls=1)
+
+    async def run():
+        async with UpstreamSlots("test", 1):
+            assert admission.status()["upstream_calls"] == 1
+            assert not admission.has_headroom()
+        return admission.has_headroom()
+    assert asyncio.run(run())
+
+
+def test_draining_turns_away_new_and_queued_sessions():
+    admission = controller()
+
+    async def run():
+        await admission.admit()
+        waiting = asyncio.create_task(admission.admit())
+        await asyncio.sleep(0.01)
+        admission.start_draining()
+        await admission.release()
+        return await waiting, await admission.admit()
+    assert asyncio.run(run()) == (False, False)
+    assert admission.status()["draining"]
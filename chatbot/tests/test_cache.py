@@ -0,0 +1,74 @@
+import asyncio
+import os
+import time
+from cache import ResponseCache, normalize_prompt, normalize_text
+from metrics import CACHE_REQUESTS
+
+
+def lookups(name, result):
+    return CACHE_REQUESTS.get(cache=name, result=result)
+
+
+def test_normalization():
+    assert normalize_text("  Hello \n there ") == "Hello there"
+    assert normalize_prompt("Hi!") == normalize_prompt("hi") == "hi"
+    assert normalize_prompt("What's up?") == "what's up"
+
+
+def test_hit_and_miss():
+    cache = ResponseCache("test-hit", max_entries=4, ttl=60)
+    asyncio.run(cache.set("a", b"1"))
+    assert asyncio.run(cache.get("a")) == b"1"
+    assert asyncio.run(cache.get("b")) is None
+    assert lookups("test-hit", "hit") == 1
+    assert lookups("test-hit", "miss") == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache("test-lru", max_entries=2, ttl=60)
+
+    async def run():
+        await cache.set("a", b"1")
+        await cache.set("b", b"2")
+        # Reading "a" makes "b" the least recently used
+        await cache.get("a")
+        await cache.set("c", b"3")
+        return [await cache.get(key) for key in ("a", "b", "c")]
+    assert asyncio.run(run()) == [b"1", None, b"3"]
+
+
+def test_expired_entry_is_a_miss(monkeypatch):
+    cache = ResponseCache("test-ttl", max_entries=4, ttl=10)
+    asyncio.run(cache.set("a", b"1"))
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 11)
+    assert asyncio.run(cache.get("a")) is None
+    assert "a" not in cache.entries
+
+
+def test_disk_tier_survives_a_new_cache(tmp_path):
+    asyncio.run(ResponseCache("test-disk", max_entries=4, ttl=60, disk_dir=str(tmp_path)).set(("m", "hi"), b"audio"))
+    # A fresh instance, as after a restart, starts with an empty memory tier
+    cache = ResponseCache("test-disk", max_entries=4, ttl=60, disk_dir=str(tmp_path))
+    assert asyncio.run(cache.get(("m", "hi"))) == b"audio"
+    assert lookups("test-disk", "disk_hit") == 1
+    # The disk hit is promoted to memory
+    assert asyncio.run(cache.get(("m", "hi"))) == b"audio"
+    assert lookups("test-disk", "hit") == 1
+
+
+def test_expired_disk_entry_is_removed(tmp_path):
+    cache = ResponseCache("test-disk-ttl", max_entries=4, ttl=10, disk_dir=str(tmp_path))
+    asyncio.run(cache.set("a", b"1"))
+    path = cache._disk_path("a")
+    old = time.time() - 11
+    os.utime(path, (old, old))
+    cache.entries.clear()
+    assert asyncio.run(cache.get("a")) is None
+    assert not os.path.exists(path)
+
+
+def test_disk_write_leaves_no_temp_file(tmp_path):
+    cache = ResponseCache("test-disk-write", max_entries=4, ttl=60, disk_dir=str(tmp_path))
+    asyncio.run(cache.set("a", b"1"))
+    assert os.listdir(cache.disk_dir) == [os.path.basename(cache._disk_path("a"))]
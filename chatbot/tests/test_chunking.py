@@ -0,0 +1,67 @@
+import pytest
+from audio_processing.chunking import ChunkPlanner, plan_chunks, sentence_end
+
+
+def first_sentence(text):
+    end = sentence_end(text)
+    return text[:end] if end is not None else None
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Hello there. How", "Hello there. "),
+    ("Really?! Yes", "Really?! "),
+    ('She said "hi." Then', 'She said "hi." '),
+    ("Dr. Patel is here. She", "Dr. Patel is here. "),
+    ("J. R. R. Tolkien wrote it. Then", "J. R. R. Tolkien wrote it. "),
+    ("It is at 9 a.m. tomorrow. Then", "It is at 9 a.m. tomorrow. "),
+    ("Open until 5 p.m. Then", "Open until 5 p.m. "),
+    ("Hmm... let me think. Okay", "Hmm... let me think. "),
+    ("Hmm... Okay", "Hmm... "),
+    ("It's 3.5 miles. Then", "It's 3.5 miles. "),
+])
+def test_sentence_end(text, expected):
+    assert first_sentence(text) == expected
+
+
+def test_sentence_end_waits_for_the_next_word():
+    assert sentence_end("Hello there.") is None
+    assert sentence_end("Hello there. how") is None
+
+
+def test_conjunction_inside_a_clause_is_not_cut():
+    assert plan_chunks("That sounds great, I love you so much. Tell me more about your day.") == [
+        "That sounds great, I love you so much.", "Tell me more about your day.",
+    ]
+
+
+def test_first_chunk_is_cut_at_a_clause():
+    assert plan_chunks("I went to the store and bought some bread.") == [
+        "I went to the store", "and bought some bread.",
+    ]
+    assert plan_chunks("I was really tired today, so I took a nap.") == [
+        "I was really tired today,", "so I took a nap.",
+    ]
+
+
+def test_short_clause_waits_for_the_sentence():
+    assert plan_chunks("Oh, that sounds lovely. It is.") == ["Oh, that sounds lovely.", "It is."]
+
+
+def test_later_sentences_are_merged_up_to_the_limits():
+    text = ("Sure. I can help with that. First we look at the list. Then we pick one. "
+            "After that we plan the week ahead together.")
+    assert plan_chunks(text, min_chars=30, max_chars=60) == [
+        "Sure.",
+        "I can help with that. First we look at the list.",
+        "Then we pick one.",
+        "After that we plan the week ahead together.",
+    ]
+
+
+def test_streamed_tokens_match_the_whole_reply():
+    text = "Oh no, a flat tire is the worst. Did you manage to get it fixed? I hope you were not stuck for long."
+    planner = ChunkPlanner()
+    chunks = []
+    for i in range(0, len(text), 3):
+        chunks += planner.feed(text[i:i + 3])
+    assert chunks + planner.flush() == plan_chunks(text)
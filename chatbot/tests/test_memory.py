@@ -0,0 +1,108 @@
+import asyncio
+import pytest
+from agent import memory as memory_module
+from agent.memory import ConversationMemory, estimate_tokens
+
+
+class StubSummarizer:
+    """Stands in for response_generator, answering each summary request in turn or failing."""
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.prompts = []
+
+    async def __call__(self, prompt):
+        self.prompts.append(prompt)
+        await asyncio.sleep(0)
+        answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+@pytest.fixture
+def summarizer(monkeypatch):
+    def install(*answers):
+        stub = StubSummarizer(*answers)
+        monkeypatch.setattr(memory_module, "response_generator", stub)
+        return stub
+    return install
+
+
+def recent_tokens(memory):
+    return sum(estimate_tokens(turn["content"]) for turn in memory.recent_turns)
+
+
+def test_recent_turns_stay_within_the_token_budget():
+    memory = ConversationMemory(token_budget=30)
+    for i in range(10):
+        memory.add_turn(f"user message number {i}", f"assistant reply number {i}")
+        assert recent_tokens(memory) <= 30
+
+    assert memory.recent_turns[-1] == {"role": "assistant", "content": "assistant reply number 9"}
+    # Evicted turns wait for the summary oldest first, and nothing is lost between the two lists
+    assert memory.unsummarized_turns[0] == {"role": "user", "content": "user message number 0"}
+    assert len(memory.unsummarized_turns) + len(memory.recent_turns) == 20
+
+
+def test_older_turns_fold_into_the_summary(summarizer):
+    stub = summarizer("They talked about the weather.")
+    memory = ConversationMemory(token_budget=10)
+    memory.add_turn("It is raining again today.", "Oh no, stay dry out there!")
+    memory.add_turn("Thanks, I will take an umbrella.", None)
+
+    asyncio.run(memory.summarize())
+    assert memory.summary == "They talked about the weather."
+    assert not memory.unsummarized_turns
+    assert "user: It is raining again today." in stub.prompts[0]
+    assert "assistant: Oh no, stay dry out there!" in stub.prompts[0]
+    assert "Summary of the conversation so far: They talked about the weather." in (
+        memory.build_messages("Hello")[0]["content"]
+    )
+
+
+def test_rolling_summary_replaces_the_previous_one(summarizer):
+    stub = summarizer("First summary.", "Second summary.")
+    memory = ConversationMemory(token_budget=5)
+    memory.add_turn("I adopted a puppy last week.", "Congratulations!")
+    asyncio.run(memory.summarize())
+    memory.add_turn("She chewed my shoes.", "Puppies do that.")
+    asyncio.run(memory.summarize())
+
+    assert memory.summary == "Second summary."
+    assert "Existing summary: First summary." in stub.prompts[1]
+    assert "I adopted a puppy" not in stub.prompts[1]
+    assert "She chewed my shoes." in stub.prompts[1]
+
+
+def test_failed_summary_keeps_the_turns_for_the_next_attempt(summarizer):
+    stub = summarizer(ConnectionError("down"), "Both turns summarized.")
+    memory = ConversationMemory(token_budget=5)
+    memory.add_turn("My sister is visiting.", None)
+    asyncio.run(memory.summarize())
+
+    assert memory.summary == ""
+    assert memory.unsummarized_turns == [{"role": "user", "content": "My sister is visiting."}]
+
+    memory.add_turn("We are going hiking.", None)
+    asyncio.run(memory.summarize())
+    assert memory.summary == "Both turns summarized."
+    assert stub.prompts[1].index("My sister is visiting.") < stub.prompts[1].index("We are going hiking.")
+
+
+def test_one_summary_runs_at_a_time(summarizer):
+    summarizer("Summary.")
+    memory = ConversationMemory(token_budget=5)
+
+    async def schedule_twice():
+        memory.add_turn("First long enough message.", None)
+        first = memory.schedule_summary()
+        await asyncio.sleep(0)
+        memory.add_turn("Second long enough message.", None)
+        assert memory.schedule_summary() is first
+        await first
+
+    asyncio.run(schedule_twice())
+    assert memory.summary == "Summary."
+    # Turns evicted while the summary ran wait for the next one
+    assert memory.unsummarized_turns == [{"role": "user", "content": "Second long enough message."}]
@@ -0,0 +1,160 @@
+import asyncio
+import pytest
+from starlette.websockets import WebSocketDisconnect
+from audio_processing import outbound
+from audio_processing.outbound import OutboundQueue, SLOW_CLIENT_CLOSE_CODE
+from metrics import OUTBOUND_DROPPED, SLOW_CLIENT_DISCONNECTS
+
+
+class FakeSocket:
+    def __init__(self, blocked=False, error=None):
+        self.sent = []
+        self.close_code = None
+        self.blocked = blocked
+        self.error = error
+
+    async def send_text(self, text):
+        await self._send(text)
+
+    async def send_bytes(self, data):
+        await self._send(data)
+
+    async def _send(self, payload):
+        if self.error:
+            raise self.error
+        if self.blocked:
+            await asyncio.Event().wait()
+        self.sent.append(payload)
+
+    async def close(self, code):
+        self.close_code = code
+
+    async def receive(self):
+        await asyncio.Event().wait()
+
+
+def test_messages_are_sent_in_order_then_closed():
+    socket = FakeSocket()
+
+    async def run():
+        queue = OutboundQueue(socket, "test")
+        await queue.send_text("start")
+        await queue.send_bytes(b"audio")
+        await queue.send_text("done")
+        queue.end(1000)
+        await queue.run()
+    asyncio.run(run())
+    assert socket.sent == ["start", b"audio", "done"]
+    assert socket.close_code == 1000
+
+
+def test_stale_audio_is_skipped(monkeypatch):
+    socket = FakeSocket()
+    now = [100.0]
+    monkeypatch.setattr(outbound.time, "monotonic", lambda: now[0])
+    before = OUTBOUND_DROPPED.get(reason="stale")
+
+    async def run():
+        queue = OutboundQueue(socket, "test", audio_max_age=5)
+        await queue.send_bytes(b"old")
+        await queue.send_text("transcript")
+        # The client fell behind for longer than the audio is worth playing
+        now[0] += 6
+        queue.end(1000)
+        await queue.run()
+    asyncio.run(run())
+    assert socket.sent == ["transcript"]
+    assert OUTBOUND_DROPPED.get(reason="stale") - before == 1
+
+
+def test_interruption_discards_only_audio():
+    socket = FakeSocket()
+    before = OUTBOUND_DROPPED.get(reason="interrupted")
+
+    async def run():
+        queue = OutboundQueue(socket, "test")
+        await queue.send_bytes(b"one")
+        await queue.send_text("interrupted")
+        await queue.send_bytes(b"two")
+        queue.discard_audio()
+        assert queue.size == len("interrupted")
+        queue.end(1000)
+        await queue.run()
+    asyncio.run(run())
+    assert socket.sent == ["interrupted"]
+    assert OUTBOUND_DROPPED.get(reason="interrupted") - before == 2
+
+
+def test_full_queue_holds_audio_until_drained():
+    socket = FakeSocket()
+
+    async def run():
+        queue = OutboundQueue(socket, "test", max_bytes=4, send_timeout=1)
+        await queue.send_bytes(b"1234")
+        producer = asyncio.create_task(queue.send_bytes(b"5678"))
+        await asyncio.sleep(0.01)
+        assert not producer.done()
+        writer = asyncio.create_task(queue.run())
+        await producer
+        queue.end(1000)
+        await writer
+    asyncio.run(run())
+    assert socket.sent == [b"1234", b"5678"]
+
+
+def test_client_that_stops_reading_is_disconnected():
+    socket = FakeSocket(blocked=True)
+    before = SLOW_CLIENT_DISCONNECTS.get()
+
+    async def run():
+        queue = OutboundQueue(socket, "test", send_timeout=0.05)
+        await queue.send_bytes(b"audio")
+        await queue.send_bytes(b"more")
+        await queue.run()
+        # Nothing more is queued once the client is gone
+        await queue.send_text("late")
+        return queue, await queue.receive()
+    queue, message = asyncio.run(run())
+    assert queue.stalled.is_set()
+    assert not queue.items
+    assert socket.close_code == SLOW_CLIENT_CLOSE_CODE
+    assert message == {"type": "websocket.disconnect", "code": SLOW_CLIENT_CLOSE_CODE}
+    assert SLOW_CLIENT_DISCONNECTS.get() - before == 1
+
+
+def test_queue_that_stays_full_stalls_the_producer():
+    socket = FakeSocket()
+
+    async def run():
+        queue = OutboundQueue(socket, "test", max_bytes=4, send_timeout=0.05)
+        await queue.send_bytes(b"1234")
+        # No writer is running, so there is never room for more
+        await queue.send_bytes(b"5678")
+        return queue
+    queue = asyncio.run(run())
+    assert queue.stalled.is_set()
+    assert queue.size == 0
+
+
+@pytest.mark.parametrize("error", [
+    WebSocketDisconnect(1001), RuntimeError("Cannot call send once a close message has been sent"),
+])
+def test_failed_send_closes_the_queue(error):
+    socket = FakeSocket(error=error)
+    before = SLOW_CLIENT_DISCONNECTS.get()
+
+    async def run():
+        queue = OutboundQueue(socket, "test", max_bytes=4, send_timeout=1)
+        await queue.send_bytes(b"1234")
+        # Waits for room that the failed writer has to release
+        producer = asyncio.create_task(queue.send_bytes(b"5678"))
+        await asyncio.wait_for(queue.run(), 1)
+        await asyncio.wait_for(producer, 1)
+        return queue, await queue.receive()
+    queue, message = asyncio.run(run())
+    assert queue.closed.is_set()
+    assert queue.stalled.is_set()
+    assert not queue.items
+    assert message["type"] == "websocket.disconnect"
+    # A client that left is not counted as a slow one
+    assert SLOW_CLIENT_DISCONNECTS.get() == before
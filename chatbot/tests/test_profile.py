@@ -0,0 +1,139 @@
+import asyncio
+import pytest
+from agent import profile as profile_module
+from agent.profile import ProfilePipeline, ProfileStore, compact_profile, merge_profile
+from config import PROFILE_BATCH_TURNS, PROFILE_MAX_NOTES
+
+
+@pytest.mark.parametrize("extracted, expected", [
+    ({"first_name": " Ana ", "notes": ["likes tea"]},
+     {"first_name": "Ana", "last_name": "Smith", "notes": ["has a cat", "likes tea"]}),
+    ({"first_name": "None", "last_name": "", "notes": ["has a cat", " ", 3]},
+     {"first_name": "Bea", "last_name": "Smith", "notes": ["has a cat"]}),
+    ({}, {"first_name": "Bea", "last_name": "Smith", "notes": ["has a cat"]}),
+])
+def test_merge_profile(extracted, expected):
+    stored = {"first_name": "Bea", "last_name": "Smith", "notes": ["has a cat"]}
+    assert merge_profile(stored, extracted) == expected
+    assert stored == {"first_name": "Bea", "last_name": "Smith", "notes": ["has a cat"]}
+
+
+def test_merge_profile_keeps_the_newest_notes():
+    notes = [f"note {i}" for i in range(PROFILE_MAX_NOTES)]
+    merged = merge_profile({"notes": notes}, {"notes": ["newest"]})
+    assert merged["notes"] == notes[1:] + ["newest"]
+
+
+@pytest.mark.parametrize("profile, expected", [
+    ({}, ""),
+    ({"notes": []}, ""),
+    ({"first_name": "Ana"}, "The user's name is Ana."),
+    ({"first_name": "Ana", "last_name": "Smith", "notes": ["likes tea", "has a cat"]},
+     "The user's name is Ana Smith. What you know about the user: likes tea; has a cat."),
+    ({"notes": ["likes tea"]}, "What you know about the user: likes tea."),
+])
+def test_compact_profile(profile, expected):
+    assert compact_profile(profile) == expected
+
+
+def open_store(path, **kwargs):
+    store = ProfileStore(str(path), **kwargs)
+    asyncio.run(store.open())
+    return store
+
+
+def test_store_round_trip(tmp_path):
+    path = tmp_path / "profiles" / "profiles.sqlite3"
+    store = open_store(path)
+    asyncio.run(store.write_many({"u1": {"first_name": "Ana"}, "u2": {"notes": ["likes tea"]}}))
+    asyncio.run(store.write_many({"u1": {"first_name": "Ana", "last_name": "Smith"}}))
+    asyncio.run(store.close())
+
+    reopened = open_store(path)
+    assert asyncio.run(reopened.get("u1")) == {"first_name": "Ana", "last_name": "Smith"}
+    assert asyncio.run(reopened.get("u2")) == {"notes": ["likes tea"]}
+    assert asyncio.run(reopened.get("unknown")) == {}
+    asyncio.run(reopened.close())
+
+
+def test_store_reads_through_one_connection(tmp_path, monkeypatch):
+    store = ProfileStore(str(tmp_path / "profiles.sqlite3"))
+    connects = []
+    connect = store._connect
+    monkeypatch.setattr(store, "_connect", lambda: connects.append(1) or connect())
+    asyncio.run(store.open())
+    for i in range(5):
+        asyncio.run(store.get(f"u{i}"))
+    asyncio.run(store.close())
+    # One reader and one writer, however many profiles were loaded
+    assert len(connects) == 2
+
+
+def test_store_cache_is_bounded_but_keeps_unwritten_profiles(tmp_path):
+    store = open_store(tmp_path / "profiles.sqlite3", cache_size=2)
+    store.put("dirty", {"first_name": "Ana"})
+    for i in range(3):
+        asyncio.run(store.get(f"u{i}"))
+    assert list(store.cache) == ["dirty", "u2"]
+
+    # Once written it ages out like any other profile
+    asyncio.run(store.write_many({"dirty": store.get_cached("dirty")}))
+    asyncio.run(store.get("u3"))
+    asyncio.run(store.get("u4"))
+    assert list(store.cache) == ["u3", "u4"]
+    # Evicted profiles are read back from the database
+    assert asyncio.run(store.get("dirty")) == {"first_name": "Ana"}
+    asyncio.run(store.close())
+
+
+def test_recently_used_profiles_stay_cached(tmp_path):
+    store = open_store(tmp_path / "profiles.sqlite3", cache_size=2)
+    asyncio.run(store.get("u1"))
+    asyncio.run(store.get("u2"))
+    asyncio.run(store.get("u1"))
+    asyncio.run(store.get("u3"))
+    assert list(store.cache) == ["u1", "u3"]
+    asyncio.run(store.close())
+
+
+def stub_extractor(monkeypatch, extracted):
+    async def extract_context(text):
+        return extracted
+    monkeypatch.setattr(profile_module, "extract_context", extract_context)
+
+
+def test_pipeline_writes_extracted_profiles(tmp_path, monkeypatch):
+    stub_extractor(monkeypatch, {"first_name": "Ana", "notes": ["likes tea"]})
+    path = tmp_path / "profiles.sqlite3"
+
+    async def session():
+        pipeline = ProfilePipeline(ProfileStore(str(path)))
+        await pipeline.start()
+        for i in range(PROFILE_BATCH_TURNS):
+            pipeline.record_turn("s1", "u1", f"turn {i}")
+        while "u1" in pipeline.store.dirty or not pipeline.store.get_cached("u1"):
+            await asyncio.sleep(0.01)
+        assert pipeline.compact("u1") == "The user's name is Ana. What you know about the user: likes tea."
+        await pipeline.close()
+
+    asyncio.run(session())
+    store = open_store(path)
+    assert asyncio.run(store.get("u1")) == {"first_name": "Ana", "notes": ["likes tea"]}
+    asyncio.run(store.close())
+
+
+def test_pipeline_close_flushes_dirty_profiles(tmp_path):
+    path = tmp_path / "profiles.sqlite3"
+
+    async def session():
+        pipeline = ProfilePipeline(ProfileStore(str(path)))
+        await pipeline.start()
+        # Merged but not yet picked up by the write worker when the worker shuts down
+        pipeline.store.put("u1", {"first_name": "Ana"})
+        pipeline.updates.put_nowait("u1")
+        await pipeline.close()
+
+    asyncio.run(session())
+    store = open_store(path)
+    assert asyncio.run(store.get("u1")) == {"first_name": "Ana"}
+    asyncio.run(store.close())
@@ -0,0 +1,61 @@
+import pytest
+from audio_processing.protocol import (
+    AUDIO_FRAME_HEADER, BINARY_PROTOCOL, JSON_PROTOCOL, MP3_CONTENT_TYPE, WAV_CONTENT_TYPE,
+    encode_audio_frame, decode_audio_frame, negotiate_protocol, negotiate_input_audio, negotiate_output_audio
+)
+
+
+def test_frame_round_trip():
+    frame = encode_audio_frame(7, 3, MP3_CONTENT_TYPE, b"\xff\xfbaudio")
+    assert len(frame) == AUDIO_FRAME_HEADER.size + 7
+    assert decode_audio_frame(frame) == {
+        "sequence": 7, "sentence_index": 3, "content_type": MP3_CONTENT_TYPE, "audio": b"\xff\xfbaudio",
+    }
+
+
+@pytest.mark.parametrize("content_type", [MP3_CONTENT_TYPE, "audio/l16", "audio/ogg", WAV_CONTENT_TYPE])
+def test_frame_keeps_the_codec(content_type):
+    assert decode_audio_frame(encode_audio_frame(0, 0, content_type, b""))["content_type"] == content_type
+
+
+def test_frame_header_is_big_endian():
+    frame = encode_audio_frame(0x01020304, 0x0506, MP3_CONTENT_TYPE, b"")
+    assert frame == bytes([1, 1, 0x05, 0x06, 0x01, 0x02, 0x03, 0x04])
+
+
+def test_frame_counters_wrap():
+    fields = decode_audio_frame(encode_audio_frame(2 ** 32 + 5, 2 ** 16 + 2, MP3_CONTENT_TYPE, b""))
+    assert fields["sequence"] == 5
+    assert fields["sentence_index"] == 2
+
+
+def test_unknown_frame_version_is_rejected():
+    frame = bytearray(encode_audio_frame(0, 0, MP3_CONTENT_TYPE, b"audio"))
+    frame[0] = 2
+    with pytest.raises(ValueError):
+        decode_audio_frame(bytes(frame))
+
+
+def test_unknown_content_type_cannot_be_encoded():
+    with pytest.raises(KeyError):
+        encode_audio_frame(0, 0, "audio/flac", b"")
+
+
+def test_protocol_negotiation_falls_back_to_json():
+    assert negotiate_protocol(BINARY_PROTOCOL) == BINARY_PROTOCOL
+    assert negotiate_protocol(None) == JSON_PROTOCOL
+    assert negotiate_protocol("msgpack") == JSON_PROTOCOL
+
+
+def test_input_negotiation():
+    assert negotiate_input_audio("linear16", "8000") == {"encoding": "linear16", "sample_rate": 8000, "channels": 1}
+    assert negotiate_input_audio("linear16", "fast")["sample_rate"] == 16000
+    assert negotiate_input_audio(None) is None
+    assert negotiate_input_audio("opus") is None
+
+
+def test_output_negotiation():
+    linear16 = negotiate_output_audio("linear16")
+    # Whole 16-bit samples, so a chunk never splits one
+    assert linear16["chunk_bytes"] % 2 == 0
+    assert negotiate_output_audio("mp3") is None
@@ -0,0 +1,116 @@
+from audio_processing import reconnect
+from audio_processing.reconnect import AudioReplayBuffer, TranscriptSeam
+from metrics import TRANSCRIPT_SEAM_WORDS
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def clock(monkeypatch):
+    fake = Clock()
+    monkeypatch.setattr(reconnect.time, "monotonic", fake)
+    return fake
+
+
+def seam_after(committed, max_seconds=5):
+    """A seam that has committed the given transcript and then seen a reconnect."""
+    seam = TranscriptSeam(max_seconds)
+    seam.final(committed)
+    seam.open()
+    return seam
+
+
+def test_replay_keeps_only_the_last_seconds(monkeypatch):
+    now = clock(monkeypatch)
+    buffer = AudioReplayBuffer(max_seconds=1.5)
+    for chunk in (b"a", b"b", b"c", b"d"):
+        buffer.append(chunk)
+        now.now += 1
+    assert buffer.replay() == [b"c", b"d"]
+    assert buffer.size == 2
+
+
+def test_replay_is_capped_in_bytes():
+    buffer = AudioReplayBuffer(max_seconds=60, max_bytes=4)
+    for chunk in (b"aa", b"bb", b"cc"):
+        buffer.append(chunk)
+    assert buffer.replay() == [b"bb", b"cc"]
+
+
+def test_container_header_leads_the_replay(monkeypatch):
+    now = clock(monkeypatch)
+    buffer = AudioReplayBuffer(max_seconds=1, keep_header=True)
+    buffer.append(b"header")
+    now.now += 5
+    buffer.append(b"cluster")
+    assert buffer.replay() == [b"header", b"cluster"]
+    # Still in the window, so the header is not sent twice
+    buffer = AudioReplayBuffer(max_seconds=1, keep_header=True)
+    buffer.append(b"header")
+    assert buffer.replay() == [b"header"]
+
+
+def test_clear_forgets_the_header():
+    buffer = AudioReplayBuffer(max_seconds=1, keep_header=True)
+    buffer.append(b"header")
+    buffer.clear()
+    buffer.append(b"next")
+    assert buffer.replay() == [b"next"]
+    assert buffer.size == 4
+
+
+def test_transcripts_pass_through_without_a_reconnect():
+    seam = TranscriptSeam(5)
+    assert seam.final("so I was") == "so I was"
+    assert seam.final("so I was") == "so I was"
+
+
+def test_replayed_words_are_dropped():
+    seam = seam_after("so I was thinking about planting")
+    before = TRANSCRIPT_SEAM_WORDS.get()
+    assert seam.final("thinking about planting tomatoes") == "tomatoes"
+    assert TRANSCRIPT_SEAM_WORDS.get() - before == 3
+    # The seam is crossed, so a genuine repeat afterwards is kept
+    assert seam.final("tomatoes tomatoes") == "tomatoes tomatoes"
+
+
+def test_repeat_spread_over_several_finals():
+    seam = seam_after("the backyard only gets a few hours")
+    assert seam.final("only gets") == ""
+    assert seam.final("a few hours of sun") == "of sun"
+
+
+def test_one_shared_word_is_not_a_repeat():
+    seam = seam_after("the cat sat on the mat")
+    assert seam.final("the dog barked") == "the dog barked"
+
+
+def test_latest_match_in_the_history_wins():
+    seam = seam_after("yes please yes please")
+    assert seam.final("yes please") == ""
+    # Aligned with the last "yes please", the history is used up and the seam closes
+    assert seam.final("yes please again") == "yes please again"
+
+
+def test_matching_ends_after_max_seconds(monkeypatch):
+    now = clock(monkeypatch)
+    seam = seam_after("how are you doing today", max_seconds=2)
+    now.now += 3
+    assert seam.final("doing today") == "doing today"
+
+
+def test_matching_ignores_case_and_punctuation():
+    seam = seam_after("Do you think peppers would do better?")
+    assert seam.final("would do better or") == "or"
+
+
+def test_reset_forgets_the_history():
+    seam = seam_after("hello there friend")
+    seam.reset()
+    seam.open()
+    assert seam.final("there friend") == "there friend"
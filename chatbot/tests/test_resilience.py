@@ -0,0 +1,232 @@
+import asyncio
+import time
+import pytest
+from resilience import CircuitBreaker, CircuitOpenError, Provider, hedged_stream, resilient_call, resilient_stream
+
+
+def make_provider(name, default_delay=0.05, first_result_timeout=1.0, failures=5):
+    provider = Provider("test", name, default_delay, first_result_timeout)
+    provider.breaker.failure_threshold = failures
+    return provider
+
+
+def open_circuit(breaker, seconds_ago):
+    breaker.opened_at = time.monotonic() - seconds_ago
+
+
+async def collect(stream):
+    return [item async for item in stream]
+
+
+def items(*values, delay=0.0, error=None):
+    """open_stream for hedged_stream: waits, then yields the values or raises the error."""
+    async def stream(name):
+        await asyncio.sleep(delay)
+        if error:
+            raise error
+        for value in values:
+            yield value
+    return stream
+
+
+def test_breaker_opens_at_threshold():
+    breaker = CircuitBreaker("test:a", failure_threshold=3, reset_seconds=30)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.opened_at is not None
+    assert not breaker.allow()
+
+
+def test_breaker_success_resets_failures():
+    breaker = CircuitBreaker("test:a", failure_threshold=3, reset_seconds=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.allow()
+    assert breaker.failures == 1
+
+
+def test_breaker_lets_one_trial_through_after_cool_down():
+    breaker = CircuitBreaker("test:a", failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+    open_circuit(breaker, 31)
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.opened_at is None
+    assert breaker.allow()
+
+
+def test_breaker_failed_trial_reopens():
+    breaker = CircuitBreaker("test:a", failure_threshold=5, reset_seconds=30)
+    breaker.failures = 5
+    open_circuit(breaker, 31)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+    assert time.monotonic() - breaker.opened_at < 1
+
+
+def test_breaker_abandoned_trial_can_be_retried():
+    breaker = CircuitBreaker("test:a", failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+    open_circuit(breaker, 31)
+    assert breaker.allow()
+    breaker.abandon()
+    assert breaker.allow()
+
+
+def test_hedged_stream_passes_items_through():
+    provider = make_provider("a")
+    assert asyncio.run(collect(hedged_stream(provider, items(1, 2, 3)))) == [1, 2, 3]
+    assert len(provider.latency.samples) == 1
+
+
+def test_hedged_stream_keeps_the_faster_duplicate():
+    provider = make_provider("a", default_delay=0.05)
+    calls = []
+
+    async def open_stream(name):
+        calls.append(name)
+        # The first call stalls well past the hedge delay, the duplicate answers at once
+        await asyncio.sleep(0.5 if len(calls) == 1 else 0)
+        yield f"call {len(calls)}"
+
+    started_at = time.perf_counter()
+    result = asyncio.run(collect(hedged_stream(provider, open_stream)))
+    assert result == ["call 2"]
+    assert len(calls) == 2
+    assert time.perf_counter() - started_at < 0.4
+
+
+def test_hedged_stream_retries_a_fast_failure():
+    provider = make_provider("a", default_delay=1.0)
+    calls = []
+
+    def open_stream(name):
+        calls.append(name)
+        if len(calls) == 1:
+            return items(error=ConnectionError("reset"))(name)
+        return items("ok")(name)
+
+    started_at = time.perf_counter()
+    assert asyncio.run(collect(hedged_stream(provider, open_stream))) == ["ok"]
+    # The retry fires on the failure, not after the hedge delay
+    assert time.perf_counter() - started_at < 0.5
+
+
+def scripted(*behaviours):
+    """open_stream whose nth call waits and then fails or answers as the nth behaviour says."""
+    calls = []
+
+    def open_stream(name):
+        delay, error = behaviours[len(calls)]
+        calls.append(name)
+        return items(f"call {len(calls)}", delay=delay, error=error)(name)
+    return open_stream, calls
+
+
+def test_hedged_stream_hedges_a_stalled_retry():
+    provider = make_provider("a", default_delay=0.05)
+    open_stream, calls = scripted((0, ConnectionError("reset")), (1.0, None), (0, None))
+    started_at = time.perf_counter()
+    assert asyncio.run(collect(hedged_stream(provider, open_stream))) == ["call 3"]
+    assert time.perf_counter() - started_at < 0.5
+
+
+def test_hedged_stream_hedges_again_when_the_hedge_fails_fast():
+    provider = make_provider("a", default_delay=0.05)
+    open_stream, calls = scripted((1.0, None), (0, ConnectionError("reset")), (0, None))
+    started_at = time.perf_counter()
+    assert asyncio.run(collect(hedged_stream(provider, open_stream))) == ["call 3"]
+    assert time.perf_counter() - started_at < 0.5
+
+
+def test_hedged_stream_retries_a_fast_failure_only_once():
+    provider = make_provider("a", default_delay=0.05)
+    error = ConnectionError("reset")
+    open_stream, calls = scripted((0, error), (0, error), (0, None))
+    with pytest.raises(ConnectionError):
+        asyncio.run(collect(hedged_stream(provider, open_stream)))
+    assert len(calls) == 2
+
+
+def test_hedged_stream_without_hedging_raises_the_first_error():
+    provider = make_provider("a")
+    with pytest.raises(ConnectionError):
+        asyncio.run(collect(hedged_stream(provider, items(error=ConnectionError("reset")), hedge=False)))
+
+
+def test_hedged_stream_times_out_without_a_first_result():
+    provider = make_provider("a", first_result_timeout=0.1)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(collect(hedged_stream(provider, items("late", delay=1.0), hedge=False)))
+
+
+def test_resilient_stream_falls_back_to_the_next_provider():
+    primary, fallback = make_provider("primary"), make_provider("fallback")
+    served_by = {}
+
+    def open_stream(name):
+        if name == "primary":
+            return items(error=ConnectionError("down"))(name)
+        return items("from fallback")(name)
+
+    result = asyncio.run(collect(resilient_stream("test", [primary, fallback], open_stream, False, served_by)))
+    assert result == ["from fallback"]
+    assert served_by["name"] == "fallback"
+    assert primary.breaker.failures == 1
+    assert fallback.breaker.failures == 0
+
+
+def test_resilient_stream_skips_open_circuits():
+    primary = make_provider("primary", failures=1)
+    primary.breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(collect(resilient_stream("test", [primary], items("unused"), hedge=False)))
+
+
+def test_resilient_call_success_resets_failures():
+    provider = make_provider("a", failures=5)
+    for _ in range(3):
+        provider.breaker.record_failure()
+
+    async def call(name):
+        return "summary"
+
+    assert asyncio.run(resilient_call("test", [provider], call, hedge=False)) == "summary"
+    assert provider.breaker.failures == 0
+
+
+def test_resilient_call_trial_closes_the_circuit():
+    provider = make_provider("a", failures=1)
+    provider.breaker.record_failure()
+    open_circuit(provider.breaker, provider.breaker.reset_seconds + 1)
+
+    async def call(name):
+        return "summary"
+
+    assert asyncio.run(resilient_call("test", [provider], call, hedge=False)) == "summary"
+    assert provider.breaker.opened_at is None
+    assert not provider.breaker.trial_running
+    assert provider.breaker.allow()
+
+
+def test_closing_a_stream_before_its_first_item_abandons_the_trial():
+    provider = make_provider("a", failures=1)
+    provider.breaker.record_failure()
+    open_circuit(provider.breaker, provider.breaker.reset_seconds + 1)
+
+    async def cancel_before_first_item():
+        task = asyncio.ensure_future(collect(resilient_stream("test", [provider], items("late", delay=1.0), False)))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(cancel_before_first_item())
+    assert provider.breaker.opened_at is not None
+    assert not provider.breaker.trial_running
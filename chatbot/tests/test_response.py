@@ -0,0 +1,31 @@
+import asyncio
+import resilience
+from agent import response
+from backends.base import ChatModel
+from clients import SessionBackends, upstream
+from config import LLM_LARGE_MODEL, LLM_TIMEOUT
+from resilience import upstream_provider
+
+
+class SlowChat(ChatModel):
+    name = "slow"
+
+    async def complete(self, model, messages, max_tokens):
+        await asyncio.sleep(0.3)
+        return "summary"
+
+
+def test_slow_summary_leaves_the_reply_provider_alone(monkeypatch):
+    chat = SlowChat()
+    monkeypatch.setattr(resilience, "providers", {})
+    monkeypatch.setitem(upstream.backends["llm"], chat.name, chat)
+    monkeypatch.setattr(upstream, "default", SessionBackends(None, chat, None))
+    # Streamed replies must give their first token well before the summary is done
+    streaming = upstream_provider("llm", f"slow/{LLM_LARGE_MODEL}", 0.1, first_result_timeout=0.2)
+
+    assert asyncio.run(response.response_generator("summarize this")) == "summary"
+    assert streaming.breaker.failures == 0
+    assert not streaming.latency.samples
+    complete = resilience.providers[f"llm_complete:slow/{LLM_LARGE_MODEL}"]
+    assert complete.first_result_timeout == LLM_TIMEOUT
+    assert len(complete.latency.samples) == 1
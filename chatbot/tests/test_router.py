@@ -0,0 +1,44 @@
+import pytest
+from agent import router
+from agent.memory import ConversationMemory
+from agent.router import classify, route_turn
+from config import LLM_FAST_MODEL, LLM_LARGE_MODEL, LLM_ROUTE_MAX_FAST_WORDS
+
+
+def remembering():
+    memory = ConversationMemory()
+    memory.add_turn("My dog is called Rex.", "What a lovely name!")
+    return memory
+
+
+@pytest.mark.parametrize("message, memory, reason", [
+    ("Hi there, how are you?", None, None),
+    ("I had pasta for dinner.", None, None),
+    (" ".join(["word"] * (LLM_ROUTE_MAX_FAST_WORDS + 1)), None, "long"),
+    ("Why? Really? Are you sure?", None, "multi_question"),
+    ("Why is the sky blue?", None, "reasoning"),
+    ("Can you help me plan my week?", None, "reasoning"),
+    ("Do you remember my dog?", None, None),
+    ("Do you remember my dog?", ConversationMemory(), None),
+    ("Do you remember my dog?", remembering(), "recall"),
+])
+def test_classify(message, memory, reason):
+    assert classify(message, memory) == reason
+
+
+@pytest.mark.parametrize("message, name, model, reason", [
+    ("Hi there, how are you?", "fast", LLM_FAST_MODEL, "small_talk"),
+    ("Why is the sky blue?", "large", LLM_LARGE_MODEL, "reasoning"),
+    (" ".join(["word"] * (LLM_ROUTE_MAX_FAST_WORDS + 1)), "large", LLM_LARGE_MODEL, "long"),
+])
+def test_route_turn(message, name, model, reason):
+    route = route_turn(message)
+    assert (route.name, route.model, route.reason) == (name, model, reason)
+    assert route.max_tokens == router.reply_max_tokens()
+
+
+@pytest.mark.parametrize("message", ["Hi there, how are you?", "Why is the sky blue?"])
+def test_disabled_routing_sends_every_turn_to_the_large_model(monkeypatch, message):
+    monkeypatch.setattr(router, "LLM_ROUTING_ENABLED", False)
+    route = route_turn(message)
+    assert (route.name, route.model, route.reason) == ("large", LLM_LARGE_MODEL, "routing_disabled")
@@ -0,0 +1,102 @@
+import asyncio
+from audio_processing.session import SessionRegistry, SessionSupervisor
+
+
+async def wait_forever(unwound, cleanup_seconds=0.01):
+    """Blocks until cancelled, then takes a while to clean up like a closing upstream call."""
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await asyncio.sleep(cleanup_seconds)
+        unwound.append(asyncio.current_task().get_name())
+
+
+def other_tasks():
+    return asyncio.all_tasks() - {asyncio.current_task()}
+
+
+def test_shutdown_cancels_and_awaits_every_task():
+    async def scenario():
+        supervisor = SessionSupervisor("s1")
+        unwound = []
+        tasks = [supervisor.spawn(wait_forever(unwound), name=f"task {i}") for i in range(3)]
+        tasks.append(supervisor.adopt(asyncio.create_task(wait_forever(unwound), name="adopted")))
+        await asyncio.sleep(0)
+
+        await supervisor.shutdown()
+        assert all(task.cancelled() for task in tasks)
+        assert sorted(unwound) == ["adopted", "task 0", "task 1", "task 2"]
+        assert not supervisor.tasks
+        assert not other_tasks()
+
+    asyncio.run(scenario())
+
+
+def test_shutdown_waits_for_tasks_adopted_while_unwinding():
+    async def scenario():
+        supervisor = SessionSupervisor("s1")
+        unwound = []
+        # E.g. a summary call handed over by a reply that was cancelled mid-turn
+        late = asyncio.create_task(wait_forever(unwound), name="late")
+
+        async def parent():
+            try:
+                await asyncio.Event().wait()
+            finally:
+                supervisor.adopt(late)
+
+        supervisor.spawn(parent())
+        await asyncio.sleep(0)
+        await supervisor.shutdown()
+        assert late.cancelled()
+        assert unwound == ["late"]
+        assert not supervisor.tasks
+        assert not other_tasks()
+
+    asyncio.run(scenario())
+
+
+def test_failing_task_does_not_stop_shutdown():
+    async def scenario():
+        supervisor = SessionSupervisor("s1")
+        unwound = []
+
+        async def fails_on_cancel():
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                raise RuntimeError("cleanup failed")
+
+        supervisor.spawn(fails_on_cancel())
+        supervisor.spawn(wait_forever(unwound), name="other")
+        await asyncio.sleep(0)
+        await supervisor.shutdown()
+        assert unwound == ["other"]
+        assert not other_tasks()
+
+    asyncio.run(scenario())
+
+
+def test_registry_close_ends_the_session():
+    async def scenario():
+        registry = SessionRegistry()
+        unwound = []
+        supervisor = registry.open("s1")
+        supervisor.spawn(wait_forever(unwound), name="processing loop")
+        registry.open("s2").spawn(wait_forever(unwound), name="other session")
+        await asyncio.sleep(0)
+        assert registry.task_count() == 2
+
+        await registry.close("s1")
+        assert unwound == ["processing loop"]
+        assert registry.session_count() == 1
+        assert registry.task_count() == 1
+        late = supervisor.adopt(asyncio.create_task(asyncio.sleep(1)))
+        await asyncio.gather(late, return_exceptions=True)
+        assert late.cancelled()
+
+        await registry.close("s2")
+        assert registry.session_count() == 0
+        assert not other_tasks()
+
+    asyncio.run(scenario())
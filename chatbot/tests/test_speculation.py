@@ -0,0 +1,37 @@
+import asyncio
+import pytest
+from audio_processing import transcript_processor
+from audio_processing.conversation_state import ConversationState
+from audio_processing.transcript_processor import TranscriptProcessor
+from metrics import SPECULATIONS
+
+
+async def reply(transcript, memory, backends):
+    yield f"Reply to {transcript}"
+
+
+@pytest.mark.parametrize("hypotheses, final, hits, misses", [
+    (["How are you?"], "How are you?", 1, 0),
+    (["I like tea.", "I like tea and cake.", "I like tea and cakes."], "I like tea and cakes.", 1, 0),
+    (["I like tea.", "I like tea and cake.", "I like tea and cakes."], "I like tea and biscuits.", 0, 1),
+    (["I like tea."], "I like coffee.", 0, 1),
+    ([], "Hello there.", 0, 0),
+])
+def test_one_outcome_is_counted_per_turn(monkeypatch, hypotheses, final, hits, misses):
+    monkeypatch.setattr(transcript_processor, "stream_ai_response", reply)
+    before = SPECULATIONS.get(result="hit"), SPECULATIONS.get(result="miss")
+
+    async def turn():
+        processor = TranscriptProcessor(ConversationState("test"), audio_processor=None)
+        for hypothesis in hypotheses:
+            processor._speculate(hypothesis)
+        speculation = processor._take_speculation(final)
+        if speculation:
+            speculation.discard()
+        # The next turn starts with nothing left to count
+        assert processor._take_speculation("Something else.") is None
+        await processor.conversation_state.supervisor.shutdown()
+
+    asyncio.run(turn())
+    assert SPECULATIONS.get(result="hit") - before[0] == hits
+    assert SPECULATIONS.get(result="miss") - before[1] == misses
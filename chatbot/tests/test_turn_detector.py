@@ -0,0 +1,51 @@
+import asyncio
+import pytest
+from audio_processing.session import SessionSupervisor
+from audio_processing.turn_detector import EndOfTurnDetector, SpeculativeResponse
+
+
+async def tokens(*values, delay=0.0):
+    await asyncio.sleep(delay)
+    for value in values:
+        yield value
+
+
+def test_hypothesis_is_stable_after_repeats():
+    detector = EndOfTurnDetector(stable_interims=2)
+    assert detector.update("how are") is None
+    assert detector.update("How are you?") is None
+    assert detector.update("how are you") == "How are you?"
+
+
+def test_empty_interims_are_ignored():
+    detector = EndOfTurnDetector(stable_interims=1)
+    assert detector.update("") is None
+    assert detector.utterance_ended() is None
+
+
+def test_speculation_replays_buffered_tokens():
+    async def run():
+        speculation = SpeculativeResponse("Hi there.", tokens("Hello", " again"), SessionSupervisor("test"))
+        assert speculation.matches("hi there")
+        return [token async for token in speculation.replay()]
+    assert asyncio.run(run()) == ["Hello", " again"]
+
+
+def test_saved_seconds_is_the_head_start_before_the_first_token():
+    async def run():
+        speculation = SpeculativeResponse("Hi there.", tokens("Hello", delay=10), SessionSupervisor("test"))
+        saved = speculation.saved_seconds(speculation.started_at + 0.3)
+        speculation.discard()
+        return saved
+    assert asyncio.run(run()) == pytest.approx(0.3)
+
+
+def test_saved_seconds_is_capped_at_the_time_to_first_token():
+    async def run():
+        speculation = SpeculativeResponse("Hi there.", tokens("Hello"), SessionSupervisor("test"))
+        await speculation.task
+        # The final transcript landed long after the reply was ready
+        return speculation.saved_seconds(speculation.started_at + 5), speculation.first_token_at - speculation.started_at
+    saved, time_to_first_token = asyncio.run(run())
+    assert saved == time_to_first_token
+    assert saved < 5
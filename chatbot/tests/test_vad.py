@@ -0,0 +1,79 @@
+import array
+import math
+import pytest
+from audio_processing import vad
+from audio_processing.vad import VoiceActivityGate, frame_rms
+
+SAMPLE_RATE = 16000
+BYTES_PER_SECOND = SAMPLE_RATE * 2
+
+
+def pcm(seconds, amplitude=0, hz=220):
+    samples = int(SAMPLE_RATE * seconds)
+    return array.array("h", [
+        int(amplitude * math.sin(2 * math.pi * hz * i / SAMPLE_RATE)) for i in range(samples)
+    ]).tobytes()
+
+
+def gate(**kwargs):
+    return VoiceActivityGate(SAMPLE_RATE, threshold=500, preroll_seconds=0.3, hangover_seconds=0.5, **kwargs)
+
+
+def feed(vad_gate, audio, chunk_seconds=0.1):
+    """Forwarded bytes per chunk."""
+    step = int(BYTES_PER_SECOND * chunk_seconds)
+    return [sum(len(part) for part in vad_gate.process(audio[i:i + step])) for i in range(0, len(audio), step)]
+
+
+def test_leading_silence_is_held_back():
+    assert feed(gate(), pcm(1.0)) == [0] * 10
+
+
+def test_speech_is_forwarded_with_preroll():
+    vad_gate = gate()
+    feed(vad_gate, pcm(1.0))
+    forwarded = vad_gate.process(pcm(0.1, amplitude=3000))
+    # 0.3 s of the silence before the word, then the word itself
+    assert len(forwarded) == 4
+    assert sum(len(part) for part in forwarded) == int(BYTES_PER_SECOND * 0.4)
+    assert vad_gate.is_open
+
+
+def test_silence_after_speech_is_forwarded_for_the_hangover():
+    vad_gate = gate()
+    feed(vad_gate, pcm(0.1, amplitude=3000))
+    chunk = int(BYTES_PER_SECOND * 0.1)
+    assert feed(vad_gate, pcm(1.0)) == [chunk] * 5 + [0] * 5
+    assert not vad_gate.is_open
+
+
+def test_odd_sized_chunks_keep_whole_samples():
+    vad_gate = gate()
+    speech = pcm(0.2, amplitude=3000)
+    forwarded = vad_gate.process(speech[:1001]) + vad_gate.process(speech[1001:])
+    assert all(len(part) % 2 == 0 for part in forwarded)
+    assert b"".join(forwarded) == speech
+
+
+def test_reduction_ratio():
+    vad_gate = gate()
+    feed(vad_gate, pcm(3.0) + pcm(1.0, amplitude=3000))
+    # 1 s of speech, 0.3 s of pre-roll, out of 4 s
+    assert vad_gate.reduction_ratio == pytest.approx(1 - 1.3 / 4.0)
+
+
+def test_quiet_noise_raises_the_threshold():
+    vad_gate = gate()
+    # Steady background noise under the absolute threshold sets the noise floor
+    feed(vad_gate, pcm(1.0, amplitude=400))
+    # Just over the absolute threshold but under three times the noise floor
+    assert feed(vad_gate, pcm(0.1, amplitude=800)) == [0]
+    assert feed(vad_gate, pcm(0.1, amplitude=3000)) != [0]
+
+
+def test_rms_fallback_matches_audioop(monkeypatch):
+    frame = pcm(0.02, amplitude=3000)
+    expected = frame_rms(frame)
+    monkeypatch.setattr(vad, "audioop", None)
+    assert frame_rms(frame) == pytest.approx(expected, abs=1)
+    assert frame_rms(b"") == 0.0